@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+# The benchmark runs the lab's own decoder, so the content-app folder and the shared helpers must be importable
+LABFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(LABFILES, "content-app"))
+sys.path.insert(0, os.path.join(LABFILES, "common"))
+from field_decoder import FieldDecoder
+
+
+def main():
+
+    try:
+        # Get the stored result to decode and how many copies of it to decode
+        # e.g. python decode-benchmark.py
+        #      python decode-benchmark.py --payloads 100000 --repeat 10
+        #      python decode-benchmark.py --result my-results.json --schema my-analyzer.json
+        parser = argparse.ArgumentParser(description="Compare bulk decoding of stored Content Understanding results")
+        parser.add_argument("--result", default=os.path.join(LABFILES, "content-app", "results.json"),
+                            help="Stored analyzerResults response to decode")
+        parser.add_argument("--schema", default=os.path.join(LABFILES, "content-app", "biz-card.json"),
+                            help="Analyzer schema whose fieldSchema the decoder is compiled from")
+        parser.add_argument("--payloads", type=int, default=20000, help="Number of stored results decoded per run")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of runs of each decoder (the median is reported)")
+        parser.add_argument("--json", help="Also write the results to this JSON file")
+        args = parser.parse_args()
+
+        with open(args.result, "r", encoding="utf-8") as file:
+            text = file.read()
+        with open(args.schema, "r", encoding="utf-8") as file:
+            decoder = FieldDecoder(json.load(file)["fieldSchema"])
+
+        # Each payload is parsed separately, as results loaded from many stored files would be
+        payloads = [json.loads(text) for _ in range(args.payloads)]
+        decoders = {
+            "if/elif loop": decode_with_dispatch,
+            "FieldDecoder": decoder.decode_many,
+            "FieldDecoder columns": decoder.columns,
+        }
+
+        print(f"{args.payloads} payloads of {os.path.basename(args.result)}, median of {args.repeat} runs\n")
+        print(f"{'Decoder':22} {'Time (ms)':>10} {'us/payload':>11} {'Retained (KB)':>14}")
+        results = []
+        for name, decode in decoders.items():
+            seconds, retained = measure(decode, payloads, args.repeat)
+            results.append({"decoder": name, "seconds": round(seconds, 4), "retained_bytes": retained})
+            print(f"{name:22} {seconds * 1000:10.1f} {seconds / args.payloads * 1e6:11.2f} {retained / 1024:14.0f}")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as file:
+                json.dump({"payloads": args.payloads, "results": results}, file, indent=4)
+
+    except Exception as ex:
+        print(ex)
+        sys.exit(1)
+
+
+def decode_with_dispatch(result_jsons):
+    """
+    Decodes fields the way read-card.py did before FieldDecoder: an if/elif on
+    each field's type, into one dict per content item.
+
+    Objects and booleans have no branch, so (as before) they are left out.
+
+    Args:
+        result_jsons (iterable): JSON responses returned by the analyzerResults operation
+
+    Returns:
+        list: One dict of field name -> value per content item that has fields
+    """
+
+    records = []
+    for result_json in result_jsons:
+        for content in result_json["result"]["contents"]:
+            if "fields" not in content:
+                continue
+            record = {}
+            for field_name, field_data in content["fields"].items():
+                if field_data["type"] == "string":
+                    record[field_name] = field_data.get("valueString")
+                elif field_data["type"] == "number":
+                    record[field_name] = field_data.get("valueNumber")
+                elif field_data["type"] == "integer":
+                    record[field_name] = field_data.get("valueInteger")
+                elif field_data["type"] == "date":
+                    record[field_name] = field_data.get("valueDate")
+                elif field_data["type"] == "time":
+                    record[field_name] = field_data.get("valueTime")
+                elif field_data["type"] == "array":
+                    record[field_name] = field_data.get("valueArray")
+            records.append(record)
+    return records
+
+
+def measure(decode, payloads, repeat):
+    """
+    Times a decoder and measures the memory held by what it returns.
+
+    Args:
+        decode (callable): Called with the list of payloads
+        payloads (list): The parsed results
+        repeat (int): Number of timed runs
+
+    Returns:
+        tuple: (median seconds per run, bytes allocated by one run and still held by its result)
+    """
+
+    times = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        decode(payloads)
+        times.append(time.perf_counter() - start)
+
+    # Measured in a separate run, since tracing allocations slows decoding down
+    tracemalloc.start()
+    try:
+        decoded = decode(payloads)
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del decoded
+    return statistics.median(times), retained
+
+
+if __name__ == "__main__":
+    main()
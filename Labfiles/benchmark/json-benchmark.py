@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The benchmark runs the lab's own JSON reader, so the shared helpers must be importable
+LABFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(LABFILES, "common"))
+import json_stream
+
+
+# Every page of an OCR result, and every word on every page
+PAGES = "analyzeResult.readResults.item"
+WORDS = "analyzeResult.readResults.item.lines.item.words.item"
+
+
+def main():
+
+    try:
+        # Get the OCR page to repeat and how many pages the generated result has
+        # e.g. python json-benchmark.py
+        #      python json-benchmark.py --pages 5000 --repeat 5
+        #      python json-benchmark.py --ocr my-form.pdf.ocr.json
+        parser = argparse.ArgumentParser(description="Compare loading and streaming a large OCR result")
+        parser.add_argument("--ocr", default=os.path.join(LABFILES, "custom-doc-intelligence", "sample-forms", "Form_1.jpg.ocr.json"),
+                            help="OCR result whose first page is repeated to build the large result")
+        parser.add_argument("--pages", type=int, default=1000, help="Number of pages in the generated result")
+        parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each reader (the median is reported)")
+        parser.add_argument("--json", help="Also write the results to this JSON file")
+        args = parser.parse_args()
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "large.ocr.json")
+            write_ocr_result(args.ocr, path, args.pages)
+            size = os.path.getsize(path)
+
+            readers = {
+                "json.load, pages": lambda: count(load_whole(path, PAGES)),
+                "json.load, words": lambda: count(load_whole(path, WORDS)),
+                "iter_items fallback, pages": lambda: count(without_ijson(path, PAGES)),
+            }
+            if json_stream.ijson is not None:
+                readers["iter_items ijson, pages"] = lambda: count(json_stream.iter_items(path, PAGES))
+                readers["iter_items ijson, words"] = lambda: count(json_stream.iter_items(path, WORDS))
+            else:
+                print("ijson is not installed (pip install ijson), so only the json.load fallback is measured\n")
+
+            print(f"{args.pages}-page OCR result ({size / 1024 / 1024:.0f} MB), median of {args.repeat} runs\n")
+            print(f"{'Reader':28} {'Items':>9} {'Time (ms)':>10} {'Peak (MB)':>10}")
+            results = []
+            for name, read in readers.items():
+                items, seconds, peak = measure(read, args.repeat)
+                results.append({"reader": name, "items": items, "seconds": round(seconds, 4), "peak_bytes": peak})
+                print(f"{name:28} {items:9} {seconds * 1000:10.1f} {peak / 1024 / 1024:10.1f}")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as file:
+                json.dump({"pages": args.pages, "bytes": size, "results": results}, file, indent=4)
+
+    except Exception as ex:
+        print(ex)
+        sys.exit(1)
+
+
+def write_ocr_result(ocr_path, path, page_count):
+    """
+    Writes an OCR result with page_count copies of the first page of another one.
+
+    The pages are written one at a time, so building a large result doesn't
+    add to the memory of the readers measured afterwards.
+
+    Args:
+        ocr_path (str): The OCR result whose first page is repeated
+        path (str): The file to write
+        page_count (int): Number of pages to write
+    """
+
+    with open(ocr_path, "r", encoding="utf-8") as file:
+        ocr = json.load(file)
+    page = ocr["analyzeResult"]["readResults"][0]
+    with open(path, "w", encoding="utf-8") as file:
+        file.write('{"status": "succeeded", "analyzeResult": {"version": "2.1.0", "readResults": [')
+        for number in range(1, page_count + 1):
+            if number > 1:
+                file.write(",")
+            file.write(json.dumps(dict(page, page=number)))
+        file.write('], "pageResults": []}}')
+
+
+def load_whole(path, prefix):
+    """Loads the whole file with json.load, then walks to the values at prefix (what the labs did before)."""
+    with open(path, "r", encoding="utf-8") as file:
+        document = json.load(file)
+    return json_stream._find(document, prefix.split("."))
+
+
+def without_ijson(path, prefix):
+    """Reads the values at prefix with iter_items as it runs when ijson is not installed."""
+    ijson, json_stream.ijson = json_stream.ijson, None
+    try:
+        yield from json_stream.iter_items(path, prefix)
+    finally:
+        json_stream.ijson = ijson
+
+
+def count(values):
+    """Consumes the values one at a time, as the lab code does, and returns how many there were."""
+    total = 0
+    for _ in values:
+        total += 1
+    return total
+
+
+def measure(read, repeat):
+    """
+    Times a reader and measures the most memory it held at once.
+
+    Args:
+        read (callable): Reads the file and returns the number of items read
+        repeat (int): Number of timed runs
+
+    Returns:
+        tuple: (items read, median seconds per run, peak bytes allocated during one run)
+    """
+
+    times = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        items = read()
+        times.append(time.perf_counter() - start)
+
+    # Measured in a separate run, since tracing allocations slows reading down
+    tracemalloc.start()
+    try:
+        read()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return items, statistics.median(times), peak
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from simulated_service import SimulatedService
+
+# The benchmarks run the lab code itself, so its folders and the shared helpers must be importable
+LABFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(LABFILES, "content-app"))
+sys.path.insert(0, os.path.join(LABFILES, "common"))
+from instrumentation import Recorder, set_recorder
+from rate_limiter import reset_rate_limiters
+
+
+# The standard scenarios, in the order they run
+SCENARIOS = ("single-card", "card-batch", "card-batch-unpooled", "analyzer-redeploy", "invoice-batch", "large-upload")
+
+
+def main():
+
+    try:
+        # Get the scenarios to run and the behavior of the simulated service
+        # e.g. python run-benchmark.py
+        #      python run-benchmark.py card-batch --cards 5000 --max-in-flight 64 --engine async
+        #      python run-benchmark.py card-batch --latency 0.1 --throttle-rate 0.05 --failure-rate 0.01
+        #      python run-benchmark.py large-upload --upload-mb 500
+        #      python run-benchmark.py card-batch card-batch-unpooled --https   (the cost of TLS handshakes, as in Azure)
+        #      python run-benchmark.py --serve --port 8080   (then set ENDPOINT=http://127.0.0.1:8080/ for a lab script)
+        parser = argparse.ArgumentParser(description="Benchmark the lab scripts against a simulated Azure AI service")
+        parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                            help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+        parser.add_argument("--singles", type=int, default=20, help="Number of cards analyzed one after another in single-card")
+        parser.add_argument("--cards", type=int, default=1000, help="Number of cards in card-batch")
+        parser.add_argument("--redeploys", type=int, default=5, help="Number of analyzer redeployments in analyzer-redeploy")
+        parser.add_argument("--invoices", type=int, default=200, help="Number of invoices in invoice-batch")
+        parser.add_argument("--upload-mb", type=int, default=200, help="Size in MB of the file uploaded in large-upload")
+        parser.add_argument("--max-in-flight", type=int, default=32, help="Concurrency of the batch scenarios")
+        parser.add_argument("--engine", choices=["threads", "async"], default="threads", help="Engine used by card-batch")
+        parser.add_argument("--latency", type=float, default=0.02, help="Average seconds the service takes per request")
+        parser.add_argument("--processing-time", type=float, default=0.5, help="Seconds each operation runs on the service")
+        parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests that fail with 500")
+        parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests throttled with 429")
+        parser.add_argument("--quota", type=float, help="Requests per second allowed before the service throttles")
+        parser.add_argument("--cu-result", help="Recorded Content Understanding result to replay (default: content-app/results.json)")
+        parser.add_argument("--di-result", help="Recorded Document Intelligence analyzeResult to replay (default: a sample invoice)")
+        parser.add_argument("--seed", type=int, default=1, help="Seed for the simulated latencies and failures")
+        parser.add_argument("--https", action="store_true", help="Serve HTTPS with a self-signed certificate (requires openssl)")
+        parser.add_argument("--serve", action="store_true", help="Only run the simulated service, until Ctrl+C")
+        parser.add_argument("--port", type=int, default=0, help="Port of the simulated service (default: any free port)")
+        parser.add_argument("--json", help="Also write the results to this JSON file")
+        args = parser.parse_args()
+        unknown = [scenario for scenario in args.scenarios if scenario not in SCENARIOS]
+        if unknown:
+            parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+        service_args = dict(port=args.port, latency=args.latency, processing_time=args.processing_time,
+                            failure_rate=args.failure_rate, throttle_rate=args.throttle_rate, quota=args.quota,
+                            di_result=args.di_result, seed=args.seed, https=args.https)
+        if args.cu_result:
+            service_args["cu_result"] = args.cu_result
+
+        with SimulatedService(**service_args) as service:
+            if args.https:
+                # requests (and the Azure SDK) trust REQUESTS_CA_BUNDLE, aiohttp trusts SSL_CERT_FILE
+                os.environ["REQUESTS_CA_BUNDLE"] = os.environ["SSL_CERT_FILE"] = service.certfile
+            if args.serve:
+                print(f"Simulated service listening on {service.endpoint} (Ctrl+C to stop)")
+                if args.https:
+                    print(f"Set REQUESTS_CA_BUNDLE={service.certfile} for a lab script to trust its certificate")
+                with contextlib.suppress(KeyboardInterrupt):
+                    threading.Event().wait()
+                return
+
+            print(f"Simulated service: {service.scheme.upper()}, latency {args.latency}s, processing {args.processing_time}s, "
+                  f"failures {args.failure_rate:.0%}, throttling {args.throttle_rate:.0%}, quota {args.quota or 'none'}\n")
+            results = []
+            for scenario in args.scenarios or SCENARIOS:
+                result = run_scenario(scenario, service, args)
+                print_result(result)
+                results.append(result)
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=4)
+
+    except Exception as ex:
+        print(ex)
+
+
+class LatencyRecorder(Recorder):
+    """
+    A recorder that keeps every operation's latency in memory, for the percentiles.
+
+    The latency is the operation's total time less any time it was queued behind
+    other operations, so a batch's percentiles describe each analysis rather than
+    its place in the queue.
+    """
+
+    def __init__(self):
+        super().__init__("benchmark")
+        self.latencies = []
+        self.statuses = Counter()
+
+    def record(self, operation):
+        super().record(operation)
+        with self._lock:
+            self.latencies.append(operation.metrics["total_seconds"] - operation.metrics.get("queue_seconds", 0))
+            self.statuses[operation.status] += 1
+
+
+def load_script(path):
+    """
+    Imports a lab script whose file name isn't a valid module name (e.g. read-card.py).
+
+    Args:
+        path (str): Path of the script
+
+    Returns:
+        module: The imported script; its main() is not run
+    """
+
+    name = os.path.splitext(os.path.basename(path))[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def copies(source, count, folder):
+    """
+    Creates a folder of copies of a sample file, so a batch has as many inputs as needed.
+
+    Args:
+        source (str): The sample file
+        count (int): Number of copies
+        folder (str): Folder to create the copies in
+
+    Returns:
+        list: Paths of the copies
+    """
+
+    os.makedirs(folder, exist_ok=True)
+    extension = os.path.splitext(source)[1]
+    paths = []
+    for index in range(count):
+        path = os.path.join(folder, f"{index:06d}{extension}")
+        shutil.copyfile(source, path)
+        paths.append(path)
+    return paths
+
+
+def single_card(service, args, workdir):
+    # read-card.py with one image: upload, poll to completion, save and print the fields
+    read_card = load_script(os.path.join(LABFILES, "content-app", "read-card.py"))
+    image_file = os.path.join(LABFILES, "content-app", "biz-card-1.png")
+    with read_card.ContentUnderstandingClient(service.endpoint, "key") as client:
+        for _ in range(args.singles):
+            read_card.analyze_card(image_file, "biz-card", client)
+    return args.singles
+
+
+def card_batch(service, args, workdir, pooled=True):
+    # read-card.py with a folder of images, saving one JSON result per card
+    read_card = load_script(os.path.join(LABFILES, "content-app", "read-card.py"))
+    image_files = copies(os.path.join(LABFILES, "content-app", "biz-card-1.png"), args.cards, os.path.join(workdir, "cards"))
+    pool_size = max(10, args.max_in_flight)
+    if args.engine == "async":
+        from cu_async import ContentUnderstandingSyncClient
+        client = ContentUnderstandingSyncClient(service.endpoint, "key", pool_size=pool_size)
+    else:
+        client = read_card.ContentUnderstandingClient(service.endpoint, "key", pool_size=pool_size)
+        if not pooled:
+            # Every request opens a new connection (and, with --https, a new TLS handshake),
+            # as the labs did before they reused a session
+            client.session.headers["Connection"] = "close"
+    with client:
+        read_card.run_batch(image_files, "biz-card", client, args.max_in_flight, os.path.join(workdir, "results"))
+    return args.cards
+
+
+def card_batch_unpooled(service, args, workdir):
+    # card-batch without connection reuse, the baseline for the pooled clients (always the threaded engine)
+    args = argparse.Namespace(**dict(vars(args), engine="threads"))
+    return card_batch(service, args, workdir, pooled=False)
+
+
+def analyzer_redeploy(service, args, workdir):
+    # create-analyzer.py --force: get, delete and re-create the analyzer
+    create_analyzer = load_script(os.path.join(LABFILES, "content-app", "create-analyzer.py"))
+    with open(os.path.join(LABFILES, "content-app", "biz-card.json"), "r") as file:
+        schema = json.dumps(json.load(file))
+    with create_analyzer.ContentUnderstandingClient(service.endpoint, "key") as client:
+        for _ in range(args.redeploys):
+            create_analyzer.create_analyzer(schema, "biz-card", client, force=True)
+    return args.redeploys
+
+
+def invoice_batch(service, args, workdir):
+    # document-analysis.py with a folder of invoices (requires the azure-ai-formrecognizer SDK)
+    # The script only imports the SDK when it runs, so the client is imported here
+    from azure.core.credentials import AzureKeyCredential
+    from azure.ai.formrecognizer import DocumentAnalysisClient
+    document_analysis = load_script(os.path.join(LABFILES, "prebuilt-doc-intelligence", "Python", "document-analysis.py"))
+    sources = copies(os.path.join(LABFILES, "prebuilt-doc-intelligence", "sample-invoice", "sample-invoice.pdf"),
+                     args.invoices, os.path.join(workdir, "invoices"))
+    # The SDK waits polling_interval between polls when the service sends no Retry-After
+    client = DocumentAnalysisClient(endpoint=service.endpoint, credential=AzureKeyCredential("key"),
+                                    polling_interval=min(1.0, args.processing_time / 2))
+    for record in document_analysis.analyze_invoices(client, sources, max_in_flight=args.max_in_flight):
+        document_analysis.print_invoice_record(record)
+    return args.invoices
+
+
+def large_upload(service, args, workdir):
+    # read-card.py with one large file: the upload is streamed from disk, so memory shouldn't grow with the file
+    read_card = load_script(os.path.join(LABFILES, "content-app", "read-card.py"))
+    image_file = os.path.join(workdir, "large-card.png")
+    block = os.urandom(1024 * 1024)
+    with open(image_file, "wb") as file:
+        for _ in range(args.upload_mb):
+            file.write(block)
+    with read_card.ContentUnderstandingClient(service.endpoint, "key") as client:
+        read_card.analyze_card(image_file, "biz-card", client)
+    return 1
+
+
+SCENARIO_FUNCTIONS = {
+    "single-card": single_card,
+    "card-batch": card_batch,
+    "card-batch-unpooled": card_batch_unpooled,
+    "analyzer-redeploy": analyzer_redeploy,
+    "invoice-batch": invoice_batch,
+    "large-upload": large_upload,
+}
+
+
+def current_rss():
+    """
+    Returns the resident memory of this process.
+
+    Returns:
+        int: Bytes of resident memory, or None if it can't be measured on this platform
+    """
+
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        pass
+    # Elsewhere (e.g. Windows), psutil is used if it is installed
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class PeakRss:
+    """
+    Samples the process's resident memory on a background thread while a scenario runs.
+
+    increase is the highest resident memory seen above the level at the start, so
+    a file read whole into memory shows up as an increase of about its size.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _sample(self):
+        while True:
+            self.peak = max(self.peak, current_rss())
+            if self._stop.wait(self.interval):
+                return
+
+    @property
+    def increase(self):
+        """Bytes of resident memory above the level at the start, or None if not measured."""
+        return None if self.start is None else self.peak - self.start
+
+
+def run_scenario(scenario, service, args):
+    """
+    Runs one benchmark scenario against the simulated service.
+
+    This function:
+    - Runs the scenario in a temporary folder, with the lab scripts' console output hidden
+    - Starts the clients' shared rate limiters afresh, so a scenario never inherits the rate
+      an earlier one ramped up to (or was throttled down to)
+    - Times every operation the lab code records (see instrumentation.Operation)
+    - Counts the service's responses by status code, and the connections the clients opened
+    - Samples the process's peak resident memory (the simulated service discards uploads,
+      so this is the memory used by the lab code)
+
+    Args:
+        scenario (str): One of SCENARIOS
+        service (SimulatedService): The running simulated service
+        args (argparse.Namespace): The benchmark settings
+
+    Returns:
+        dict: The scenario's operations per second, latency percentiles, response and connection counts
+            and peak memory
+    """
+
+    recorder = LatencyRecorder()
+    set_recorder(recorder)
+    reset_rate_limiters()
+    service.reset_stats()
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    output = io.StringIO()
+    memory = PeakRss()
+    error = None
+    start = time.perf_counter()
+    try:
+        # The lab scripts print their progress and save results.json in the current folder
+        os.chdir(workdir)
+        with contextlib.redirect_stdout(output), memory:
+            operations = SCENARIO_FUNCTIONS[scenario](service, args, workdir)
+    except ImportError as ex:
+        operations, error = 0, f"skipped ({ex})"
+    except Exception as ex:
+        operations, error = 0, f"failed: {ex}"
+    finally:
+        elapsed = time.perf_counter() - start
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = sorted(recorder.latencies)
+    responses = Counter()
+    for (route, status), count in service.stats.items():
+        responses[str(status)] += count
+    return {
+        "scenario": scenario,
+        "operations": operations,
+        "seconds": round(elapsed, 3),
+        "ops_per_second": round(operations / elapsed, 2) if operations else 0.0,
+        "p50_seconds": round(statistics.median(latencies), 4) if latencies else None,
+        "p99_seconds": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 4) if latencies else None,
+        "statuses": dict(recorder.statuses),
+        "responses": dict(sorted(responses.items())),
+        "connections": service.connections,
+        "connections_per_100": round(service.connections * 100 / operations, 1) if operations else None,
+        "peak_rss_increase_mb": round(memory.increase / 1024 / 1024, 1) if memory.increase is not None else None,
+        "error": error,
+    }
+
+
+def print_result(result):
+    """
+    Displays the result of one scenario.
+
+    Args:
+        result (dict): A result returned by run_scenario
+    """
+
+    if result["error"]:
+        print(f"{result['scenario']:20} {result['error']}")
+        return
+    print(f"{result['scenario']:20} {result['operations']:6} ops in {result['seconds']:8.2f}s  "
+          f"{result['ops_per_second']:8.2f} ops/s  p50 {result['p50_seconds']:.3f}s  p99 {result['p99_seconds']:.3f}s")
+    statuses = ", ".join(f"{status} {count}" for status, count in sorted(result["statuses"].items()))
+    responses = ", ".join(f"{status} {count}" for status, count in result["responses"].items())
+    print(f"{'':20} operations: {statuses}; responses: {responses}")
+    memory = "not measured" if result["peak_rss_increase_mb"] is None else f"+{result['peak_rss_increase_mb']} MB"
+    print(f"{'':20} connections: {result['connections']} ({result['connections_per_100']} per 100 operations); "
+          f"peak memory: {memory}")
+
+
+if __name__ == "__main__":
+    main()
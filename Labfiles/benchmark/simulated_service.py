@@ -0,0 +1,466 @@
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# The result replayed for Content Understanding analyses, unless another one is given
+DEFAULT_CU_RESULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "content-app", "results.json")
+
+# A minimal prebuilt-invoice result, replayed for Document Intelligence analyses
+# unless a recorded one is given (the SDK only needs these properties to build its AnalyzeResult)
+DEFAULT_DI_RESULT = {
+    "apiVersion": "2023-07-31",
+    "modelId": "prebuilt-invoice",
+    "stringIndexType": "textElements",
+    "content": "CONTOSO LTD.\nMicrosoft Corp\nTotal $110.00",
+    "pages": [],
+    "documents": [{
+        "docType": "invoice",
+        "confidence": 1.0,
+        "spans": [],
+        "fields": {
+            "VendorName": {"type": "string", "valueString": "CONTOSO LTD.", "content": "CONTOSO LTD.", "confidence": 0.93},
+            "CustomerName": {"type": "string", "valueString": "Microsoft Corp", "content": "Microsoft Corp", "confidence": 0.91},
+            "InvoiceTotal": {"type": "currency", "content": "$110.00", "confidence": 0.97,
+                             "valueCurrency": {"amount": 110.0, "currencySymbol": "$", "currencyCode": "USD"}},
+        },
+    }],
+}
+
+
+class TokenBucket:
+    """
+    The quota of the simulated service: rate requests per second, with bursts of up to burst requests.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        Args:
+            rate (float): Requests per second allowed on average
+            burst (float): Maximum number of requests allowed at once (defaults to one second's worth)
+        """
+
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Takes a token if one is available.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the seconds until a token is available
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class SimulatedService:
+    """
+    A local stand-in for the Azure AI Services endpoint used by the labs.
+
+    It implements the routes the lab scripts call, with the same status codes and headers:
+
+    - Content Understanding: GET, PUT and DELETE of /contentunderstanding/analyzers/{name},
+      POST /contentunderstanding/analyzers/{name}:analyze and GET /contentunderstanding/analyzerResults/{id}
+    - Document Intelligence: POST /formrecognizer/documentModels/{model}:analyze and
+      GET /formrecognizer/documentModels/{model}/analyzeResults/{id} (also under /documentintelligence)
+
+    With https=True it serves TLS with a self-signed certificate (created with the
+    openssl command unless one is given), so the cost of TLS handshakes is part of
+    what the benchmarks measure, as it is against the real endpoint. Clients must
+    trust certfile, e.g. with REQUESTS_CA_BUNDLE and SSL_CERT_FILE.
+
+    Every request waits for the configured latency. A share of requests fail with
+    500 (failure_rate) or are throttled with 429 and Retry-After (throttle_rate, or
+    whenever the quota is exceeded). Accepted analyze requests are counted by the
+    SHA-256 of the content sent (uploads), so a test can check that no file was
+    analyzed twice; while refuse_uploads is set, every analyze request is throttled
+    instead, so no new analysis starts. Operations report "Running" until their
+    processing time has passed, then replay a recorded result.
+
+    Use it as a context manager:
+
+        with SimulatedService(latency=0.05, processing_time=1) as service:
+            client = ContentUnderstandingClient(service.endpoint, "key")
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.02, processing_time=0.5, failure_rate=0.0,
+                 throttle_rate=0.0, quota=None, cu_result=DEFAULT_CU_RESULT, di_result=None, seed=None,
+                 https=False, certfile=None, keyfile=None):
+        """
+        Args:
+            host (str): Address to listen on
+            port (int): Port to listen on (0 picks a free port)
+            latency (float): Average seconds the service takes to answer a request (varies by +/-50%)
+            processing_time (float): Seconds an operation runs before it reaches a terminal state
+            failure_rate (float): Share of requests answered with 500 Internal Server Error
+            throttle_rate (float): Share of requests answered with 429 Too Many Requests
+            quota (float): Requests per second allowed for the key, or None for no limit
+            cu_result (str): Path of a recorded analyzerResults response to replay
+            di_result (str): Path of a recorded analyzeResult to replay, or None for a sample invoice
+            seed (int): Seed for the random latencies and failures, to make runs repeatable
+            https (bool): Whether to serve HTTPS instead of plain HTTP
+            certfile (str): PEM certificate for HTTPS (defaults to a new self-signed one for host)
+            keyfile (str): PEM private key of certfile (if it isn't in certfile)
+        """
+
+        self.latency = latency
+        self.processing_time = processing_time
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.quota = TokenBucket(quota) if quota else None
+        self.random = random.Random(seed)
+        self.stats = Counter()   # (route, status code) -> number of responses
+        self.connections = 0     # number of TCP connections accepted
+        self.uploads = Counter() # SHA-256 of analyzed content -> number of analyze requests accepted
+        self.refuse_uploads = False
+        self.in_flight = 0       # number of requests being handled
+        self.analyzers = {}      # analyzer name -> definition
+        self.operations = {}     # operation ID -> (time it completes, kind)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        with open(cu_result, "r", encoding="utf-8") as file:
+            self.cu_result = json.load(file)
+        if di_result:
+            with open(di_result, "r", encoding="utf-8") as file:
+                self.di_result = json.load(file)
+        else:
+            self.di_result = DEFAULT_DI_RESULT
+
+        self.certfile = None
+        self._cert_folder = None
+        ssl_context = None
+        if https:
+            if certfile is None:
+                self._cert_folder = tempfile.mkdtemp(prefix="simulated-service-")
+                certfile, keyfile = self_signed_certificate(host, self._cert_folder)
+            self.certfile = certfile
+            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ssl_context.load_cert_chain(certfile, keyfile)
+
+        self.server = _Server((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        self.server.ssl_context = ssl_context
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        """The endpoint URL to give the clients."""
+        host, port = self.server.server_address[:2]
+        return f"{self.scheme}://{host}:{port}/"
+
+    @property
+    def scheme(self):
+        """"https" or "http"."""
+        return "http" if self.server.ssl_context is None else "https"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Starts answering requests on a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the server."""
+        self.server.shutdown()
+        self.server.server_close()
+        if self._cert_folder:
+            shutil.rmtree(self._cert_folder, ignore_errors=True)
+
+    def reset_stats(self):
+        """Clears the response and connection counts (e.g. between benchmark scenarios)."""
+        with self._lock:
+            self.stats.clear()
+            self.connections = 0
+            self.uploads.clear()
+
+    def count(self, route, status):
+        with self._lock:
+            self.stats[(route, status)] += 1
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def accept_upload(self, digest):
+        """Counts an analyze request for the content with this digest, or returns False while refuse_uploads is set."""
+        with self._lock:
+            if self.refuse_uploads:
+                return False
+            self.uploads[digest] += 1
+            return True
+
+    def count_in_flight(self, change):
+        with self._lock:
+            self.in_flight += change
+
+    def new_operation(self, kind):
+        """Starts an operation and returns its ID."""
+        with self._lock:
+            id_value = f"{kind}-{next(self._ids)}"
+            self.operations[id_value] = (time.monotonic() + self.processing_time, kind)
+        return id_value
+
+    def operation_done(self, id_value):
+        """Returns whether an operation has finished, or None if there is no such operation."""
+        with self._lock:
+            operation = self.operations.get(id_value)
+        return None if operation is None else time.monotonic() >= operation[0]
+
+    def fault(self):
+        """
+        Decides whether the next request fails.
+
+        Returns:
+            tuple: (status code, Retry-After seconds or None), or None if the request succeeds
+        """
+
+        if self.quota is not None:
+            wait = self.quota.take()
+            if wait > 0:
+                return 429, max(1, math.ceil(wait))
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            return 429, 1
+        if roll < self.throttle_rate + self.failure_rate:
+            return 500, None
+        return None
+
+    def delay(self):
+        """Waits for the simulated service latency."""
+        if self.latency:
+            time.sleep(self.latency * (0.5 + self.random.random()))
+
+
+def self_signed_certificate(host, folder):
+    """
+    Creates a self-signed certificate for host with the openssl command.
+
+    Args:
+        host (str): The IP address or host name the certificate is for
+        folder (str): Folder to write cert.pem and key.pem in
+
+    Returns:
+        tuple: (certificate path, private key path)
+    """
+
+    certfile = os.path.join(folder, "cert.pem")
+    keyfile = os.path.join(folder, "key.pem")
+    # Clients check the name against the subjectAltName, which must say whether it is an IP address
+    name = f"IP:{host}" if host.replace(".", "").isdigit() or ":" in host else f"DNS:{host}"
+    try:
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                        "-keyout", keyfile, "-out", certfile, "-subj", f"/CN={host}", "-addext", f"subjectAltName={name}"],
+                       check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as ex:
+        raise RuntimeError(f"Could not create a self-signed certificate with openssl ({ex}); "
+                           "install openssl or give a certfile") from ex
+    return certfile, keyfile
+
+
+class _Server(ThreadingHTTPServer):
+
+    def get_request(self):
+        request, client_address = super().get_request()
+        if self.ssl_context is not None:
+            # The TLS handshake happens on the connection's own thread, when the request is first read,
+            # so a slow handshake doesn't hold up accepting other connections
+            request = self.ssl_context.wrap_socket(request, server_side=True, do_handshake_on_connect=False)
+        return request, client_address
+
+    def process_request(self, request, client_address):
+        # Called once per accepted connection, however many requests are then sent on it
+        self.service.count_connection()
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # A client that stops halfway through (e.g. a batch being killed, or a handshake
+        # with a client that doesn't trust the certificate) is expected, not an error
+        if not isinstance(sys.exc_info()[1], (ConnectionError, ssl.SSLError)):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    # HTTP/1.1 keeps connections alive, like the real endpoint
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, route, status, body=None, headers=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.server.service.count(route, status)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self, keep=True, digest=None):
+        # Bodies are sent either with a Content-Length or chunked (a streamed file of unknown size)
+        # Only analyzer definitions are kept; uploaded files are read in blocks and discarded,
+        # so a large upload doesn't add to the memory measured by the benchmarks
+        data = bytearray()
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return bytes(data)
+                self._read_block(size, data if keep else None, digest)
+                self.rfile.readline()
+        self._read_block(int(self.headers.get("Content-Length") or 0), data if keep else None, digest)
+        return bytes(data)
+
+    def _read_block(self, size, data, digest):
+        # Reads size bytes, appending them to data unless it is None and adding them to digest if given
+        while size > 0:
+            block = self.rfile.read(min(size, 65536))
+            if not block:
+                return
+            size -= len(block)
+            if data is not None:
+                data += block
+            if digest is not None:
+                digest.update(block)
+
+    def operation_location(self, path):
+        return f"{self.server.service.scheme}://{self.headers['Host']}{path}"
+
+    def handle_request(self, method):
+        service = self.server.service
+        path = self.path.split("?")[0]
+        query = self.path[len(path):]
+        route = _route(method, path)
+        digest = hashlib.sha256()
+        body = self.read_body(keep=route == "cu-put-analyzer", digest=digest) if method in ("POST", "PUT") else b""
+
+        service.delay()
+        if route is None:
+            return self.send_json("unknown", 404, {"error": {"code": "NotFound", "message": f"No route for {method} {path}"}})
+        fault = service.fault()
+        if fault is not None:
+            status, retry_after = fault
+            headers = {"Retry-After": str(retry_after)} if retry_after else None
+            return self.send_json(route, status, {"error": {"code": str(status), "message": "Simulated failure"}}, headers)
+        if route in ("cu-analyze", "di-analyze") and not service.accept_upload(digest.hexdigest()):
+            return self.send_json(route, 429, {"error": {"code": "429", "message": "Uploads refused"}}, {"Retry-After": "1"})
+
+        name = path.rsplit("/", 1)[-1]
+        if route == "cu-get-analyzer":
+            definition = service.analyzers.get(name)
+            if definition is None:
+                return self.send_json(route, 404, {"error": {"code": "NotFound", "message": f"Analyzer {name} not found"}})
+            return self.send_json(route, 200, dict(definition, analyzerId=name, status="ready"))
+
+        if route == "cu-delete-analyzer":
+            service.analyzers.pop(name, None)
+            return self.send_json(route, 204)
+
+        if route == "cu-put-analyzer":
+            service.analyzers[name] = json.loads(body)
+            id_value = service.new_operation("analyzer")
+            location = self.operation_location(f"/contentunderstanding/analyzerResults/{id_value}{query}")
+            return self.send_json(route, 201, dict(service.analyzers[name], analyzerId=name, status="creating"),
+                                  {"Operation-Location": location})
+
+        if route == "cu-analyze":
+            id_value = service.new_operation("analyze")
+            location = self.operation_location(f"/contentunderstanding/analyzerResults/{id_value}{query}")
+            return self.send_json(route, 202, {"id": id_value, "status": "Running"}, {"Operation-Location": location})
+
+        if route == "cu-result":
+            done = service.operation_done(name)
+            if done is None:
+                return self.send_json(route, 404, {"error": {"code": "NotFound", "message": f"Operation {name} not found"}})
+            if not done:
+                return self.send_json(route, 200, {"id": name, "status": "Running"})
+            return self.send_json(route, 200, dict(service.cu_result, id=name, status="Succeeded"))
+
+        if route == "di-analyze":
+            model_id = name.split(":")[0]
+            id_value = service.new_operation("document")
+            location = self.operation_location(f"{path.rsplit('/', 1)[0]}/{model_id}/analyzeResults/{id_value}{query}")
+            return self.send_json(route, 202, None, {"Operation-Location": location})
+
+        if route == "di-result":
+            done = service.operation_done(name)
+            if done is None:
+                return self.send_json(route, 404, {"error": {"code": "NotFound", "message": f"Operation {name} not found"}})
+            now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            result = {"status": "succeeded" if done else "running", "createdDateTime": now, "lastUpdatedDateTime": now}
+            if done:
+                result["analyzeResult"] = service.di_result
+            return self.send_json(route, 200, result)
+
+    def handle_counted(self, method):
+        # A request is still handled after its client has gone (e.g. the batch was killed mid-upload)
+        self.server.service.count_in_flight(1)
+        try:
+            self.handle_request(method)
+        finally:
+            self.server.service.count_in_flight(-1)
+
+    def do_GET(self):
+        self.handle_counted("GET")
+
+    def do_POST(self):
+        self.handle_counted("POST")
+
+    def do_PUT(self):
+        self.handle_counted("PUT")
+
+    def do_DELETE(self):
+        self.handle_counted("DELETE")
+
+
+def _route(method, path):
+    # Names the route a request is for, or returns None if the service has no such route
+    parts = path.strip("/").split("/")
+    if len(parts) == 3 and parts[:2] == ["contentunderstanding", "analyzers"]:
+        if method == "POST" and parts[2].endswith(":analyze"):
+            return "cu-analyze"
+        return {"GET": "cu-get-analyzer", "PUT": "cu-put-analyzer", "DELETE": "cu-delete-analyzer"}.get(method)
+    if len(parts) == 3 and parts[:2] == ["contentunderstanding", "analyzerResults"] and method == "GET":
+        return "cu-result"
+    if len(parts) == 3 and parts[0] in ("formrecognizer", "documentintelligence") and parts[1] == "documentModels":
+        if method == "POST" and parts[2].endswith(":analyze"):
+            return "di-analyze"
+    if len(parts) == 5 and parts[0] in ("formrecognizer", "documentintelligence") and parts[3] == "analyzeResults":
+        if method == "GET":
+            return "di-result"
+    return None
@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# The commands are started through the unified entry point, as short-lived jobs start them
+LABFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CLI = os.path.join(LABFILES, "cli.py")
+DEFAULT_BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup-budget.json")
+sys.path.insert(0, LABFILES)
+sys.path.insert(0, os.path.join(LABFILES, "knowledge", "python"))
+sys.path.insert(0, os.path.join(LABFILES, "common"))
+from cli import COMMANDS
+
+# The real run of each command, as {folder} (a temporary working folder) and {labfiles} arguments
+# --help only loads what parsing the arguments needs; a real run also loads what the command then
+# imports (the Azure SDKs, pypdf, ...), so both are measured
+# Commands that call Azure run against the simulated service; the search commands use a local index
+RUNS = {
+    "create-analyzer": ["{labfiles}/content-app/biz-card.json", "--force"],
+    "read-card": ["{labfiles}/content-app/biz-card-1.png", "--schema", "{labfiles}/content-app/biz-card.json", "--no-cache"],
+    "document-analysis": [],
+    "validate-labels": ["{labfiles}/custom-doc-intelligence/sample-forms", "--workers", "2"],
+    "test-model": ["{labfiles}/custom-doc-intelligence/sample-forms", "--max-in-flight", "5"],
+    "search-app": ["--local", "{folder}/index", "--queries", "{folder}/queries.txt"],
+    "index-benchmark": ["{folder}/index", "--queries", "{folder}/queries.txt", "--repeat", "1", "--local-only"],
+    "run-benchmark": ["single-card", "--singles", "1", "--latency", "0.001", "--processing-time", "0.01"],
+    "startup-benchmark": ["validate-labels", "--runs", "1", "--help-only", "--budget", "{folder}/no-budget.json"],
+}
+# The commands whose real run calls the simulated service
+SERVICE_COMMANDS = ("create-analyzer", "read-card", "document-analysis", "test-model")
+# The modules tracked by a new budget: third-party packages, and standard modules that take long to load
+HEAVY_MODULES = ["aiohttp", "asyncio", "azure", "dotenv", "ijson", "multiprocessing", "psutil", "pyarrow", "pypdf",
+                 "requests", "sqlite3", "ssl", "urllib3"]
+
+
+def main():
+
+    try:
+        # Get the commands to measure and the budget to check them against
+        # e.g. python startup-benchmark.py
+        #      python startup-benchmark.py read-card document-analysis --runs 20
+        #      python startup-benchmark.py --help-only   (only parse the arguments, without running the commands)
+        #      python startup-benchmark.py --update-budget   (after a change that is meant to cost more)
+        parser = argparse.ArgumentParser(description="Measure the cold start of each lab command with python -X importtime")
+        parser.add_argument("commands", nargs="*", metavar="command",
+                            help=f"Commands to measure: {', '.join(COMMANDS)} (default: all)")
+        parser.add_argument("--runs", type=int, default=10, help="Number of fresh interpreters started per command")
+        parser.add_argument("--help-only", action="store_true", help="Only measure each command's --help, not its real run")
+        parser.add_argument("--budget", default=DEFAULT_BUDGET,
+                            help="JSON file of the heavy modules each command may import, by command and run (help or run)")
+        parser.add_argument("--update-budget", action="store_true",
+                            help="Write the heavy modules each command imports to the budget file instead of checking them")
+        parser.add_argument("--top", type=int, default=3, help="Number of heaviest imports shown per command")
+        parser.add_argument("--json", help="Also write the results to this JSON file")
+        args = parser.parse_args()
+        unknown = [command for command in args.commands if command not in COMMANDS]
+        if unknown:
+            parser.error(f"unknown command: {', '.join(unknown)}")
+
+        # The budget lists the heavy modules (third-party packages and slow standard modules) that each
+        # command may load; times vary too much between machines to be a budget, so they are only reported
+        budget = {"heavy_modules": HEAVY_MODULES, "commands": {}}
+        if os.path.exists(args.budget):
+            with open(args.budget, "r", encoding="utf-8") as file:
+                budget = json.load(file)
+        heavy_modules = set(budget["heavy_modules"])
+
+        # The interpreter's own startup (site, encodings, ...) is measured once and left out of each command's time
+        baseline = measure([sys.executable, "-X", "importtime", "-c", "pass"], args.runs)
+        baseline.pop("output")
+        print(f"Interpreter startup: {baseline['wall_ms']:.1f} ms, {baseline['import_ms']:.1f} ms of imports "
+              f"(median of {args.runs} runs)\n")
+        print(f"{'Command':20} {'Run':5} {'Time (ms)':>10} {'Imports (ms)':>12} {'x Startup':>10}  Heaviest imports")
+
+        # The real runs share a working folder (for the files they write) and a simulated service
+        # The service answers quickly, so a run's time is mostly its own startup and work
+        # (it is only imported once the arguments are parsed, like the lab scripts' heavy imports)
+        from simulated_service import SimulatedService
+        results, over_budget = [], []
+        with tempfile.TemporaryDirectory(prefix="startup-") as folder, \
+                SimulatedService(latency=0.001, processing_time=0.01, seed=1) as service:
+            env = dict(os.environ, ENDPOINT=service.endpoint, KEY="key", ANALYZER_NAME="biz-card",
+                       DOC_INTELLIGENCE_ENDPOINT=service.endpoint, DOC_INTELLIGENCE_KEY="key", MODEL_ID="custom-model")
+            if not args.help_only:
+                write_search_files(folder)
+
+            for command in args.commands or COMMANDS:
+                runs = {"help": ["--help"]}
+                if not args.help_only:
+                    runs["run"] = [arg.format(folder=folder, labfiles=LABFILES) for arg in RUNS[command]]
+                for run, command_args in runs.items():
+                    requests = sum(service.stats.values())
+                    result = measure([sys.executable, "-X", "importtime", CLI, command] + command_args, args.runs, baseline,
+                                     cwd=folder, env=env)
+                    output = result.pop("output")
+                    # The scripts print errors instead of failing, so a run that never reached the service failed
+                    if run == "run" and command in SERVICE_COMMANDS and sum(service.stats.values()) == requests:
+                        raise RuntimeError(f"{command} never called the simulated service:\n{output}")
+
+                    result["command"] = command
+                    result["run"] = run
+                    # The time is also reported as a multiple of a bare interpreter's, measured in the same run
+                    result["startup_ratio"] = round(result["wall_ms"] / baseline["wall_ms"], 2)
+                    result["heavy_modules"] = heavy_imports(result["modules"], heavy_modules)
+                    allowed = budget["commands"].get(command, {}).get(run)
+                    result["over_budget"] = [] if allowed is None else sorted(set(result["heavy_modules"]) - set(allowed))
+                    results.append(result)
+                    if result["over_budget"]:
+                        over_budget.append(f"{command} ({run}) imports {', '.join(result['over_budget'])}")
+
+                    heaviest = ", ".join(f"{name} {ms:.1f}" for name, ms in result["heaviest"][:args.top])
+                    flag = f"  OVER: imports {', '.join(result['over_budget'])}" if result["over_budget"] else ""
+                    print(f"{command:20} {run:5} {result['wall_ms'] - baseline['wall_ms']:10.1f} {result['import_ms']:12.1f} "
+                          f"{result['startup_ratio']:10.2f}  {heaviest}{flag}")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as file:
+                json.dump({"baseline": baseline, "commands": results}, file, indent=4)
+
+        if args.update_budget:
+            for result in results:
+                budget["commands"].setdefault(result["command"], {})[result["run"]] = result["heavy_modules"]
+            with open(args.budget, "w", encoding="utf-8") as file:
+                json.dump(budget, file, indent=4)
+                file.write("\n")
+            print(f"\nBudget written to {args.budget}")
+            return
+
+        # A non-zero exit code lets a build stop a change that slows every short-lived job down
+        if over_budget:
+            print("\nOver the import budget (run with --update-budget if the change is meant to load them):")
+            for line in over_budget:
+                print(f"   {line}")
+            sys.exit(1)
+
+    except Exception as ex:
+        print(ex)
+        sys.exit(1)
+
+
+def heavy_imports(modules, heavy_modules):
+    """
+    Lists the heavy modules among the modules a command imported.
+
+    Args:
+        modules (iterable): Every module the command imported, e.g. "azure.core.credentials"
+        heavy_modules (set): The top-level names of the heavy modules, e.g. "azure"
+
+    Returns:
+        list: The heavy modules imported, by top-level name, in name order
+    """
+
+    return sorted({name.split(".")[0] for name in modules} & heavy_modules)
+
+
+def parse_importtime(stderr):
+    """
+    Reads the report that python -X importtime writes to stderr.
+
+    Each line is "import time: <self us> | <cumulative us> | <module>", with the
+    module indented under the module that imported it; unindented modules were
+    imported directly by the script (or the interpreter).
+
+    Args:
+        stderr (str): The interpreter's stderr
+
+    Returns:
+        tuple: (top-level module -> cumulative import time in microseconds,
+        set of every module imported, at any level)
+    """
+
+    imports, modules = {}, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue   # the header line
+        name = parts[2].rstrip()[1:]   # one space follows the "|", then two more per level of nesting
+        if not name.strip():
+            continue
+        modules.add(name.strip())
+        if name.startswith(" "):
+            continue   # imported by another module, and counted in its cumulative time
+        imports[name] = imports.get(name, 0) + int(parts[1])
+    return imports, modules
+
+
+def write_search_files(folder):
+    """
+    Writes the local index and the queries used by the real runs of the search commands.
+
+    Args:
+        folder (str): The working folder of the runs (the index goes in its "index" folder)
+    """
+
+    from local_index import LocalIndex
+    from search_batch import KEY_FIELD
+
+    documents = [{KEY_FIELD: f"https://storage/docs/{index:04}", "metadata_storage_name": f"doc-{index:04}.pdf",
+                  "locations": [["London", "Paris", "Seattle"][index % 3]], "people": [f"Person {index % 50}"],
+                  "keyphrases": ["invoice", f"topic {index % 20}"]} for index in range(2000)]
+    with LocalIndex(os.path.join(folder, "index")) as index:
+        index.update(documents)
+    with open(os.path.join(folder, "queries.txt"), "w", encoding="utf-8") as file:
+        file.write("london\nlocations:paris\n\"person 7\" invoice\n")
+
+
+def measure(command, runs, baseline=None, cwd=None, env=None):
+    """
+    Starts a command in fresh interpreters and measures how long they take to start.
+
+    Args:
+        command (list): The command line, including python -X importtime
+        runs (int): Number of times the command is started
+        baseline (dict): The interpreter's own startup (from an earlier measure), whose
+            imports are left out of the command's import time and heaviest imports
+        cwd (str): Folder the command runs in, or None for the current folder
+        env (dict): Environment variables of the command, or None for this process's
+
+    Returns:
+        dict: Median wall-clock and import times in milliseconds, the heaviest top-level
+        imports as (module, milliseconds) pairs, every module imported (at any level)
+        and the output of the last run
+    """
+
+    # One run first, so the bytecode caches are written and every measured run starts the same way
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=cwd, env=env)
+
+    walls, totals, modules, imported = [], [], {}, set()
+    skip = set(baseline["modules"]) if baseline else set()
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=cwd, env=env)
+        walls.append((time.perf_counter() - start) * 1000)
+        if process.returncode != 0:
+            raise RuntimeError(f"{' '.join(command[3:])} failed:\n{process.stdout[-2000:]}{process.stderr[-2000:]}")
+        imports, all_modules = parse_importtime(process.stderr)
+        imports = {name: us for name, us in imports.items() if name not in skip}
+        imported |= all_modules
+        totals.append(sum(imports.values()) / 1000)
+        for name, us in imports.items():
+            modules.setdefault(name, []).append(us / 1000)
+
+    heaviest = sorted(((name, statistics.median(times)) for name, times in modules.items()), key=lambda item: -item[1])
+    return {
+        "wall_ms": round(statistics.median(walls), 2),
+        "import_ms": round(statistics.median(totals), 2),
+        "heaviest": [(name, round(ms, 2)) for name, ms in heaviest],
+        "modules": sorted(imported),
+        "output": process.stdout[-2000:],
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import runpy
+import sys
+
+
+# The lab scripts, by command name: (path from Labfiles, description)
+# A command's script is only loaded when that command runs, so each command
+# imports just what it needs (and the Azure SDKs only once it calls the service)
+LABFILES = os.path.dirname(os.path.abspath(__file__))
+COMMANDS = {
+    "create-analyzer": ("content-app/create-analyzer.py", "Create or update Content Understanding analyzers"),
+    "read-card": ("content-app/read-card.py", "Analyze business cards with Content Understanding"),
+    "document-analysis": ("prebuilt-doc-intelligence/Python/document-analysis.py", "Analyze invoices with the prebuilt invoice model"),
+    "validate-labels": ("custom-doc-intelligence/Python/validate-labels.py", "Check training labels before uploading them"),
+    "test-model": ("custom-doc-intelligence/Python/test-model.py", "Test or evaluate a custom Document Intelligence model"),
+    "search-app": ("knowledge/python/search-app.py", "Search the knowledge mining index"),
+    "index-benchmark": ("knowledge/python/index-benchmark.py", "Compare a local index with the search service"),
+    "run-benchmark": ("benchmark/run-benchmark.py", "Benchmark the lab scripts against a simulated service"),
+    "startup-benchmark": ("benchmark/startup-benchmark.py", "Measure how long each command takes to start"),
+}
+
+
+def main():
+
+    # Get the command to run; everything after it is passed to the command's script
+    # e.g. python cli.py read-card biz-card-1.png
+    #      python cli.py document-analysis ./invoices --max-in-flight 16
+    #      python cli.py test-model ../custom-doc-intelligence/sample-forms --min-precision 0.9
+    #      python cli.py read-card --help
+    if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
+        print_commands()
+        return
+    command = sys.argv[1]
+    if command not in COMMANDS:
+        print(f"Unknown command '{command}'\n")
+        print_commands()
+        sys.exit(2)
+    run_command(command, sys.argv[2:])
+
+
+def run_command(command, args):
+    """
+    Runs a lab script as if it had been started directly (python <script> <args>).
+
+    The script's folder goes first on the module search path, so its helper
+    modules are found, and its .env file is found from the script's location.
+    Relative paths in the arguments are relative to the current folder.
+
+    Args:
+        command (str): One of COMMANDS
+        args (list): The script's command-line arguments
+    """
+
+    path = os.path.join(LABFILES, *COMMANDS[command][0].split("/"))
+    sys.argv = [path] + list(args)
+    sys.path.insert(0, os.path.dirname(path))
+    runpy.run_path(path, run_name="__main__")
+
+
+def print_commands():
+    """Displays the usage and the available commands."""
+
+    print("usage: python cli.py <command> [arguments]\n\ncommands:")
+    for command, (path, description) in COMMANDS.items():
+        print(f"  {command:20} {description}")
+    print("\nRun python cli.py <command> --help for the arguments of a command.")
+
+
+if __name__ == "__main__":
+    main()
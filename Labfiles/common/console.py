@@ -0,0 +1,16 @@
+import sys
+
+
+def clear_console():
+    """
+    Clears the terminal before a lab script prints its output.
+
+    The screen is cleared with ANSI escape codes (supported by Windows Terminal,
+    PowerShell and every Unix terminal) rather than by running cls or clear in a
+    subprocess, which costs more than the rest of a short script's startup. Nothing
+    is written when the output is redirected to a file or another program.
+    """
+
+    if sys.stdout.isatty():
+        sys.stdout.write("\033[H\033[2J\033[3J")
+        sys.stdout.flush()
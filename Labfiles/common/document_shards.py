@@ -0,0 +1,267 @@
+import contextlib
+import os
+import re
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+# A page range of a PDF, saved as a PDF of its own
+Shard = namedtuple("Shard", ["first_page", "last_page", "path"])
+
+# Keys that hold a page number, in the service's JSON (camelCase) and in the Python SDK's to_dict() (snake_case)
+PAGE_KEYS = ("pageNumber", "page_number", "startPageNumber", "endPageNumber")
+
+# Text the shards' content is joined with: one line break between pages, as the
+# service returns for a whole document, and a blank line between Markdown blocks
+SEPARATORS = {"content": "\n", "markdown": "\n\n"}
+
+# Content Understanding gives each element's position as e.g. "D(3,0.5,1.2,...)", starting with its page number
+SOURCE_PAGE = re.compile(r"D\((\d+),")
+
+# Sections and figures refer to other elements by their place in the result, e.g. "/paragraphs/12"
+ELEMENT_PATH = re.compile(r"^/(\w+)/(\d+)$")
+
+
+def _pypdf():
+    # pypdf is only needed to split PDFs
+    try:
+        import pypdf
+    except ImportError:
+        raise ImportError("Splitting PDFs into shards requires pypdf (pip install pypdf)")
+    return pypdf
+
+
+def count_pages(path):
+    """
+    Counts the pages of a PDF without reading its content.
+
+    Args:
+        path (str): Path to the PDF
+
+    Returns:
+        int: The number of pages
+    """
+
+    # pypdf reads a file given by name into memory, but an open file only as far as it needs
+    with open(path, "rb") as file:
+        return len(_pypdf().PdfReader(file).pages)
+
+
+def split_pdf(path, pages_per_shard, folder):
+    """
+    Splits a PDF locally into page ranges, each saved as a PDF of its own.
+
+    The shards are written one at a time, as they are asked for, so a caller that
+    deletes each shard once it has been analyzed only ever has a few on disk, and
+    neither the PDF nor its shards are held in memory.
+
+    Args:
+        path (str): Path to the PDF
+        pages_per_shard (int): Maximum number of pages in each shard
+        folder (str): Folder the shards are written to
+
+    Yields:
+        Shard: (first page, last page, path of the shard's PDF) per page range, in page order;
+        a document with no more pages than pages_per_shard is a single shard
+    """
+
+    pypdf = _pypdf()
+    pages_per_shard = max(1, pages_per_shard)
+    with open(path, "rb") as file:
+        reader = pypdf.PdfReader(file)
+        for first in range(0, len(reader.pages), pages_per_shard):
+            writer = pypdf.PdfWriter()
+            for page in reader.pages[first:first + pages_per_shard]:
+                writer.add_page(page)
+            shard_path = os.path.join(folder, f"pages-{first + 1}.pdf")
+            with open(shard_path, "wb") as shard_file:
+                writer.write(shard_file)
+            yield Shard(first + 1, first + len(writer.pages), shard_path)
+
+
+def _shift(node, pages, offsets, elements):
+    # Moves every page number, text offset and element reference of one shard's
+    # result so they point into the merged document (the node is changed in place)
+    if isinstance(node, list):
+        for item in node:
+            _shift(item, pages, offsets, elements)
+        return
+    if not isinstance(node, dict):
+        return
+    for key, value in node.items():
+        if key in PAGE_KEYS and isinstance(value, int):
+            node[key] = value + pages
+        elif key in ("spans", "span"):
+            for span in value if isinstance(value, list) else [value]:
+                if isinstance(span, dict) and isinstance(span.get("offset"), int):
+                    span["offset"] += offsets
+        elif key == "source" and isinstance(value, str):
+            node[key] = SOURCE_PAGE.sub(lambda match: f"D({int(match.group(1)) + pages},", value)
+        elif key == "elements" and isinstance(value, list):
+            node[key] = [_shift_element(element, elements) for element in value]
+        else:
+            _shift(value, pages, offsets, elements)
+
+
+def _shift_element(element, elements):
+    match = ELEMENT_PATH.match(element) if isinstance(element, str) else None
+    if match is None or match.group(1) not in elements:
+        return element
+    return f"/{match.group(1)}/{int(match.group(2)) + elements[match.group(1)]}"
+
+
+def _confidence(field):
+    return (field.get("confidence") or 0.0) if isinstance(field, dict) else 0.0
+
+
+def _merge(parts, pages):
+    # Merges the same part of every shard's result (a Document Intelligence
+    # analyzeResult, or one Content Understanding content) into one
+    merged = {}
+    text_length = {}     # text key -> length of the merged text so far
+    counts = {}          # list key -> number of merged items so far (for element references)
+    for part, page_offset in zip(parts, pages):
+        text_key = next((key for key in SEPARATORS if isinstance(part.get(key), str)), None)
+        offset = 0
+        if text_key is not None and text_key in text_length:
+            offset = text_length[text_key] + len(SEPARATORS[text_key])
+        _shift(part, page_offset, offset, dict(counts))
+
+        for key, value in part.items():
+            if key in SEPARATORS and isinstance(value, str):
+                merged[key] = merged[key] + SEPARATORS[key] + value if key in merged else value
+                text_length[key] = len(merged[key])
+            elif isinstance(value, list):
+                merged.setdefault(key, []).extend(value)
+                counts[key] = len(merged[key])
+            elif key == "fields" and isinstance(value, dict):
+                # A field found in several shards keeps the value the service was most confident of
+                fields = merged.setdefault(key, {})
+                for name, field in value.items():
+                    if name not in fields or _confidence(field) > _confidence(fields[name]):
+                        fields[name] = field
+            elif key == "startPageNumber" and key in merged:
+                merged[key] = min(merged[key], value)
+            elif key == "endPageNumber" and key in merged:
+                merged[key] = max(merged[key], value)
+            elif key not in merged:
+                merged[key] = value
+    return merged
+
+
+def merge_results(results, first_pages):
+    """
+    Merges the results of analyzing a document's shards into the result of one document.
+
+    Works on the results as JSON, in either of the shapes the labs use:
+
+    - A Document Intelligence analyzeResult (as returned by the service, or by the
+      SDK's AnalyzeResult.to_dict()): content is joined, and pages, paragraphs,
+      tables, documents and the other lists are concatenated
+    - A Content Understanding "result": the document contents of all the shards
+      become one content whose markdown is joined, whose pages, paragraphs and
+      other lists are concatenated and whose startPageNumber/endPageNumber cover
+      every shard; a field found in several shards keeps its most confident value
+
+    Each shard's page numbers, text offsets (spans) and element references
+    (e.g. "/paragraphs/12") are moved to where the shard sits in the whole document.
+
+    Args:
+        results (list): The shards' results, in page order (they are changed in place)
+        first_pages (list): The number, in the whole document, of each shard's first page
+
+    Returns:
+        dict: The merged result
+    """
+
+    pages = [first_page - 1 for first_page in first_pages]
+    if not any("contents" in result for result in results):
+        return _merge(results, pages)
+
+    # Content Understanding: merge each shard's document content, keeping any other contents as they are
+    documents, document_pages, others = [], [], []
+    for result, page_offset in zip(results, pages):
+        for content in result.get("contents", ()):
+            if content.get("kind", "document") == "document":
+                documents.append(content)
+                document_pages.append(page_offset)
+            else:
+                _shift(content, page_offset, 0, {})
+                others.append(content)
+    merged = dict(results[0])
+    merged["contents"] = ([_merge(documents, document_pages)] if documents else []) + others
+    warnings = [warning for result in results for warning in result.get("warnings") or ()]
+    if warnings:
+        merged["warnings"] = warnings
+    return merged
+
+
+def analyze_shards(path, analyze, pages_per_shard, max_in_flight=8, operation=None, executor=None):
+    """
+    Analyzes a large PDF as page ranges that run at the same time, then merges their results.
+
+    This function:
+    - Splits the PDF locally into shards of up to pages_per_shard pages, written to a
+      temporary folder one at a time
+    - Submits each shard as soon as it is written, with up to max_in_flight analyzed at
+      once, so the document takes about as long as its slowest shard instead of the sum
+      of all of them, and at most max_in_flight shards are on disk at any time
+    - Merges the shards' results into one document (see merge_results)
+    - Records each shard as an "analyze-shard" operation, if the document's operation is given
+
+    Args:
+        path (str): Path to the PDF
+        analyze (callable): Called with a Shard, whose PDF it should stream from shard.path;
+            returns its result as JSON (see merge_results) and raises an exception if the analysis failed
+        pages_per_shard (int): Maximum number of pages in each shard
+        max_in_flight (int): Maximum number of shards analyzed at the same time
+        operation (Operation): The document's instrumentation.Operation, or None
+        executor (Executor): Executor to run the shards on, shared by the documents of a batch;
+            if None, the document gets a ThreadPoolExecutor of max_in_flight threads of its own
+
+    Returns:
+        dict: The merged result
+    """
+
+    def run(shard):
+        try:
+            if operation is None:
+                return analyze(shard)
+            with operation.recorder.operation("analyze-shard", f"{path}#pages={shard.first_page}-{shard.last_page}"):
+                return analyze(shard)
+        finally:
+            os.remove(shard.path)
+
+    max_in_flight = max(1, max_in_flight)
+    split_seconds = 0.0
+    futures, first_pages = [], []
+    with tempfile.TemporaryDirectory(prefix="shards-") as folder, \
+            (contextlib.nullcontext(executor) if executor else ThreadPoolExecutor(max_workers=max_in_flight)) as executor:
+        shards = split_pdf(path, pages_per_shard, folder)
+        while True:
+            # The next shard is only written once a slot is free
+            running = [future for future in futures if not future.done()]
+            if len(running) >= max_in_flight:
+                wait(running, return_when=FIRST_COMPLETED)
+
+            # A failed shard fails the whole document (a merged result with missing pages would
+            # look complete), so no more shards are written once one has failed
+            if any(future.done() and future.exception() is not None for future in futures):
+                break
+
+            start = time.perf_counter()
+            shard = next(shards, None)
+            split_seconds += time.perf_counter() - start
+            if shard is None:
+                break
+            futures.append(executor.submit(run, shard))
+            first_pages.append(shard.first_page)
+        shards.close()
+
+        if operation is not None:
+            operation.add("split_seconds", split_seconds)
+            operation.add("shards", len(futures))
+        results = [future.result() for future in futures]
+    return merge_results(results, first_pages)
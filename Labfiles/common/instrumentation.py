@@ -0,0 +1,356 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Histogram buckets for each kind of measurement
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(1024 * 4 ** power for power in range(10))   # 1 KB to 256 MB
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# What each measurement of an operation means (all of them are optional)
+METRICS = {
+    "queue_seconds": "Time spent waiting for a free slot before the request was sent",
+    "upload_seconds": "Time to send the request body",
+    "accept_seconds": "Time from the end of the upload until the service accepted the request",
+    "submit_seconds": "Time to submit the request, including the upload",
+    "poll_wait_seconds": "Time from acceptance until the operation reached a terminal state",
+    "polls": "Number of status requests made",
+    "download_bytes": "Size of the result downloaded from the service",
+    "decode_seconds": "Local time spent parsing and decoding the result",
+    "split_seconds": "Local time spent splitting a large PDF into page-range shards",
+    "shards": "Number of page-range shards analyzed for the document",
+    "documents": "Number of documents returned",
+    "total_seconds": "Time for the whole operation",
+}
+
+
+class Operation:
+    """
+    The measurements of one operation, such as analyzing one file or running one query.
+
+    Code that takes part in the operation adds to it (operation.add("polls", 1),
+    with operation.time("decode_seconds"): ...), and the operation is recorded
+    once when it finishes. Use it as a context manager, so a failed operation is
+    still recorded (with status "Failed" and the error):
+
+        with recorder.operation("analyze", image_file) as operation:
+            response = client.analyze_file(analyzer, image_file, operation)
+    """
+
+    def __init__(self, recorder, kind, target=None):
+        """
+        Args:
+            recorder (Recorder): Where the operation is recorded when it finishes
+            kind (str): The kind of operation (e.g. "analyze", "create-analyzer", "search")
+            target (str): What the operation worked on (a file, URL, analyzer or query)
+        """
+
+        self.recorder = recorder
+        self.kind = kind
+        self.target = target
+        self.status = "Succeeded"
+        self.error = None
+        self.metrics = {}
+        self.created = self.started = time.perf_counter()
+        self.accepted = None
+        self._finished = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc is not None:
+            self.status, self.error = "Failed", str(exc)
+        self.finish()
+
+    def add(self, name, value):
+        """Adds a value to a measurement (e.g. one more poll, or more bytes)."""
+        self.metrics[name] = self.metrics.get(name, 0) + value
+
+    @contextmanager
+    def time(self, name):
+        """Adds the time spent in a with block to a measurement."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def start(self):
+        """
+        Records that the request is about to be sent, for operations that were queued first.
+
+        The time since the operation was created is recorded as queue_seconds, and the
+        upload and submit times are measured from now.
+        """
+        self.started = time.perf_counter()
+        self.add("queue_seconds", self.started - self.created)
+
+    def mark_accepted(self):
+        """Records that the service accepted the request, which starts the poll wait."""
+        self.accepted = time.perf_counter()
+        self.add("submit_seconds", self.accepted - self.started)
+
+    def mark_completed(self, at=None):
+        """
+        Records that the operation reached a terminal state, which ends the poll wait.
+
+        Args:
+            at (float): time.perf_counter() when the final status arrived (defaults to now)
+        """
+        if self.accepted is not None:
+            self.add("poll_wait_seconds", (at or time.perf_counter()) - self.accepted)
+
+    def finish(self, status=None, error=None):
+        """
+        Records the operation (only the first call has any effect).
+
+        Args:
+            status (str): The final status, if not "Succeeded"
+            error (str): An error message, for failed operations
+        """
+
+        if self._finished:
+            return
+        self._finished = True
+        self.status = status or self.status
+        self.error = error or self.error
+        self.metrics["total_seconds"] = time.perf_counter() - self.created
+        self.recorder.record(self)
+
+
+class TimedReader:
+    """
+    Wraps a binary file that is sent as a request body, to tell when the upload finished.
+
+    The HTTP client reads the body until read() returns nothing; that moment ends
+    the upload. The wrapper passes fileno(), tell() and seek() through, so the
+    client can still set Content-Length from the file size and stream it in blocks.
+    """
+
+    def __init__(self, file, operation):
+        """
+        Args:
+            file (file): The open binary file
+            operation (Operation): The operation the upload is part of
+        """
+
+        self._file = file
+        self._operation = operation
+        self.uploaded = None
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        if not data and self.uploaded is None:
+            self.uploaded = time.perf_counter()
+            self._operation.add("upload_seconds", self.uploaded - self._operation.started)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class Histogram:
+    """A Prometheus-style cumulative histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def quantile(self, q):
+        """
+        Estimates a quantile from the buckets, as Prometheus's histogram_quantile() does.
+
+        The value is interpolated linearly within the bucket the quantile falls in
+        (the first bucket starts at 0). A quantile above the last bucket returns
+        that bucket's upper bound.
+
+        Args:
+            q (float): The quantile, from 0 to 1 (e.g. 0.99 for the 99th percentile)
+
+        Returns:
+            float: The estimate, or None if nothing was observed
+        """
+
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, below = 0.0, 0
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= rank and count > below:
+                return lower + (bound - lower) * (rank - below) / (count - below)
+            lower, below = bound, count
+        return self.buckets[-1]
+
+
+class Recorder:
+    """
+    Records operations as JSON lines and, optionally, Prometheus-style histograms.
+
+    Each finished operation is appended to the log file as one JSON object:
+
+        {"time": ..., "script": "read-card", "operation": "analyze", "target": "biz-card-1.png",
+         "status": "Succeeded", "upload_seconds": 0.012, "accept_seconds": 0.35, "submit_seconds": 0.362,
+         "poll_wait_seconds": 2.1, "polls": 3, "download_bytes": 18243, "decode_seconds": 0.0004,
+         "total_seconds": 2.47}
+
+    If a metrics file is set, every measurement also goes into a histogram labeled
+    with the script and operation, and the histograms are written to that file in
+    the Prometheus text format when the recorder is closed (or the script exits).
+    With neither file set, operations are measured but nothing is written.
+    """
+
+    def __init__(self, script, log_path=None, metrics_path=None):
+        """
+        Args:
+            script (str): Name of the script, added to every record
+            log_path (str): JSON lines file to append operations to, or None
+            metrics_path (str): File to write the Prometheus histograms to, or None
+        """
+
+        self.script = script
+        self.log_path = log_path
+        self.metrics_path = metrics_path
+        self.histograms = {}   # (operation kind, metric) -> Histogram
+        self.operations = {}   # (operation kind, status) -> count
+        self._lock = threading.Lock()
+        self._log = open(log_path, "a", encoding="utf-8") if log_path else None
+
+    def operation(self, kind, target=None):
+        """
+        Starts measuring an operation.
+
+        Args:
+            kind (str): The kind of operation
+            target (str): What the operation works on
+
+        Returns:
+            Operation: The operation, to be finished (or used as a context manager)
+        """
+
+        return Operation(self, kind, target)
+
+    def record(self, operation):
+        """Records a finished operation (called by Operation.finish)."""
+
+        metrics = dict(operation.metrics)
+        if "upload_seconds" in metrics and "submit_seconds" in metrics:
+            metrics["accept_seconds"] = max(0.0, metrics["submit_seconds"] - metrics["upload_seconds"])
+
+        with self._lock:
+            if self._log is not None:
+                entry = {"time": round(time.time(), 3), "script": self.script, "operation": operation.kind,
+                         "target": operation.target, "status": operation.status}
+                if operation.error:
+                    entry["error"] = operation.error
+                entry.update({name: round(value, 6) if isinstance(value, float) else value
+                              for name, value in metrics.items()})
+                self._log.write(json.dumps(entry) + "\n")
+                self._log.flush()
+
+            if self.metrics_path:
+                key = (operation.kind, operation.status)
+                self.operations[key] = self.operations.get(key, 0) + 1
+                for name, value in metrics.items():
+                    histogram = self.histograms.get((operation.kind, name))
+                    if histogram is None:
+                        histogram = self.histograms[(operation.kind, name)] = Histogram(_buckets(name))
+                    histogram.observe(value)
+
+    def write_metrics(self):
+        """Writes the histograms to the metrics file in the Prometheus text format."""
+
+        if not self.metrics_path:
+            return
+        with self._lock:
+            lines = ["# HELP extraction_operations_total Operations by final status",
+                     "# TYPE extraction_operations_total counter"]
+            for (kind, status), count in sorted(self.operations.items()):
+                lines.append(f'extraction_operations_total{{script="{self.script}",operation="{kind}",status="{status}"}} {count}')
+            for name in METRICS:
+                series = sorted((kind, histogram) for (kind, metric), histogram in self.histograms.items() if metric == name)
+                if not series:
+                    continue
+                lines.append(f"# HELP extraction_{name} {METRICS[name]}")
+                lines.append(f"# TYPE extraction_{name} histogram")
+                for kind, histogram in series:
+                    labels = f'script="{self.script}",operation="{kind}"'
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'extraction_{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'extraction_{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f"extraction_{name}_sum{{{labels}}} {histogram.sum:.6f}")
+                    lines.append(f"extraction_{name}_count{{{labels}}} {histogram.count}")
+
+        # Written to a temporary file first, so a scraper never reads a partial file
+        directory = os.path.dirname(os.path.abspath(self.metrics_path))
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(handle, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.metrics_path)
+
+    def close(self):
+        """Writes the histograms and closes the log file."""
+        self.write_metrics()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def _buckets(name):
+    if name.endswith("_bytes"):
+        return BYTES_BUCKETS
+    if name.endswith("_seconds"):
+        return SECONDS_BUCKETS
+    return COUNT_BUCKETS
+
+
+_recorder = None
+
+
+def get_recorder(script=None):
+    """
+    Returns the recorder shared by everything in this process.
+
+    The first call creates it from the METRICS_LOG (JSON lines file) and
+    METRICS_FILE (Prometheus histograms) settings, which can be set in the
+    environment or in the script's .env file (so call load_dotenv() first).
+    The histograms are written automatically when the script exits.
+
+    Args:
+        script (str): Name of the script, added to every record
+
+    Returns:
+        Recorder: The shared recorder
+    """
+
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(script or "script", os.getenv("METRICS_LOG") or None, os.getenv("METRICS_FILE") or None)
+        atexit.register(_recorder.close)
+    return _recorder
+
+
+def set_recorder(recorder):
+    """
+    Replaces the recorder shared by everything in this process (e.g. with one that a benchmark reads).
+
+    Args:
+        recorder (Recorder): The recorder to use from now on
+    """
+
+    global _recorder
+    _recorder = recorder
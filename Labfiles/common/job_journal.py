@@ -0,0 +1,224 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+
+
+# The state of one file in a batch, as recorded in the journal
+JournalEntry = namedtuple("JournalEntry", ["item", "fingerprint", "state", "operation", "status", "result_path", "error", "updated"])
+
+# Journal states: submitted to the service and not finished yet, finished with a saved result, or failed
+SUBMITTED = "submitted"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job TEXT NOT NULL,
+    item TEXT NOT NULL,
+    fingerprint TEXT,
+    state TEXT NOT NULL,
+    operation TEXT,
+    status TEXT,
+    result_path TEXT,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (job, item)
+)
+"""
+
+
+def file_fingerprint(path):
+    """
+    Identifies a version of a file cheaply, by its size and modification time.
+
+    Args:
+        path (str): Path to the file (URLs have no fingerprint)
+
+    Returns:
+        str: The fingerprint, or None if the path is not a local file
+    """
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def result_file_name(item):
+    """
+    Names the file a batch saves one item's result in.
+
+    The name starts with the item's file name, for readability, followed by a short
+    hash of the full path or URL, so items with the same file name in different
+    folders (or at different URLs) never overwrite each other's results.
+
+    Args:
+        item (str): Local path or URL of the item
+
+    Returns:
+        str: The file name, e.g. "invoice.pdf.1a2b3c4d.json"
+    """
+
+    is_url = item.startswith(("http://", "https://"))
+    name = os.path.basename(item.split("?")[0].rstrip("/") if is_url else item) or "result"
+    digest = hashlib.sha1((item if is_url else os.path.abspath(item)).encode("utf-8")).hexdigest()[:8]
+    return f"{name}.{digest}.json"
+
+
+class JobJournal:
+    """
+    A durable record of a batch of analyses, so a stopped batch can be resumed.
+
+    Each file's progress is written to a SQLite database in write-ahead-log mode
+    as soon as it changes: when the service accepts it (with the operation ID, or
+    anything else needed to resume polling) and when it finishes (with the
+    status and where its result was saved). Every change is committed before the
+    batch moves on, so after a crash a restarted batch can:
+
+    - Skip the files whose results were already saved
+    - Resume polling the operations that were still running, instead of paying for them again
+    - Submit only the files that were never accepted (or whose analysis failed)
+
+    A file that was being uploaded when the batch stopped, but whose operation ID
+    had not been recorded yet, is submitted again: the service gives no way to
+    find that operation.
+
+    One journal can hold several batches, told apart by their job name (e.g. the analyzer).
+    """
+
+    def __init__(self, path, job=""):
+        """
+        Args:
+            path (str): Path of the SQLite database (created if it doesn't exist)
+            job (str): Name of the batch, so one journal can be shared by different analyzers or models
+        """
+
+        self.path = path
+        self.job = job
+        self._lock = threading.Lock()
+
+        # WAL lets the journal be read (e.g. to report progress) while the batch writes to it,
+        # and with synchronous=NORMAL a commit survives the process crashing (not a power failure)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        self._connection.execute(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Closes the database."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def entries(self):
+        """
+        Reads the state of every file in this job.
+
+        Returns:
+            dict: item -> JournalEntry
+        """
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT item, fingerprint, state, operation, status, result_path, error, updated FROM jobs WHERE job = ?",
+                (self.job,)).fetchall()
+        return {row[0]: JournalEntry(*row) for row in rows}
+
+    def plan(self, items):
+        """
+        Works out what a (re)started batch still has to do for each file.
+
+        Args:
+            items (list): The files (or URLs) in the batch
+
+        Returns:
+            tuple: (done, running, todo) where done maps each file with a saved result to its
+            JournalEntry, running maps each file with an operation still to poll to its
+            JournalEntry, and todo lists the files to submit
+        """
+
+        entries = self.entries()
+        done, running, todo = {}, {}, []
+        for item in items:
+            entry = entries.get(item)
+            if entry is None or entry.fingerprint != file_fingerprint(item):
+                # Never accepted, or the file has changed since
+                todo.append(item)
+            elif entry.state == SUCCEEDED and (entry.result_path is None or os.path.exists(entry.result_path)):
+                done[item] = entry
+            elif entry.state == SUBMITTED and entry.operation:
+                running[item] = entry
+            else:
+                todo.append(item)
+        return done, running, todo
+
+    def submitted(self, item, operation):
+        """
+        Records that the service accepted a file.
+
+        Args:
+            item (str): The file (or URL)
+            operation (str): What is needed to resume polling (the operation ID, URL or continuation token)
+        """
+
+        self._write(item, SUBMITTED, operation=operation)
+
+    def succeeded(self, item, status="Succeeded", result_path=None):
+        """
+        Records that a file's analysis finished and its result was saved.
+
+        Args:
+            item (str): The file (or URL)
+            status (str): The status reported by the service
+            result_path (str): Where the result was saved, if it was saved to its own file
+        """
+
+        self._write(item, SUCCEEDED, status=status, result_path=result_path)
+
+    def failed(self, item, status="Failed", error=None):
+        """
+        Records that a file's analysis failed (it is submitted again when the batch is resumed).
+
+        Args:
+            item (str): The file (or URL)
+            status (str): The status reported by the service
+            error (str): The error message
+        """
+
+        self._write(item, FAILED, status=status, error=error)
+
+    def _write(self, item, state, operation=None, status=None, result_path=None, error=None):
+        # Each change is its own transaction, committed before the batch moves on
+        # The operation is kept when a later state doesn't give one
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO jobs (job, item, fingerprint, state, operation, status, result_path, error, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (job, item) DO UPDATE SET fingerprint = excluded.fingerprint, state = excluded.state, "
+                "operation = COALESCE(excluded.operation, jobs.operation), status = excluded.status, "
+                "result_path = excluded.result_path, error = excluded.error, updated = excluded.updated",
+                (self.job, item, file_fingerprint(item), state, operation, status, result_path, error, time.time()))
+
+    def summary(self):
+        """
+        Counts the files in this job by state.
+
+        Returns:
+            Counter: state -> number of files
+        """
+
+        with self._lock:
+            rows = self._connection.execute("SELECT state, COUNT(*) FROM jobs WHERE job = ? GROUP BY state", (self.job,))
+            return Counter(dict(rows.fetchall()))
@@ -0,0 +1,57 @@
+import json
+
+# ijson parses a JSON file incrementally, so only the value being read is in memory
+# It is in the requirements of the labs that use this module; if it is missing, files are loaded whole with json.load
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def iter_items(path, prefix):
+    """
+    Yields every value found at a path of a JSON file, one at a time.
+
+    Paths follow the ijson convention: object keys joined with dots, with "item"
+    standing for every element of an array, e.g.
+
+        "analyzeResult.readResults.item"             every page of a .ocr.json file
+        "analyzeResult.readResults.item.lines.item"  every line of every page
+        "result.contents.item.fields"                the fields of every analyzed content item
+
+    With ijson installed, scanning a 1,000-page OCR result page by page holds one
+    page in memory, not the whole document.
+
+    Args:
+        path (str): Path to the JSON file
+        prefix (str): Dotted path of the values to return ("" for the whole document)
+
+    Yields:
+        The value at each matching position, as returned by json.load
+
+    Raises:
+        ValueError: If the file isn't valid JSON, with or without ijson
+    """
+
+    if ijson is not None:
+        with open(path, "rb") as file:
+            # use_float returns numbers as json.load does, rather than as Decimal
+            try:
+                yield from ijson.items(file, prefix, use_float=True)
+            except ijson.JSONError as ex:
+                raise ValueError(f"Invalid JSON: {str(ex).splitlines()[0]}") from ex
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            document = json.load(file)
+        yield from _find(document, prefix.split(".") if prefix else [])
+
+
+def _find(value, keys):
+    # Yields the values at keys inside an already loaded value
+    if not keys:
+        yield value
+    elif keys[0] == "item" and isinstance(value, list):
+        for element in value:
+            yield from _find(element, keys[1:])
+    elif isinstance(value, dict) and keys[0] in value:
+        yield from _find(value[keys[0]], keys[1:])
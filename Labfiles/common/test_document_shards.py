@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+
+import pytest
+
+from document_shards import analyze_shards, count_pages, merge_results, split_pdf
+
+
+def make_pdf(path, page_count):
+    # Each page is as wide as 100 plus its page number, so a shard's pages can be told apart
+    pypdf = pytest.importorskip("pypdf")
+    writer = pypdf.PdfWriter()
+    for number in range(1, page_count + 1):
+        writer.add_blank_page(width=100 + number, height=200)
+    with open(path, "wb") as file:
+        writer.write(file)
+    return str(path)
+
+
+def page_numbers(shard_path):
+    import pypdf
+    with open(shard_path, "rb") as file:
+        return [int(page.mediabox.width) - 100 for page in pypdf.PdfReader(file).pages]
+
+
+def read_result(shard):
+    # A Document Intelligence analyzeResult for a shard: one line of content and one paragraph per page
+    pages = range(1, shard.last_page - shard.first_page + 2)
+    content = "\n".join(f"page {shard.first_page + page - 1}" for page in pages)
+    paragraphs, offset = [], 0
+    for page in pages:
+        length = len(f"page {shard.first_page + page - 1}")
+        paragraphs.append({"content": content[offset:offset + length], "spans": [{"offset": offset, "length": length}],
+                           "boundingRegions": [{"pageNumber": page}]})
+        offset += length + 1
+    return {"content": content, "pages": [{"pageNumber": page} for page in pages], "paragraphs": paragraphs}
+
+
+@pytest.mark.parametrize("pages_per_shard, ranges", [
+    (4, [(1, 4), (5, 8), (9, 10)]),
+    (5, [(1, 5), (6, 10)]),
+    (10, [(1, 10)]),
+    (0, [(page, page) for page in range(1, 11)]),
+])
+def test_split_pdf_writes_each_page_range_once(tmp_path, pages_per_shard, ranges):
+    path = make_pdf(tmp_path / "document.pdf", 10)
+    os.makedirs(tmp_path / "shards")
+
+    shards = list(split_pdf(path, pages_per_shard, str(tmp_path / "shards")))
+
+    assert [(shard.first_page, shard.last_page) for shard in shards] == ranges
+    assert [page_numbers(shard.path) for shard in shards] == [list(range(first, last + 1)) for first, last in ranges]
+    assert count_pages(path) == 10
+
+
+def test_split_pdf_writes_a_shard_only_when_it_is_asked_for(tmp_path):
+    path = make_pdf(tmp_path / "document.pdf", 6)
+    os.makedirs(tmp_path / "shards")
+
+    shards = split_pdf(path, 2, str(tmp_path / "shards"))
+    first = next(shards)
+
+    assert os.listdir(tmp_path / "shards") == [os.path.basename(first.path)]
+    shards.close()
+
+
+def test_analyze_shards_merges_the_shards_and_removes_their_files(tmp_path):
+    path = make_pdf(tmp_path / "document.pdf", 7)
+    shard_paths = []
+
+    def analyze(shard):
+        shard_paths.append(shard.path)
+        return read_result(shard)
+
+    result = analyze_shards(path, analyze, pages_per_shard=3, max_in_flight=2)
+
+    assert result["content"] == "\n".join(f"page {page}" for page in range(1, 8))
+    assert [page["pageNumber"] for page in result["pages"]] == list(range(1, 8))
+    for page, paragraph in enumerate(result["paragraphs"], start=1):
+        span = paragraph["spans"][0]
+        assert result["content"][span["offset"]:span["offset"] + span["length"]] == f"page {page}"
+        assert paragraph["boundingRegions"] == [{"pageNumber": page}]
+    assert len(shard_paths) == 3
+    assert not any(os.path.exists(os.path.dirname(shard_path)) for shard_path in shard_paths)
+
+
+def test_analyze_shards_keeps_at_most_max_in_flight_shards_on_disk(tmp_path):
+    path = make_pdf(tmp_path / "document.pdf", 12)
+    lock = threading.Lock()
+    peak = {"files": 0, "in_flight": 0, "peak_in_flight": 0}
+
+    def analyze(shard):
+        with lock:
+            peak["in_flight"] += 1
+            peak["peak_in_flight"] = max(peak["peak_in_flight"], peak["in_flight"])
+            peak["files"] = max(peak["files"], len(os.listdir(os.path.dirname(shard.path))))
+        time.sleep(0.02)
+        with lock:
+            peak["in_flight"] -= 1
+        return read_result(shard)
+
+    analyze_shards(path, analyze, pages_per_shard=1, max_in_flight=3)
+
+    assert peak["peak_in_flight"] <= 3
+    assert peak["files"] <= 3
+
+
+def test_a_failed_shard_fails_the_document_and_still_removes_the_files(tmp_path):
+    path = make_pdf(tmp_path / "document.pdf", 10)
+    analyzed = []
+
+    def analyze(shard):
+        analyzed.append(shard.path)
+        if shard.first_page == 1:
+            raise RuntimeError("Analysis of pages 1-1 failed")
+        return read_result(shard)
+
+    with pytest.raises(RuntimeError, match="pages 1-1 failed"):
+        analyze_shards(path, analyze, pages_per_shard=1, max_in_flight=1)
+
+    assert len(analyzed) == 1
+    assert not os.path.exists(os.path.dirname(analyzed[0]))
+
+
+def test_merge_results_joins_content_understanding_documents():
+    results = [{"analyzerId": "invoices", "contents": [
+                    {"kind": "document", "markdown": "# One", "startPageNumber": 1, "endPageNumber": 2,
+                     "paragraphs": [{"content": "One", "source": "D(2,0,0,1,1)"}],
+                     "sections": [{"elements": ["/paragraphs/0"]}],
+                     "fields": {"Total": {"valueNumber": 1, "confidence": 0.4}}}]},
+               {"analyzerId": "invoices", "warnings": [{"code": "W1"}], "contents": [
+                    {"kind": "document", "markdown": "# Two", "startPageNumber": 1, "endPageNumber": 2,
+                     "paragraphs": [{"content": "Two", "source": "D(1,0,0,1,1)"}],
+                     "sections": [{"elements": ["/paragraphs/0"]}],
+                     "fields": {"Total": {"valueNumber": 2, "confidence": 0.9}}}]}]
+
+    merged = merge_results(results, [1, 3])
+
+    document, = merged["contents"]
+    assert merged["analyzerId"] == "invoices" and merged["warnings"] == [{"code": "W1"}]
+    assert document["markdown"] == "# One\n\n# Two"
+    assert (document["startPageNumber"], document["endPageNumber"]) == (1, 4)
+    assert [paragraph["source"] for paragraph in document["paragraphs"]] == ["D(2,0,0,1,1)", "D(3,0,0,1,1)"]
+    assert [section["elements"] for section in document["sections"]] == [["/paragraphs/0"], ["/paragraphs/1"]]
+    assert document["fields"]["Total"]["valueNumber"] == 2
@@ -0,0 +1,133 @@
+import io
+import json
+
+import pytest
+
+import instrumentation
+from instrumentation import Histogram, Recorder, TimedReader
+
+
+class Clock:
+    """Stands in for time.perf_counter in instrumentation, so every phase takes a known time."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(instrumentation.time, "perf_counter", clock)
+    return clock
+
+
+def analyze(recorder, clock):
+    # An analysis that queues 1s, uploads for 1s, is accepted 0.5s later and completes 3s after that
+    operation = recorder.operation("analyze", "card.png")
+    clock.now += 1.0
+    operation.start()
+    body = TimedReader(io.BytesIO(b"x" * 10), operation)
+    clock.now += 0.5
+    assert body.read(4) == b"xxxx"
+    assert body.read() == b"xxxxxx"
+    clock.now += 0.5
+    assert body.read() == b""
+    assert body.read() == b""   # only the first empty read ends the upload
+    clock.now += 0.5
+    operation.mark_accepted()
+    clock.now += 3.0
+    operation.mark_completed()
+    operation.add("polls", 1)
+    operation.add("polls", 2)
+    with operation.time("decode_seconds"):
+        clock.now += 0.25
+    operation.finish()
+    return operation
+
+
+def test_the_upload_accept_and_poll_phases_are_split(tmp_path, clock):
+    log_path = tmp_path / "operations.jsonl"
+    recorder = Recorder("read-card", log_path=str(log_path))
+
+    operation = analyze(recorder, clock)
+    recorder.close()
+
+    assert operation.metrics == pytest.approx({"queue_seconds": 1.0, "upload_seconds": 1.0, "submit_seconds": 1.5,
+                                               "poll_wait_seconds": 3.0, "polls": 3, "decode_seconds": 0.25,
+                                               "total_seconds": 5.75})
+    [entry] = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert (entry["script"], entry["operation"], entry["target"], entry["status"]) == ("read-card", "analyze", "card.png", "Succeeded")
+    # The accept phase is what the submission took beyond the upload
+    assert entry["accept_seconds"] == pytest.approx(0.5)
+    assert entry["upload_seconds"] + entry["accept_seconds"] == pytest.approx(entry["submit_seconds"])
+    assert "error" not in entry
+
+
+def test_a_failed_operation_is_recorded_once_with_its_error(tmp_path, clock):
+    log_path = tmp_path / "operations.jsonl"
+    recorder = Recorder("read-card", log_path=str(log_path))
+
+    with pytest.raises(RuntimeError):
+        with recorder.operation("analyze", "card.png") as operation:
+            raise RuntimeError("Connection reset")
+    operation.finish("Succeeded")
+    recorder.close()
+
+    [entry] = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert (entry["status"], entry["error"]) == ("Failed", "Connection reset")
+
+
+def test_histogram_buckets_are_cumulative_and_give_percentiles():
+    histogram = Histogram((1, 2, 5, 10))
+    for value in [0.5] * 50 + [1.5] * 40 + [4] * 9 + [20]:
+        histogram.observe(value)
+
+    assert histogram.counts == [50, 90, 99, 99]
+    assert (histogram.count, histogram.sum) == (100, pytest.approx(25 + 60 + 36 + 20))
+    # Interpolated within the bucket each one falls in, as Prometheus does
+    assert histogram.quantile(0.5) == pytest.approx(1.0)
+    assert histogram.quantile(0.7) == pytest.approx(1.5)
+    assert histogram.quantile(0.95) == pytest.approx(2 + 3 * 5 / 9)
+    # Above the last bucket, the estimate is its bound
+    assert histogram.quantile(0.999) == 10
+    assert Histogram((1,)).quantile(0.5) is None
+
+
+def test_prometheus_output(tmp_path, clock):
+    metrics_path = tmp_path / "metrics.prom"
+    recorder = Recorder("read-card", metrics_path=str(metrics_path))
+    analyze(recorder, clock)
+    recorder.operation("analyze", "other.png").finish("Failed", "HTTP 400")
+
+    recorder.close()
+    lines = metrics_path.read_text().splitlines()
+
+    labels = 'script="read-card",operation="analyze"'
+    assert 'extraction_operations_total{script="read-card",operation="analyze",status="Failed"} 1' in lines
+    assert 'extraction_operations_total{script="read-card",operation="analyze",status="Succeeded"} 1' in lines
+    assert "# TYPE extraction_poll_wait_seconds histogram" in lines
+    assert f'extraction_poll_wait_seconds_bucket{{{labels},le="2.5"}} 0' in lines
+    assert f'extraction_poll_wait_seconds_bucket{{{labels},le="5"}} 1' in lines
+    assert f'extraction_poll_wait_seconds_bucket{{{labels},le="+Inf"}} 1' in lines
+    assert f"extraction_poll_wait_seconds_sum{{{labels}}} 3.000000" in lines
+    assert f"extraction_poll_wait_seconds_count{{{labels}}} 1" in lines
+    # Counts use the count buckets, and the derived accept time is recorded too
+    assert f'extraction_polls_bucket{{{labels},le="5"}} 1' in lines
+    assert f"extraction_accept_seconds_count{{{labels}}} 1" in lines
+    # Both operations have a total time; every metric is declared once
+    assert f"extraction_total_seconds_count{{{labels}}} 2" in lines
+    assert lines.count("# TYPE extraction_total_seconds histogram") == 1
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_nothing_is_written_without_files(tmp_path, clock, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    recorder = Recorder("read-card")
+
+    analyze(recorder, clock)
+    recorder.close()
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import json_stream
+from json_stream import iter_items
+
+
+@pytest.fixture(params=["ijson", "json.load"])
+def reader(request, monkeypatch):
+    # Every test runs with ijson and with the json.load fallback used when it isn't installed
+    if request.param == "ijson":
+        pytest.importorskip("ijson")
+    else:
+        monkeypatch.setattr(json_stream, "ijson", None)
+    return request.param
+
+
+def write_json(path, value):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(value, file)
+    return str(path)
+
+
+def ocr_result(page_count):
+    return {"status": "succeeded", "analyzeResult": {"version": "2.1.0", "readResults": [
+        {"page": number, "width": 8.5, "height": 11,
+         "lines": [{"text": f"line {line}", "words": [{"text": f"p{number}l{line}w{word}", "confidence": 0.5 + word / 10}
+                                                      for word in range(3)]} for line in range(2)]}
+        for number in range(1, page_count + 1)]}}
+
+
+def test_every_element_of_a_large_array_is_returned_in_order(tmp_path, reader):
+    path = write_json(tmp_path / "large.ocr.json", ocr_result(2000))
+
+    pages = iter_items(path, "analyzeResult.readResults.item")
+
+    assert [page["page"] for page in pages] == list(range(1, 2001))
+
+
+def test_nested_item_paths(tmp_path, reader):
+    path = write_json(tmp_path / "form.ocr.json", ocr_result(3))
+
+    words = list(iter_items(path, "analyzeResult.readResults.item.lines.item.words.item"))
+    numbers = list(iter_items(path, "analyzeResult.readResults.item.page"))
+
+    assert len(words) == 3 * 2 * 3
+    assert words[0] == {"text": "p1l0w0", "confidence": 0.5}
+    assert words[-1]["text"] == "p3l1w2"
+    assert numbers == [1, 2, 3]
+
+
+def test_values_match_json_load(tmp_path, reader):
+    # Numbers come back as int and float, as json.load returns them (not as Decimal)
+    document = ocr_result(2)
+    path = write_json(tmp_path / "form.ocr.json", document)
+
+    assert list(iter_items(path, "")) == [document]
+    assert list(iter_items(path, "analyzeResult.readResults.item.width")) == [8.5, 8.5]
+    assert type(next(iter_items(path, "analyzeResult.readResults.item.height"))) is int
+
+
+def test_missing_paths_return_nothing(tmp_path, reader):
+    path = write_json(tmp_path / "form.ocr.json", ocr_result(1))
+
+    assert list(iter_items(path, "analyzeResult.pageResults.item")) == []
+    assert list(iter_items(path, "analyzeResult.version.item")) == []
+
+
+def test_invalid_json_raises_value_error(tmp_path, reader):
+    path = tmp_path / "broken.json"
+    path.write_text('{"analyzeResult": {"readResults": [{"page": 1}, {"page": ')
+
+    with pytest.raises(ValueError):
+        list(iter_items(str(path), "analyzeResult.readResults.item"))
+
+
+def test_ijson_reads_the_file_incrementally(tmp_path):
+    # The first page is returned before the rest of the file is parsed, so a broken end isn't noticed yet
+    pytest.importorskip("ijson")
+    path = tmp_path / "truncated.ocr.json"
+    text = json.dumps(ocr_result(500))
+    path.write_text(text[:len(text) // 2])
+
+    pages = iter_items(str(path), "analyzeResult.readResults.item")
+
+    assert next(pages)["page"] == 1
@@ -1,32 +1,64 @@
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import argparse
 import os
 import sys
-import time
-import requests
 import json
 
+# Shared helpers used by several labs live in Labfiles/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from console import clear_console
+from instrumentation import get_recorder
+from cu_client import ContentUnderstandingClient, analyzer_unchanged
+from polling import PollingError
+
 
 def main():
 
-    # Clear the console
-    os.system('cls' if os.name=='nt' else 'clear')
+    # Clear the console (with escape codes, so no cls/clear process is started)
+    clear_console()
 
     try:
 
-        # Get the business card schema
-        with open("biz-card.json", "r") as file:
-            schema_json = json.load(file)
-        
-        card_schema = json.dumps(schema_json)
+        # Get the analyzer schema files to deploy
+        # e.g. python create-analyzer.py
+        #      python create-analyzer.py schemas/*.json --parallel 8
+        parser = argparse.ArgumentParser(description="Deploy Content Understanding analyzers")
+        parser.add_argument("schemas", nargs="*", default=["biz-card.json"],
+                            help="Analyzer schema files (the analyzer is named after the file unless ANALYZER_NAME is set for a single schema)")
+        parser.add_argument("--parallel", type=int, default=4,
+                            help="Number of analyzers deployed at the same time")
+        parser.add_argument("--force", action="store_true",
+                            help="Redeploy analyzers even if their schema is unchanged")
+        args = parser.parse_args()
 
         # Get config settings
+        from dotenv import load_dotenv
         load_dotenv()
         ai_svc_endpoint = os.getenv('ENDPOINT')
         ai_svc_key = os.getenv('KEY')
         analyzer = os.getenv('ANALYZER_NAME')
 
-        # Create the analyzer
-        create_analyzer(card_schema, analyzer, ai_svc_endpoint, ai_svc_key)
+        # Each deployment is timed and recorded to METRICS_LOG / METRICS_FILE, if they are set
+        get_recorder("create-analyzer")
+
+        # Work out the analyzer name for each schema file
+        deployments = []
+        for schema_file in args.schemas:
+            name = analyzer if analyzer and len(args.schemas) == 1 else os.path.splitext(os.path.basename(schema_file))[0]
+            with open(schema_file, "r") as file:
+                deployments.append((json.dumps(json.load(file)), name))
+
+        # Create the analyzers
+        # The client keeps its HTTP connections open for the GET, DELETE, PUT and every poll,
+        # and the analyzers are deployed in parallel
+        with ContentUnderstandingClient(ai_svc_endpoint, ai_svc_key, pool_size=max(10, args.parallel)) as client:
+            with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+                results = list(executor.map(lambda deployment: create_analyzer(*deployment, client, args.force), deployments))
+
+        # Summarize what the release changed
+        print()
+        for (_, name), result in zip(deployments, results):
+            print(f"{name}: {result}")
 
         print("\n")
 
@@ -35,95 +67,125 @@ def main():
 
 
 
-def create_analyzer(schema, analyzer, endpoint, key):
+def create_analyzer(schema, analyzer, client, force=False):
     """
     Creates a Content Understanding analyzer using the REST API.
     
     This function:
     - Prints the analyzer creation status
-    - Deletes any existing analyzer with the same name
+    - Retrieves the deployed analyzer with the same name, if there is one
+    - Skips the deployment if the deployed analyzer already matches the schema
+    - Otherwise deletes the existing analyzer
     - Submits a PUT request to create a new analyzer with the provided schema
     - Polls the operation status until completion
-    - Reports success or failure
+    - Reports success or failure, including any error raised on the way (it never raises)
+    - Records how long the creation took (see instrumentation.Operation)
     
     Args:
         schema (str): JSON string defining the analyzer schema (field definitions)
         analyzer (str): Name of the analyzer to create
-        endpoint (str): Azure AI Services endpoint URL
-        key (str): Azure AI Services API key for authentication
+        client (ContentUnderstandingClient): Client for the Azure AI Services endpoint
+        force (bool): Redeploy the analyzer even if its schema is unchanged
+
+    Returns:
+        str: "Unchanged", "Succeeded" or "Failed"
     """
     
     # Display status to user
     print (f"Creating {analyzer}")
+    operation = get_recorder().operation("create-analyzer", analyzer)
 
-    # Set the API version for Content Understanding
-    # This ensures compatibility with the Azure service
-    CU_VERSION = "2025-05-01-preview"
-
-    # Prepare HTTP headers for the API requests
-    # Ocp-Apim-Subscription-Key: Authentication header with API key
-    # Content-Type: Specifies that we're sending JSON data
-    headers = {
-        "Ocp-Apim-Subscription-Key": key,
-        "Content-Type": "application/json"}
-
-    # Construct the REST API URL for the analyzer endpoint
-    # For Azure AI Foundry, the Content Understanding API uses the /projects/<project-id>/... path
-    # The endpoint already includes the project path
-    # Format: {endpoint}/contentunderstanding/analyzers/{analyzer}?api-version={version}
-    url = f"{endpoint}/contentunderstanding/analyzers/{analyzer}?api-version={CU_VERSION}"
-    print(f"DEBUG: URL = {url}")
-
-    # Delete the analyzer if it already exists
-    # This is important because we cannot create an analyzer with a duplicate name
-    # The DELETE request silently succeeds whether or not the analyzer exists
-    response = requests.delete(url, headers=headers)
-    print(response.status_code)  # Print HTTP status code (204 = No Content, 404 = Not Found)
-    time.sleep(1)  # Small delay to avoid rate limiting
-
-    # Now create the analyzer with the provided schema
-    # The schema parameter contains the field definitions in JSON format
-    # HTTP PUT is used for creating/updating resources
-    response = requests.put(url, headers=headers, data=(schema))
-    print(response.status_code)  # Print HTTP status code (202 = Accepted for async operation)
-    
-    # If the request failed, print the error response
-    if response.status_code >= 400:
-        print(f"ERROR: PUT request failed")
-        print(f"Response: {response.text}")
-        return
-
-    # Extract the callback URL from the response headers
-    # The Operation-Location header contains the URL to check the operation status
-    # This is how we'll poll the service to see when the analyzer is ready
-    callback_url = response.headers["Operation-Location"]
-
-    # Check the status of the asynchronous operation
-    # Azure uses asynchronous operations for long-running tasks
-    time.sleep(1)  # Small delay to allow the operation to process
-    result_response = requests.get(callback_url, headers=headers)
-
-    # Keep polling until the operation is no longer running
-    # The status will be "Running", "Succeeded", or "Failed"
-    # We loop until status changes to one of the terminal states
-    status = result_response.json().get("status")
-    while status == "Running":
-        time.sleep(1)  # Wait before polling again
-        result_response = requests.get(callback_url, headers=headers)
-        status = result_response.json().get("status")
-
-    # Extract the final status from the response
-    result = result_response.json().get("status")
-    print(result)  # Display the final status
-    
-    # Report the outcome to the user
-    if result == "Succeeded":
-        print(f"Analyzer '{analyzer}' created successfully.")
-    else:
-        print("Analyzer creation failed.")
-        print(result_response.json())  # Print error details from the response
+    # Any error (e.g. a dropped connection) fails only this analyzer, so a release of
+    # many analyzers still deploys the others and prints its summary
+    try:
 
+        # The client builds the REST API URL for the analyzer endpoint
+        # For Azure AI Foundry, the Content Understanding API uses the /projects/<project-id>/... path
+        # The endpoint already includes the project path
+        # Format: {endpoint}/contentunderstanding/analyzers/{analyzer}?api-version={version}
+
+        # Get the currently deployed definition (404 = the analyzer doesn't exist yet)
+        response = client.get_analyzer(analyzer)
+        print(response.status_code)  # Print HTTP status code (200 = OK, 404 = Not Found)
+
+        # Any other status (e.g. 401/403, or a 5xx that outlasted the retries) says nothing about
+        # whether the analyzer exists, so the old definition is neither compared, deleted nor replaced
+        if response.status_code not in (200, 404):
+            print("ERROR: Could not get the deployed analyzer")
+            print(f"Response: {response.text}")
+            operation.finish("Failed", f"HTTP {response.status_code}")
+            return "Failed"
+        exists = response.status_code == 200
+
+        # Compare the deployed definition with the local one, on every key the local schema sets
+        # If nothing it sets (fields, config, description, ...) has changed, there is nothing to deploy
+        # (the defaults the service adds to a deployed analyzer are not changes)
+        # This avoids the delete/create downtime window for unchanged analyzers
+        if exists and not force and analyzer_unchanged(response.json(), schema):
+            print(f"Analyzer '{analyzer}' is unchanged; skipping deployment.")
+            operation.finish("Unchanged")
+            return "Unchanged"
+
+        # Delete the analyzer if it already exists
+        # This is important because we cannot create an analyzer with a duplicate name
+        if exists:
+            response = client.delete_analyzer(analyzer)
+            print(response.status_code)  # Print HTTP status code (204 = No Content)
+            # No fixed delay is needed before the PUT: every request waits for the client's
+            # rate limiter, which slows down (and honors Retry-After) if the service returns 429
+
+        # Now create the analyzer with the provided schema
+        # The schema parameter contains the field definitions in JSON format
+        # HTTP PUT is used for creating/updating resources
+        response = client.put_analyzer(analyzer, schema)
+        operation.mark_accepted()
+        print(response.status_code)  # Print HTTP status code (202 = Accepted for async operation)
+
+        # If the request failed, print the error response
+        if response.status_code >= 400:
+            print("ERROR: PUT request failed")
+            print(f"Response: {response.text}")
+            operation.finish("Failed", f"HTTP {response.status_code}")
+            return "Failed"
+
+        # Extract the callback URL from the response headers
+        # The Operation-Location header contains the URL to check the operation status
+        # This is how we'll poll the service to see when the analyzer is ready
+        callback_url = response.headers.get("Operation-Location")
+        if not callback_url:
+            print("ERROR: No Operation-Location header returned from the API")
+            operation.finish("Failed", "No Operation-Location header")
+            return "Failed"
+
+        # Check the status of the asynchronous operation
+        # Azure uses asynchronous operations for long-running tasks
+        # poll_operation starts with a short wait and backs off exponentially (with jitter),
+        # honoring any Retry-After header and retrying throttled (429) or 5xx responses
+        # The status will be "Running" until it changes to "Succeeded" or "Failed"
+        try:
+            result, result_json, _ = client.poll(callback_url, initial_response=response, deadline=300, operation=operation)
+        except PollingError as ex:
+            print("Analyzer creation failed.")
+            print(ex)
+            operation.finish("Failed", str(ex))
+            return "Failed"
+
+        print(result)  # Display the final status
+        operation.finish(result)
+
+        # Report the outcome to the user
+        if result == "Succeeded":
+            print(f"Analyzer '{analyzer}' created successfully.")
+            return "Succeeded"
+        else:
+            print("Analyzer creation failed.")
+            print(result_json)  # Print error details from the response
+            return "Failed"
 
+    except Exception as ex:
+        print(f"Analyzer '{analyzer}' could not be deployed: {ex}")
+        operation.finish("Failed", str(ex))
+        return "Failed"
 
 
 if __name__ == "__main__":
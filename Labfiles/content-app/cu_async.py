@@ -0,0 +1,387 @@
+import asyncio
+import json
+import time
+import aiohttp
+from cu_client import CU_VERSION, analyzer_unchanged
+from polling import Backoff, PollingError, PollingTimeout, IN_PROGRESS_STATES, RETRYABLE_STATUS_CODES, UNFINISHED, parse_retry_after
+from rate_limiter import get_rate_limiter, INTERACTIVE
+
+
+class AsyncContentUnderstandingClient:
+    """
+    An asyncio client for the Content Understanding REST API.
+
+    Waiting for an operation is an asyncio.sleep rather than a blocked thread,
+    so one event loop can track thousands of outstanding analyses, each costing
+    only a small coroutine. All requests share one aiohttp session with a
+    bounded pool of keep-alive connections, and every request first waits for
+    the rate limiter shared by all clients using the same endpoint and key.
+
+    Use it as an async context manager:
+
+        async with AsyncContentUnderstandingClient(endpoint, key) as client:
+            status, result_json = await client.analyze(analyzer, "biz-card-1.png")
+    """
+
+    def __init__(self, endpoint, key, api_version=CU_VERSION, pool_size=100, timeout=60, deadline=300,
+                 priority=INTERACTIVE, limiter=None):
+        """
+        Args:
+            endpoint (str): Azure AI Services endpoint URL
+            key (str): Azure AI Services API key for authentication
+            api_version (str): Content Understanding API version
+            pool_size (int): Maximum number of open connections to the endpoint
+            timeout (float): Connect and read timeout in seconds for each request
+            deadline (float): Maximum total seconds to wait for an operation to complete
+            priority (int): rate_limiter.INTERACTIVE, or rate_limiter.BULK for batch work
+            limiter (RateLimiter): The rate limiter to use (defaults to the one shared by the endpoint and key)
+        """
+        self.endpoint = endpoint.rstrip("/")
+        self.key = key
+        self.api_version = api_version
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.deadline = deadline
+        self.priority = priority
+        self.limiter = limiter or get_rate_limiter(endpoint, key)
+        self.session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        """Opens the HTTP session (done automatically by async with)."""
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                headers={"Ocp-Apim-Subscription-Key": self.key},
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout))
+
+    async def close(self):
+        """Closes the HTTP session and its pooled connections."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def analyzer_url(self, analyzer):
+        """Returns the URL of an analyzer definition."""
+        return f"{self.endpoint}/contentunderstanding/analyzers/{analyzer}?api-version={self.api_version}"
+
+    def analyze_url(self, analyzer):
+        """Returns the URL used to submit content to an analyzer."""
+        return f"{self.endpoint}/contentunderstanding/analyzers/{analyzer}:analyze?api-version={self.api_version}"
+
+    def result_url(self, id_value):
+        """Returns the URL of an analysis operation's result."""
+        return f"{self.endpoint}/contentunderstanding/analyzerResults/{id_value}?api-version={self.api_version}"
+
+    async def _send(self, method, url, retries=3, path=None, **kwargs):
+        # Sends a request, retrying throttled (429) and, for idempotent methods, transient (408/5xx) responses
+        # Throttled responses are reported to the rate limiter and retried after their Retry-After time
+        # A POST is only retried on 429: a 408 or 5xx can arrive after the service has already
+        # accepted (and billed) the analysis, so sending it again could submit the document twice
+        # If a path is given, the file is re-opened and streamed as the body on every attempt
+        # Returns (status code, headers, parsed JSON body or text)
+        backoff = Backoff(initial=0.5)
+        for attempt in range(retries + 1):
+            await self.limiter.acquire_async(self.priority)
+            # Opening a file can block on a slow or network disk, so it happens off the event loop
+            file = await asyncio.to_thread(open, path, "rb") if path else None
+            try:
+                if file:
+                    kwargs["data"] = file
+                async with self.session.request(method, url, **kwargs) as response:
+                    if response.status == 429:
+                        throttled_wait = self.limiter.on_throttled(parse_retry_after(response.headers))
+                    elif response.status < 500:
+                        self.limiter.on_success()
+                    if response.status == 429 and attempt < retries:
+                        delay = throttled_wait
+                    elif response.status in RETRYABLE_STATUS_CODES and method != "POST" and attempt < retries:
+                        delay = backoff.next_delay(response)
+                    else:
+                        body = await response.text()
+                        try:
+                            body = json.loads(body)
+                        except ValueError:
+                            pass
+                        return response.status, response.headers, body
+            finally:
+                if file:
+                    file.close()
+            await asyncio.sleep(delay)
+
+    async def poll(self, url, headers=None, operation=None):
+        """
+        Polls a long-running operation until it reaches a terminal state.
+
+        Args:
+            url (str): The URL that reports the operation status
+            headers (Mapping): Headers of the response that started the operation (for Retry-After)
+            operation (Operation): Optional instrumentation.Operation that counts the polls and
+                records the poll wait, result size and decode time
+
+        Returns:
+            tuple: (status, result_json)
+
+        Raises:
+            PollingError: If the status URL returns a non-retryable error
+            PollingTimeout: If the operation is still running when the deadline passes
+        """
+
+        backoff = Backoff()
+        expires = time.monotonic() + self.deadline
+        retry_after = parse_retry_after(headers)
+        delay = backoff.next_delay() if retry_after is None else retry_after
+        while True:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise PollingTimeout(f"Operation did not complete within {self.deadline}s: {url}")
+            await asyncio.sleep(min(delay, remaining))
+
+            await self.limiter.acquire_async(self.priority)
+            async with self.session.get(url) as response:
+                delay = backoff.next_delay(response)
+                if response.status == 429:
+                    self.limiter.on_throttled(parse_retry_after(response.headers))
+                elif response.status < 500:
+                    self.limiter.on_success()
+                if operation is not None:
+                    operation.add("polls", 1)
+                if response.status in RETRYABLE_STATUS_CODES:
+                    continue
+                if response.status >= 400:
+                    raise PollingError(f"Polling failed ({response.status}): {await response.text()}")
+                body = await response.read()
+                received = time.perf_counter()
+                result_json = json.loads(body)
+
+            if result_json.get("status") not in IN_PROGRESS_STATES:
+                if operation is not None:
+                    operation.mark_completed(received)
+                    operation.add("download_bytes", len(body))
+                    operation.add("decode_seconds", time.perf_counter() - received)
+                return result_json.get("status"), result_json
+
+    async def create_analyzer(self, analyzer, schema, force=False):
+        """
+        Creates (or replaces) an analyzer and waits for it to be ready.
+
+        As in create-analyzer.py, an analyzer whose deployed definition already
+        matches the schema is left in place, so it is never briefly missing.
+
+        Args:
+            analyzer (str): Name of the analyzer to create
+            schema (str): JSON string defining the analyzer schema
+            force (bool): Redeploy the analyzer even if it is unchanged
+
+        Returns:
+            tuple: (status, result_json); the status is "Unchanged" if nothing was deployed
+        """
+
+        status, _, body = await self._send("GET", self.analyzer_url(analyzer))
+        if status not in (200, 404):
+            # Only a 404 means the analyzer doesn't exist; anything else (401/403, 5xx) stops the deployment
+            return "Failed", {"error": body}
+        exists = status == 200
+        if exists and not force and isinstance(body, dict) and analyzer_unchanged(body, schema):
+            return "Unchanged", body
+        if exists:
+            await self._send("DELETE", self.analyzer_url(analyzer))
+        status, headers, body = await self._send("PUT", self.analyzer_url(analyzer), data=schema,
+                                                 headers={"Content-Type": "application/json"})
+        if status >= 400:
+            return "Failed", {"error": body}
+        callback_url = headers.get("Operation-Location")
+        if not callback_url:
+            return "Failed", {"error": f"No Operation-Location header returned from the API ({status})"}
+        return await self.poll(callback_url, headers)
+
+    async def begin_analyze(self, analyzer, path):
+        """
+        Streams a file to an analyzer without waiting for the result.
+
+        Args:
+            analyzer (str): Name of the analyzer to use
+            path (str): Path to the file to analyze
+
+        Returns:
+            tuple: (operation ID, response headers)
+
+        Raises:
+            PollingError: If the service rejects the request or returns no operation ID
+        """
+
+        # Submissions are only retried on 429, which means the service did not accept the content
+        status, headers, body = await self._send("POST", self.analyze_url(analyzer), path=path,
+                                                 headers={"Content-Type": "application/octet-stream"})
+        if status >= 400:
+            raise PollingError(f"Failed to submit {path} for analysis ({status}): {body}")
+        id_value = body.get("id") if isinstance(body, dict) else None
+        if not id_value:
+            raise PollingError(f"No operation ID returned from the API for {path}")
+        return id_value, headers
+
+    async def get_result(self, id_value):
+        """
+        Retrieves the current state of an analysis operation.
+
+        Args:
+            id_value (str): The operation ID returned when the file was submitted
+
+        Returns:
+            dict: The JSON response, including its "status"
+        """
+
+        status, _, body = await self._send("GET", self.result_url(id_value))
+        if status >= 400:
+            return {"status": "Failed", "error": body}
+        return body
+
+    async def analyze(self, analyzer, path, operation=None, on_submitted=None):
+        """
+        Analyzes a file and waits for the result.
+
+        Args:
+            analyzer (str): Name of the analyzer to use
+            path (str): Path to the file to analyze
+            operation (Operation): Optional instrumentation.Operation for this analysis
+                (aiohttp streams the upload itself, so only the whole submission is timed)
+            on_submitted (callable): Called with (path, operation ID) as soon as the service accepts the file
+
+        Returns:
+            tuple: (status, result_json)
+        """
+
+        id_value, headers = await self.begin_analyze(analyzer, path)
+        if operation is not None:
+            operation.mark_accepted()
+        if on_submitted is not None:
+            on_submitted(path, id_value)
+        return await self.poll(headers.get("Operation-Location", self.result_url(id_value)), headers, operation)
+
+    async def analyze_many(self, analyzer, paths, max_in_flight=100, operations=None, resume=None, on_submitted=None):
+        """
+        Analyzes many files concurrently, yielding each result as it completes.
+
+        Args:
+            analyzer (str): Name of the analyzer to use
+            paths (list): Paths to the files to analyze
+            max_in_flight (int): Maximum number of outstanding analyses
+            operations (dict): Optional instrumentation.Operation for each path; the time a file
+                waits for a free slot is recorded as its queue time
+            resume (dict): Operation ID of each path whose analysis is already running; these
+                are polled rather than submitted again
+            on_submitted (callable): Called with (path, operation ID) as soon as the service accepts a file
+
+        Yields:
+            tuple: (path, status, result_json) for each file; the status is the service's terminal
+            status, "Failed" if the file was rejected (or polling it got a non-retryable error),
+            or UNFINISHED if the file was accepted but its result wasn't seen before the deadline
+            or a poll raised (it may still succeed, so it must not be submitted again)
+        """
+
+        semaphore = asyncio.Semaphore(max_in_flight)
+        operations = operations or {}
+        resume = resume or {}
+
+        async def analyze_one(path):
+            async with semaphore:
+                operation = operations.get(path)
+                if operation is not None:
+                    operation.start()
+                id_value, headers = resume.get(path), None
+                if id_value is None:
+                    try:
+                        id_value, headers = await self.begin_analyze(analyzer, path)
+                    except Exception as ex:
+                        # Any error (an unreadable file, a rejected submission, ...) fails only this file
+                        return path, "Failed", {"error": str(ex)}
+                    if operation is not None:
+                        operation.mark_accepted()
+                    if on_submitted is not None:
+                        on_submitted(path, id_value)
+                try:
+                    url = headers.get("Operation-Location", self.result_url(id_value)) if headers else self.result_url(id_value)
+                    status, result_json = await self.poll(url, headers, operation)
+                except PollingTimeout as ex:
+                    status, result_json = UNFINISHED, {"error": str(ex), "id": id_value}
+                except PollingError as ex:
+                    status, result_json = "Failed", {"error": str(ex)}
+                except Exception as ex:
+                    # e.g. a dropped connection: the service has the file, so it is polled again rather than resubmitted
+                    status, result_json = UNFINISHED, {"error": str(ex), "id": id_value}
+                return path, status, result_json
+
+        tasks = [asyncio.ensure_future(analyze_one(path)) for path in paths]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class ContentUnderstandingSyncClient:
+    """
+    A synchronous facade over AsyncContentUnderstandingClient.
+
+    It runs the async client on a private event loop, so code without an event
+    loop (such as the main() functions of the lab scripts) can use the same
+    engine. The HTTP session stays open between calls until close() is called.
+    """
+
+    def __init__(self, endpoint, key, **kwargs):
+        """
+        Args:
+            endpoint (str): Azure AI Services endpoint URL
+            key (str): Azure AI Services API key for authentication
+            **kwargs: Other AsyncContentUnderstandingClient settings
+        """
+        self._loop = asyncio.new_event_loop()
+        self._client = AsyncContentUnderstandingClient(endpoint, key, **kwargs)
+        self._loop.run_until_complete(self._client.open())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Closes the HTTP session and the event loop."""
+        self._loop.run_until_complete(self._client.close())
+        self._loop.close()
+
+    def create_analyzer(self, analyzer, schema, force=False):
+        """Creates (or replaces) a changed analyzer; see AsyncContentUnderstandingClient.create_analyzer."""
+        return self._loop.run_until_complete(self._client.create_analyzer(analyzer, schema, force))
+
+    def analyze(self, analyzer, path, operation=None):
+        """Analyzes a file; see AsyncContentUnderstandingClient.analyze."""
+        return self._loop.run_until_complete(self._client.analyze(analyzer, path, operation))
+
+    def get_result(self, id_value):
+        """Retrieves an operation's state; see AsyncContentUnderstandingClient.get_result."""
+        return self._loop.run_until_complete(self._client.get_result(id_value))
+
+    def analyze_many(self, analyzer, paths, max_in_flight=100, operations=None, resume=None, on_submitted=None):
+        """
+        Analyzes many files concurrently; see AsyncContentUnderstandingClient.analyze_many.
+
+        Yields:
+            tuple: (path, status, result_json) for each file, as it completes
+        """
+        results = self._client.analyze_many(analyzer, paths, max_in_flight, operations, resume, on_submitted)
+        try:
+            while True:
+                try:
+                    yield self._loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._loop.run_until_complete(results.aclose())
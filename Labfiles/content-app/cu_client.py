@@ -0,0 +1,279 @@
+import json
+import time
+from polling import poll_operation, parse_retry_after
+from rate_limiter import get_rate_limiter, INTERACTIVE
+from instrumentation import TimedReader
+
+
+# Set the API version for Content Understanding
+# This ensures compatibility with the Azure service
+CU_VERSION = "2025-05-01-preview"
+
+
+class ContentUnderstandingClient:
+    """
+    A small client for the Content Understanding REST API.
+
+    All requests go through one requests.Session, so TCP/TLS connections are
+    kept alive and reused across submissions and polls instead of being opened
+    for every call. The authentication header is set once on the session.
+    Idempotent requests (GET, PUT, DELETE) that fail with a connection error
+    or 5xx are retried by the connection pool's retry adapter.
+
+    Every request first waits for the rate limiter shared by all clients using
+    the same endpoint and key (see rate_limiter.RateLimiter). Throttled (429)
+    requests of any method are retried after their Retry-After time, since the
+    service did not accept them.
+    """
+
+    def __init__(self, endpoint, key, api_version=CU_VERSION, pool_size=10, timeout=(5, 60), retries=3,
+                 priority=INTERACTIVE, limiter=None):
+        """
+        Args:
+            endpoint (str): Azure AI Services endpoint URL
+            key (str): Azure AI Services API key for authentication
+            api_version (str): Content Understanding API version
+            pool_size (int): Maximum number of keep-alive connections to the endpoint
+            timeout (tuple): (connect, read) timeouts in seconds for every request
+            retries (int): Maximum number of retries for idempotent requests and throttled requests
+            priority (int): rate_limiter.INTERACTIVE, or rate_limiter.BULK for batch work
+            limiter (RateLimiter): The rate limiter to use (defaults to the one shared by the endpoint and key)
+        """
+        self.endpoint = endpoint.rstrip("/")
+        self.api_version = api_version
+        self.timeout = timeout
+        self.retries = retries
+        self.priority = priority
+        self.limiter = limiter or get_rate_limiter(endpoint, key)
+
+        # requests is only imported when a client is created, so a script's --help
+        # (or anything else that never calls the service) starts without loading it
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # POST (submitting an analysis) is not in allowed_methods, so it is never
+        # retried automatically and an image is never submitted twice by accident
+        # 429 is left to request(), so the rate limiter sees every throttled response
+        # (urllib3 would otherwise retry any response with a Retry-After header itself)
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "PUT", "DELETE"]),
+            respect_retry_after_header=False,
+            raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Ocp-Apim-Subscription-Key"] = key
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Closes all pooled connections."""
+        self.session.close()
+
+    def analyzer_url(self, analyzer):
+        """Returns the URL of an analyzer definition."""
+        return f"{self.endpoint}/contentunderstanding/analyzers/{analyzer}?api-version={self.api_version}"
+
+    def analyze_url(self, analyzer):
+        """Returns the URL used to submit content to an analyzer."""
+        return f"{self.endpoint}/contentunderstanding/analyzers/{analyzer}:analyze?api-version={self.api_version}"
+
+    def result_url(self, id_value):
+        """Returns the URL of an analysis operation's result."""
+        return f"{self.endpoint}/contentunderstanding/analyzerResults/{id_value}?api-version={self.api_version}"
+
+    def request(self, method, url, retries=None, **kwargs):
+        """
+        Sends a request through the rate limiter and the pooled session.
+
+        Throttled (429) responses are reported to the rate limiter, and the request
+        is sent again after its Retry-After time. An open file sent as the body is
+        rewound first.
+
+        Args:
+            method (str): The HTTP method
+            url (str): The request URL
+            retries (int): Maximum number of retries of a throttled request (defaults to the client's retries)
+            **kwargs: Other requests.Session.request arguments (data, headers, ...)
+
+        Returns:
+            requests.Response: The response (a 429 only if every retry was throttled too)
+        """
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            self.limiter.acquire(self.priority)
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            if response.status_code != 429:
+                if response.status_code < 500:
+                    self.limiter.on_success()
+                return response
+            # Only this request waits; the limiter lowers the rate for all of them if the throttling persists
+            wait = self.limiter.on_throttled(parse_retry_after(response.headers))
+            if attempt < retries:
+                time.sleep(wait)
+            if hasattr(kwargs.get("data"), "seek"):
+                kwargs["data"].seek(0)
+        return response
+
+    def get(self, url, headers=None):
+        """
+        Sends a GET request through the rate limiter and the pooled session.
+
+        This has the same signature as requests.get, so it can be passed to poll_operation.
+        """
+        return self.request("GET", url, headers=headers)
+
+    def get_analyzer(self, analyzer):
+        """Retrieves an analyzer definition (404 if it doesn't exist)."""
+        return self.get(self.analyzer_url(analyzer))
+
+    def delete_analyzer(self, analyzer):
+        """Deletes an analyzer (succeeds whether or not it exists)."""
+        return self.request("DELETE", self.analyzer_url(analyzer))
+
+    def put_analyzer(self, analyzer, schema):
+        """
+        Creates an analyzer from a schema.
+
+        Args:
+            analyzer (str): Name of the analyzer to create
+            schema (str): JSON string defining the analyzer schema
+
+        Returns:
+            requests.Response: The response, whose Operation-Location header tracks the creation
+        """
+        return self.request("PUT", self.analyzer_url(analyzer), data=schema,
+                            headers={"Content-Type": "application/json"})
+
+    def begin_analyze(self, analyzer, data):
+        """
+        Submits content to an analyzer.
+
+        Args:
+            analyzer (str): Name of the analyzer to use
+            data (bytes or file): The content to analyze; an open binary file is streamed
+                from disk in small blocks rather than read into memory
+
+        Returns:
+            requests.Response: The response, whose JSON "id" identifies the analysis operation
+        """
+        return self.request("POST", self.analyze_url(analyzer), data=data,
+                            headers={"Content-Type": "application/octet-stream"})
+
+    def analyze_file(self, analyzer, path, operation=None):
+        """
+        Streams a file from disk to an analyzer.
+
+        The file object is handed straight to requests, which sets Content-Length
+        from the file size and sends the body in small blocks, so memory use stays
+        flat whether the file is a small image or a multi-hundred-MB PDF or recording.
+
+        If an operation is given, the file is wrapped in a TimedReader so the upload
+        time and the time the service took to accept the request are recorded separately.
+
+        Args:
+            analyzer (str): Name of the analyzer to use
+            path (str): Path to the file to analyze
+            operation (Operation): Optional instrumentation.Operation for this analysis
+
+        Returns:
+            requests.Response: The response, whose JSON "id" identifies the analysis operation
+        """
+        with open(path, "rb") as file:
+            if operation is None:
+                return self.begin_analyze(analyzer, file)
+            response = self.begin_analyze(analyzer, TimedReader(file, operation))
+            operation.mark_accepted()
+            return response
+
+    def get_result(self, id_value):
+        """
+        Retrieves the current state of an analysis operation.
+
+        A throttled (429) poll is returned rather than retried, so a caller polling
+        many operations schedules its next poll from the Retry-After header instead
+        of waiting for it.
+        """
+        return self.request("GET", self.result_url(id_value), retries=0)
+
+    def poll(self, url, initial_response=None, deadline=None, operation=None):
+        """
+        Polls a long-running operation to completion over the pooled session.
+
+        Args:
+            url (str): The URL that reports the operation status
+            initial_response (requests.Response): The response that started the operation
+            deadline (float): Maximum total seconds to wait, or None for no limit
+            operation (Operation): Optional instrumentation.Operation that records the polling
+
+        Returns:
+            tuple: (status, result_json, polls) as returned by polling.poll_operation
+        """
+        return poll_operation(url, None, initial_response=initial_response, deadline=deadline, get=self.get,
+                              operation=operation)
+
+
+# Properties that map names to field definitions; a name missing on either side is a change
+FIELD_MAPS = ("fields", "properties")
+
+
+def definition_matches(local, deployed, name=None):
+    """
+    Tells whether a deployed analyzer property matches what a local schema sets.
+
+    Objects are compared recursively on the keys the local schema sets, so the
+    defaults the service fills in (e.g. extra config settings) are not changes.
+    Field maps ("fields", "properties") must name the same fields on both sides,
+    so adding or removing a field is always a change. Lists are compared item by item.
+
+    Args:
+        local: A value from the local analyzer schema
+        deployed: The same value from the deployed analyzer
+        name (str): The key of the value in its parent object, if any
+
+    Returns:
+        bool: True if the deployed value has everything the local one sets
+    """
+
+    if isinstance(local, dict):
+        if not isinstance(deployed, dict):
+            return False
+        if name in FIELD_MAPS and local.keys() != deployed.keys():
+            return False
+        return all(key in deployed and definition_matches(value, deployed[key], key) for key, value in local.items())
+    if isinstance(local, list):
+        return (isinstance(deployed, list) and len(local) == len(deployed)
+                and all(definition_matches(item, other) for item, other in zip(local, deployed)))
+    return local == deployed
+
+
+def analyzer_unchanged(deployed, schema):
+    """
+    Tells whether a deployed analyzer already matches a local analyzer schema.
+
+    Every property the local schema sets (description, baseAnalyzerId, config,
+    fieldSchema, ...) is compared, down to the nested keys it sets (see
+    definition_matches). The service adds its own properties (status,
+    timestamps, ...) and defaults to a deployed analyzer, so those are ignored.
+
+    Args:
+        deployed (dict): The analyzer returned by the service
+        schema (dict or str): The local analyzer schema
+
+    Returns:
+        bool: True if no redeployment is needed
+    """
+
+    if isinstance(schema, str):
+        schema = json.loads(schema)
+    return definition_matches(schema, deployed)
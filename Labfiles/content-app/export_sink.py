@@ -0,0 +1,155 @@
+import csv
+import json
+import os
+from field_decoder import to_plain
+
+
+# Arrow column types for each Content Understanding field type
+# Dates and times are kept as the text the service returns; arrays and objects become JSON text
+ARROW_TYPES = {
+    "number": "float64",
+    "integer": "int64",
+    "boolean": "bool_",
+}
+
+
+class ColumnarSink:
+    """
+    Writes decoded analysis results to a columnar dataset, one row per document.
+
+    Each row has a "source_file" column, one column per schema field and one
+    "<field>_confidence" column per field. Rows are buffered and flushed every
+    batch_size rows, so memory stays bounded however large the batch is.
+
+    The format is chosen from the file extension:
+    - .parquet: Apache Parquet, one row group per flush (requires pyarrow)
+    - .arrow / .feather: Arrow IPC file, one record batch per flush (requires pyarrow)
+    - .csv: comma-separated values (no extra dependencies)
+
+    Number, integer and boolean fields keep their type in Parquet and Arrow;
+    array and object field values are stored as JSON text.
+
+    Example:
+
+        with ColumnarSink("cards.parquet", decoder) as sink:
+            for record in decoder.decode(result_json):
+                sink.write(image_file, record)
+    """
+
+    def __init__(self, path, decoder, batch_size=1000):
+        """
+        Args:
+            path (str): Path of the file to create
+            decoder (FieldDecoder): The decoder whose records will be written (gives the columns and their types)
+            batch_size (int): Number of rows buffered before they are written out
+        """
+
+        self.path = path
+        self.fields = list(decoder.fields)
+        self.types = list(decoder.types)
+        self.batch_size = batch_size
+        self.columns = ["source_file"] + self.fields + [name + "_confidence" for name in self.fields]
+        self.rows_written = 0
+        self._buffer = []
+        self._writer = None
+        self._file = None
+
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".csv":
+            self.format = "csv"
+        elif extension == ".parquet":
+            self.format = "parquet"
+        elif extension in (".arrow", ".feather"):
+            self.format = "arrow"
+        else:
+            raise ValueError(f"Unsupported export format '{extension}' (use .parquet, .arrow or .csv)")
+
+        if self.format == "csv":
+            self._file = open(path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.columns)
+        else:
+            # pyarrow is only needed for the binary columnar formats
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError("Exporting to Parquet or Arrow requires pyarrow (pip install pyarrow)")
+            self._pa = pyarrow
+            self._schema = pyarrow.schema(
+                [("source_file", pyarrow.string())]
+                + [(name, getattr(pyarrow, ARROW_TYPES.get(field_type, "string"))())
+                   for name, field_type in zip(self.fields, self.types)]
+                + [(name + "_confidence", pyarrow.float64()) for name in self.fields])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, source_file, record):
+        """
+        Adds one document to the dataset.
+
+        Args:
+            source_file (str): The file the record was extracted from
+            record (Record): A record decoded by FieldDecoder
+        """
+
+        values = [_cell(value, self.format) for _, value in record.items()]
+        self._buffer.append([source_file] + values + list(record.confidence))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes out the buffered rows."""
+
+        if not self._buffer:
+            return
+        if self.format == "csv":
+            self._writer.writerows(self._buffer)
+            self._file.flush()
+        else:
+            columns = list(zip(*self._buffer))
+            batch = self._pa.RecordBatch.from_arrays(
+                [self._pa.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+                schema=self._schema)
+            if self._writer is None:
+                if self.format == "parquet":
+                    import pyarrow.parquet
+                    self._writer = pyarrow.parquet.ParquetWriter(self.path, self._schema, compression="zstd")
+                else:
+                    import pyarrow.ipc
+                    self._writer = pyarrow.ipc.new_file(self.path, self._schema)
+            if self.format == "parquet":
+                self._writer.write_batch(batch)
+            else:
+                self._writer.write(batch)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        """Flushes any remaining rows and closes the file."""
+
+        self.flush()
+        if self.format == "csv":
+            self._file.close()
+        elif self._writer is not None:
+            self._writer.close()
+        elif self.format == "parquet":
+            # No rows at all: still create a valid, empty dataset
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(self._schema.empty_table(), self.path)
+        else:
+            import pyarrow.ipc
+            with pyarrow.ipc.new_file(self.path, self._schema):
+                pass
+
+
+def _cell(value, format):
+    # Arrays and objects are stored as compact JSON; CSV cells are always text
+    if isinstance(value, list) or hasattr(value, "as_dict"):
+        return json.dumps(to_plain(value), separators=(",", ":"))
+    if format == "csv" or value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
@@ -0,0 +1,299 @@
+import keyword
+import re
+import unicodedata
+from json_stream import iter_items
+
+
+# The property that holds the value of each Content Understanding field type
+VALUE_PROPERTIES = {
+    "string": "valueString",
+    "number": "valueNumber",
+    "integer": "valueInteger",
+    "date": "valueDate",
+    "time": "valueTime",
+    "boolean": "valueBoolean",
+    "array": "valueArray",
+    "object": "valueObject",
+}
+
+
+# Stands in for a missing field, so its .get() returns None
+_MISSING = {}
+
+
+class Record:
+    """
+    Base class for the compact records produced by FieldDecoder.
+
+    Subclasses are generated from an analyzer's field schema and declare one
+    __slots__ entry per field, so a record costs a few pointers per field
+    instead of a whole dict.
+    """
+
+    __slots__ = ()
+    FIELDS = ()       # field names, as they appear in the schema
+    ATTRIBUTES = ()   # matching attribute names (field names made into valid identifiers)
+
+    def items(self):
+        """Returns (field name, value) pairs in schema order."""
+        return [(name, getattr(self, attribute)) for name, attribute in zip(self.FIELDS, self.ATTRIBUTES)]
+
+    def as_dict(self):
+        """Returns the record as a plain dict, converting nested records too."""
+        return {name: to_plain(value) for name, value in self.items()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.items() == other.items()
+
+
+def to_plain(value):
+    """
+    Converts decoded values into plain Python values (records become dicts).
+
+    Args:
+        value: A value decoded by FieldDecoder
+
+    Returns:
+        The same value, with nested records converted to dicts
+    """
+
+    if isinstance(value, Record):
+        return value.as_dict()
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    return value
+
+
+def _attribute_name(name, index):
+    # Turns a field name such as "Phone Number" or "2ndLine" into a valid, unique-ish identifier
+    # Python reads identifiers in NFKC form (record.Ⅻ means record.XII), so the slot is named that way too;
+    # a name that still isn't an identifier (e.g. "Total²" has a superscript) becomes field_<index>
+    attribute = re.sub(r"\W", "_", unicodedata.normalize("NFKC", name))
+    if attribute[:1].isdigit() or keyword.iskeyword(attribute):
+        attribute = "f_" + attribute
+    if not attribute.isidentifier() or unicodedata.normalize("NFKC", attribute) != attribute:
+        attribute = f"field_{index}"
+    return attribute
+
+
+def make_record_type(type_name, field_names, extra=()):
+    """
+    Creates a Record subclass with one slot per field.
+
+    Args:
+        type_name (str): Name of the generated class
+        field_names (list): Field names, in schema order
+        extra (tuple): Additional slot names (e.g. "confidence")
+
+    Returns:
+        type: The generated Record subclass
+    """
+
+    attributes = []
+    for index, name in enumerate(field_names):
+        attribute = _attribute_name(name, index)
+        while attribute in attributes or attribute in extra:
+            attribute += "_"
+        attributes.append(attribute)
+    return type(type_name, (Record,), {
+        "__slots__": tuple(attributes) + tuple(extra),
+        "FIELDS": tuple(field_names),
+        "ATTRIBUTES": tuple(attributes),
+    })
+
+
+def decode_value(field):
+    """
+    Decodes a field of any type without a schema, including nested arrays and objects.
+
+    Args:
+        field (dict): A field from a Content Understanding result
+
+    Returns:
+        The field's value (arrays become lists and objects become dicts)
+    """
+
+    if field is None:
+        return None
+    field_type = field.get("type")
+    if field_type == "array":
+        return [decode_value(item) for item in field.get("valueArray") or ()]
+    if field_type == "object":
+        return {name: decode_value(item) for name, item in (field.get("valueObject") or {}).items()}
+    return field.get(VALUE_PROPERTIES.get(field_type, "valueString"))
+
+
+def _compile(definition, type_name):
+    # Builds a function that decodes one field described by a schema definition
+    field_type = definition.get("type")
+
+    if field_type == "array":
+        decode_item = _compile(definition.get("items") or {}, type_name + "Item")
+
+        def decode_array(field):
+            if field is None:
+                return None
+            return [decode_item(item) for item in field.get("valueArray") or ()]
+        return decode_array
+
+    if field_type == "object":
+        properties = definition.get("properties") or {}
+        record_type = make_record_type(type_name, list(properties))
+        decode_values = _compile_record(record_type, properties, type_name)
+
+        def decode_object(field):
+            if field is None:
+                return None
+            return decode_values(field.get("valueObject") or {})
+        return decode_object
+
+    value_property = VALUE_PROPERTIES.get(field_type)
+    if value_property is None:
+        # Unknown or missing type in the schema: fall back to the type reported in the result
+        return decode_value
+
+    def decode_scalar(field):
+        return field.get(value_property) if field is not None else None
+    return decode_scalar
+
+
+def _compile_record(record_type, definitions, type_name, with_confidence=False):
+    # Builds a function that fills a record from a dict of fields in one pass
+    # Each field's handling is chosen from the schema once, up front: scalars are read
+    # straight from their value property, arrays and objects call their own decoder
+    # Missing fields, and fields the service returned as null, decode to None
+    new = record_type.__new__
+    plan = []
+    for name, attribute in zip(record_type.FIELDS, record_type.ATTRIBUTES):
+        definition = definitions[name] or {}
+        value_property = VALUE_PROPERTIES.get(definition.get("type"))
+        if definition.get("type") in ("array", "object"):
+            value_property = None
+        decode_field = None if value_property else _compile(definition, type_name + "_" + attribute)
+        plan.append((name, getattr(record_type, attribute).__set__, value_property, decode_field))
+
+    def decode(fields):
+        record = new(record_type)
+        confidences = []
+        for name, set_value, value_property, decode_field in plan:
+            field = fields.get(name)
+            if not field:
+                set_value(record, None)
+                confidences.append(None)
+                continue
+            set_value(record, field.get(value_property) if value_property else decode_field(field))
+            confidences.append(field.get("confidence"))
+        if with_confidence:
+            record.confidence = tuple(confidences)
+        return record
+    return decode
+
+
+class FieldDecoder:
+    """
+    Decodes the fields of Content Understanding results into typed records.
+
+    The analyzer's fieldSchema is compiled once into one small decoding function
+    per field, so decoding a result is a straight walk over the schema rather
+    than an if/elif dispatch on every field's type. Nested arrays and objects
+    are decoded recursively, and object fields become Record instances too.
+
+    decode_fields(fields) decodes the "fields" object of one content item into a
+    record with one attribute per schema field (None if missing from the result)
+    plus a "confidence" tuple with each field's confidence in schema order.
+    Fields in the result that are not in the schema are ignored.
+
+    Example:
+
+        decoder = FieldDecoder(schema_json["fieldSchema"])
+        for record in decoder.decode(result_json):
+            print(record.Name, record.Email)
+    """
+
+    def __init__(self, field_schema, type_name="Fields"):
+        """
+        Args:
+            field_schema (dict): The "fieldSchema" of an analyzer schema (such as biz-card.json)
+            type_name (str): Name of the generated record class
+        """
+
+        fields = (field_schema or {}).get("fields") or {}
+        self.record_type = make_record_type(type_name, list(fields), extra=("confidence",))
+        self.fields = self.record_type.FIELDS
+        self.types = tuple((fields[name] or {}).get("type") for name in self.fields)
+        self.decode_fields = _compile_record(self.record_type, fields, type_name, with_confidence=True)
+
+    def decode(self, result_json):
+        """
+        Decodes every content item with fields in an analysis result.
+
+        Args:
+            result_json (dict): The JSON response returned by the analyzerResults operation
+
+        Returns:
+            list: One Record per content item that has fields
+        """
+
+        return self.decode_many((result_json,))
+
+    def decode_many(self, result_jsons):
+        """
+        Decodes every content item with fields in many analysis results.
+
+        Args:
+            result_jsons (iterable): JSON responses returned by the analyzerResults operation
+
+        Returns:
+            list: One Record per content item that has fields, in order
+        """
+
+        decode_fields = self.decode_fields
+        records = []
+        append = records.append
+        for result_json in result_jsons:
+            for content in result_json["result"]["contents"]:
+                fields = content.get("fields")
+                if fields is not None:
+                    append(decode_fields(fields))
+        return records
+
+    def decode_file(self, path):
+        """
+        Decodes a saved analysis result (such as results.json) without loading it whole.
+
+        Only the "fields" of each content item are read into memory, one item at a
+        time, so the markdown, pages, paragraphs and other layout data of very large
+        documents never become Python objects.
+
+        Args:
+            path (str): Path to the JSON file
+
+        Yields:
+            Record: One record per content item that has fields, in order
+        """
+
+        decode_fields = self.decode_fields
+        for fields in iter_items(path, "result.contents.item.fields"):
+            if fields is not None:
+                yield decode_fields(fields)
+
+    def columns(self, result_jsons):
+        """
+        Decodes many analysis results into columns.
+
+        Args:
+            result_jsons (iterable): JSON responses returned by the analyzerResults operation
+
+        Returns:
+            dict: Field name -> list of values, with one entry per decoded content item,
+            plus "confidence" -> list of confidence tuples
+        """
+
+        records = self.decode_many(result_jsons)
+        columns = {name: [getattr(record, attribute) for record in records]
+                   for name, attribute in zip(self.fields, self.record_type.ATTRIBUTES)}
+        columns["confidence"] = [record.confidence for record in records]
+        return columns
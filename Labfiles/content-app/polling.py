@@ -0,0 +1,165 @@
+import random
+import time
+
+
+# Operation states reported by the service while a long-running operation is still in progress
+IN_PROGRESS_STATES = ("NotStarted", "Running")
+
+# HTTP status codes that mean "try again later" rather than "this request is wrong"
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+# Reported by the batch engines for an operation the service accepted but that wasn't seen to finish
+# (its deadline passed, or polling it failed): it may still succeed, so it is polled again, never resubmitted
+UNFINISHED = "Unfinished"
+
+
+class PollingError(RuntimeError):
+    """Raised when a long-running operation cannot be polled to completion."""
+
+
+class PollingTimeout(PollingError):
+    """Raised when a long-running operation does not finish before its deadline."""
+
+
+def parse_retry_after(headers):
+    """
+    Reads the Retry-After header from an HTTP response.
+
+    The header can either be a number of seconds ("2") or an HTTP date
+    ("Wed, 21 Oct 2015 07:28:00 GMT").
+
+    Args:
+        headers (Mapping): The response headers
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid
+    """
+
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    # Dates are rare, so the email package is only imported to parse one
+    import email.utils
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class Backoff:
+    """
+    Computes the wait between polls of a single long-running operation.
+
+    The first interval is short so fast operations are picked up quickly.
+    After that the interval doubles on every poll up to max_interval, with
+    random jitter so many concurrent operations don't poll in lock step.
+    A Retry-After header from the service always takes precedence.
+    """
+
+    def __init__(self, initial=0.25, factor=2.0, max_interval=8.0, jitter=0.5):
+        """
+        Args:
+            initial (float): Seconds to wait before the first poll
+            factor (float): Multiplier applied to the interval after each poll
+            max_interval (float): Upper bound for the interval, in seconds
+            jitter (float): Fraction of the interval that is randomized (0 = none, 1 = full jitter)
+        """
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.attempt = 0
+
+    def next_delay(self, response=None):
+        """
+        Returns how long to wait before the next poll.
+
+        Args:
+            response (requests.Response): The last response received, if any
+
+        Returns:
+            float: Seconds to wait
+        """
+
+        retry_after = parse_retry_after(response.headers) if response is not None else None
+        self.attempt += 1
+        if retry_after is not None:
+            return retry_after
+
+        interval = min(self.max_interval, self.initial * (self.factor ** (self.attempt - 1)))
+        return interval * (1 - self.jitter * random.random())
+
+
+def poll_operation(url, headers, initial_response=None, deadline=None, backoff=None, get=None, operation=None):
+    """
+    Polls a long-running operation until it reaches a terminal state.
+
+    This function:
+    - Follows the Operation-Location header of the initial response, if present
+    - Waits between polls using a Backoff (honoring Retry-After)
+    - Retries throttled (429) and transient (5xx) poll responses
+    - Stops with PollingTimeout once the overall deadline has passed
+
+    Args:
+        url (str): The URL that reports the operation status
+        headers (dict): HTTP headers, including the subscription key
+        initial_response (requests.Response): The response that started the operation
+        deadline (float): Maximum total seconds to wait, or None for no limit
+        backoff (Backoff): The polling schedule to use (a default one is created if omitted)
+        get (callable): Function used to issue GET requests (defaults to requests.get)
+        operation (Operation): Optional instrumentation.Operation that counts the polls and
+            records the poll wait, result size and decode time
+
+    Returns:
+        tuple: (status, result_json, polls) where polls is the number of GET requests made
+
+    Raises:
+        PollingError: If the status URL returns a non-retryable error
+        PollingTimeout: If the operation is still running when the deadline passes
+    """
+
+    if get is None:
+        import requests
+        get = requests.get
+    backoff = backoff or Backoff()
+    if initial_response is not None:
+        url = initial_response.headers.get("Operation-Location", url)
+    expires = time.monotonic() + deadline if deadline is not None else None
+
+    polls = 0
+    last_response = initial_response
+    while True:
+        delay = backoff.next_delay(last_response)
+        if expires is not None:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise PollingTimeout(f"Operation did not complete within {deadline}s: {url}")
+            delay = min(delay, remaining)
+        time.sleep(delay)
+
+        last_response = get(url, headers=headers)
+        received = time.perf_counter()
+        polls += 1
+        if operation is not None:
+            operation.add("polls", 1)
+
+        # Throttled or transient failures are retried after the next delay
+        if last_response.status_code in RETRYABLE_STATUS_CODES:
+            continue
+        if last_response.status_code >= 400:
+            raise PollingError(f"Polling failed ({last_response.status_code}): {last_response.text}")
+
+        result_json = last_response.json()
+        status = result_json.get("status")
+        if status not in IN_PROGRESS_STATES:
+            if operation is not None:
+                operation.mark_completed(received)
+                operation.add("download_bytes", len(last_response.content))
+                operation.add("decode_seconds", time.perf_counter() - received)
+            return status, result_json, polls
@@ -0,0 +1,241 @@
+import hashlib
+import heapq
+import itertools
+import os
+import threading
+import time
+
+
+# Request priorities: interactive requests (a person is waiting for one card) go before bulk backfills
+INTERACTIVE = 0
+BULK = 1
+
+
+class RateLimiter:
+    """
+    An adaptive token bucket shared by every request made with one endpoint and key.
+
+    Each request takes a token first; tokens are added at rate per second, up to
+    burst. The rate adapts to what the service accepts, the way TCP adapts to a
+    network:
+
+    - Until the rate is first lowered, every accepted request adds one request per
+      second to the rate, so it doubles every second ("slow start") up to max_rate
+    - After that, every accepted request raises the rate a little (additive increase)
+    - Responses are counted over windows of about a second. A window in which more
+      than tolerance of the responses were 429s means the rate is over the key's
+      quota, so the rate is halved, once for the whole window (multiplicative decrease)
+    - A 429 never pauses the other requests: only the throttled request waits for
+      its Retry-After time (on_throttled returns it) before it is sent again, so an
+      isolated 429 (e.g. a brief spike on the service) costs that one request
+
+    So the rate settles just under the key's quota instead of repeatedly
+    overshooting it, and occasional 429s don't collapse it. Waiting requests are served in order of
+    priority, then arrival: a bulk request never takes a token while an
+    interactive request is waiting, and no request waits behind later ones.
+    """
+
+    def __init__(self, rate=10.0, burst=None, min_rate=0.5, max_rate=None, increase=0.5, window=1.0, tolerance=0.2):
+        """
+        Args:
+            rate (float): Requests per second to start with
+            burst (float): Maximum number of requests sent at once (defaults to one second's worth)
+            min_rate (float): The rate is never lowered below this
+            max_rate (float): The rate is never raised above this (e.g. the key's known quota), or None
+            increase (float): Requests per second added to the rate for each second of accepted requests
+            window (float): Seconds over which responses are counted; the rate is lowered at most once per window
+            tolerance (float): Share of 429 responses in a window above which the rate is lowered
+        """
+
+        self.rate = min(rate, max_rate) if max_rate else rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.tokens = self._capacity()
+        self.window = window
+        self.tolerance = tolerance
+        self.throttled = 0          # 429 responses reported
+        self.decreases = 0          # times the rate was lowered
+        self._updated = time.monotonic()
+        self._window_start = self._updated
+        self._window_accepted = 0   # accepted and throttled responses in the current window
+        self._window_throttled = 0
+        self._queue = []            # heap of (priority, ticket) for the waiting requests
+        self._waiting = set()       # tickets still waiting (others are removed from the heap lazily)
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+    def _capacity(self):
+        return self.burst or max(1.0, self.rate)
+
+    def _enter(self, priority):
+        # Queues a request and returns its place in the queue (the condition's lock must be held)
+        entry = (priority, next(self._tickets))
+        heapq.heappush(self._queue, entry)
+        self._waiting.add(entry)
+        return entry
+
+    def _leave(self, entry):
+        # Removes a request from the queue and wakes the others (the condition's lock must be held)
+        self._waiting.discard(entry)
+        while self._queue and self._queue[0] not in self._waiting:
+            heapq.heappop(self._queue)
+        self._condition.notify_all()
+
+    def _take(self, entry):
+        # Takes a token for the request at the head of the queue, returning 0,
+        # or returns how long to wait before trying again (the condition's lock must be held)
+        now = time.monotonic()
+        self.tokens = min(self._capacity(), self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._queue[0] != entry:
+            # An earlier or more urgent request goes first; threads are woken when it leaves
+            return max(0.01, (1 - self.tokens) / self.rate)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self, priority=INTERACTIVE):
+        """
+        Waits until a request may be sent.
+
+        Args:
+            priority (int): INTERACTIVE or BULK
+
+        Returns:
+            float: Seconds spent waiting
+        """
+
+        start = time.monotonic()
+        with self._condition:
+            entry = self._enter(priority)
+            try:
+                while True:
+                    wait = self._take(entry)
+                    if wait <= 0:
+                        return time.monotonic() - start
+                    self._condition.wait(wait)
+            finally:
+                self._leave(entry)
+
+    async def acquire_async(self, priority=INTERACTIVE):
+        """
+        Waits until a request may be sent, without blocking the event loop.
+
+        Args:
+            priority (int): INTERACTIVE or BULK
+
+        Returns:
+            float: Seconds spent waiting
+        """
+
+        # asyncio is only needed by the asyncio engine, so it isn't imported with the module
+        import asyncio
+
+        start = time.monotonic()
+        with self._condition:
+            entry = self._enter(priority)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._take(entry)
+                if wait <= 0:
+                    return time.monotonic() - start
+                await asyncio.sleep(wait)
+        finally:
+            with self._condition:
+                self._leave(entry)
+
+    def on_success(self):
+        """Reports an accepted request, which raises the rate."""
+        with self._condition:
+            self._window_accepted += 1
+            self._end_window(time.monotonic())
+            if self.max_rate is None or self.rate < self.max_rate:
+                if self.decreases == 0:
+                    # Slow start: the rate doubles every second until the service first pushes back
+                    self.rate += 1
+                else:
+                    # One increment for every second's worth of accepted requests
+                    self.rate += self.increase / self.rate
+                if self.max_rate is not None:
+                    self.rate = min(self.rate, self.max_rate)
+
+    def on_throttled(self, retry_after=None):
+        """
+        Reports a 429 response.
+
+        The rate is only lowered if 429s are more than
+        tolerance of the responses of the current window; see the class description.
+
+        Args:
+            retry_after (float): Seconds from the Retry-After header, if it had one
+
+        Returns:
+            float: Seconds the throttled request should wait before it is sent again
+        """
+
+        with self._condition:
+            now = time.monotonic()
+            self.throttled += 1
+            self._window_throttled += 1
+            wait = retry_after if retry_after is not None else 1 / self.rate
+            self._end_window(now)
+            return wait
+
+    def _end_window(self, now):
+        # Once the window has passed, lowers the rate if too many of its responses were 429s,
+        # then starts the next window (the condition's lock must be held)
+        if now - self._window_start < self.window:
+            return
+        responses = self._window_accepted + self._window_throttled
+        if responses and self._window_throttled / responses > self.tolerance:
+            self.decreases += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+        self._window_start = now
+        self._window_accepted = self._window_throttled = 0
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(endpoint, key):
+    """
+    Returns the rate limiter shared by every client in this process that uses an endpoint and key.
+
+    The quota belongs to the key, so all requests made with it, from any client
+    or thread, must share one limiter. If the key's quota is known, set
+    RATE_LIMIT to it (in requests per second) so the rate never goes above it.
+
+    Args:
+        endpoint (str): Azure AI Services endpoint URL
+        key (str): Azure AI Services API key (only a digest of it is kept)
+
+    Returns:
+        RateLimiter: The shared limiter
+    """
+
+    name = (endpoint.rstrip("/").lower(), hashlib.sha256((key or "").encode("utf-8")).hexdigest())
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            max_rate = float(os.getenv("RATE_LIMIT")) if os.getenv("RATE_LIMIT") else None
+            limiter = _limiters[name] = RateLimiter(rate=max_rate or 10.0, max_rate=max_rate)
+        return limiter
+
+
+def reset_rate_limiters():
+    """
+    Forgets the shared rate limiters, so the next client of each endpoint and key starts afresh.
+
+    The shared limiters keep what they learned (the rate reached and any decrease)
+    for the life of the process. Call this between runs that must not affect each
+    other, such as benchmark scenarios or tests; clients created earlier keep their limiter.
+    """
+
+    with _limiters_lock:
+        _limiters.clear()
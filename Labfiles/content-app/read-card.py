@@ -1,31 +1,118 @@
-from dotenv import load_dotenv
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import argparse
+import glob
+import heapq
 import os
 import sys
 import time
-import requests
 import json
 
+# Shared helpers used by several labs live in Labfiles/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from console import clear_console
+from document_shards import analyze_shards, count_pages
+from instrumentation import get_recorder
+from job_journal import JobJournal, result_file_name
+from cu_client import ContentUnderstandingClient, CU_VERSION
+from rate_limiter import BULK, INTERACTIVE
+from polling import Backoff, PollingError, IN_PROGRESS_STATES, RETRYABLE_STATUS_CODES, UNFINISHED
+from result_cache import ResultCache, schema_digest
+from field_decoder import FieldDecoder, decode_value
+from export_sink import ColumnarSink
+
+
+# Maximum seconds to wait for one analysis, however often it is polled
+DEADLINE = 300
+
 
 def main():
 
-    # Clear the console
-    os.system('cls' if os.name=='nt' else 'clear')
+    # Clear the console (with escape codes, so no cls/clear process is started)
+    clear_console()
 
     try:
 
-        # Get the business card
-        image_file = 'biz-card-1.png'
-        if len(sys.argv) > 1:
-            image_file = sys.argv[1]
+        # Get the business card (or a directory / glob pattern of business cards)
+        # e.g. python read-card.py biz-card-1.png
+        #      python read-card.py ./cards --max-in-flight 16
+        #      python read-card.py "cards/*.png"
+        #      python read-card.py ./cards --journal cards.db   (run it again to resume a stopped batch)
+        #      python read-card.py catalog.pdf --shard-pages 50   (analyze 50-page ranges at the same time)
+        parser = argparse.ArgumentParser(description="Analyze business cards with Content Understanding")
+        parser.add_argument("target", nargs="?", default="biz-card-1.png",
+                            help="An image file, a directory of images, or a glob pattern")
+        parser.add_argument("--max-in-flight", type=int, default=8,
+                            help="Maximum number of analyses submitted at the same time in batch mode")
+        parser.add_argument("--output-dir", default="results",
+                            help="Folder where batch mode saves one JSON result per image")
+        parser.add_argument("--export",
+                            help="Write batch results to a columnar dataset (.parquet, .arrow or .csv) instead of JSON files")
+        parser.add_argument("--schema", default="biz-card.json",
+                            help="The analyzer schema file, used to key the result cache")
+        parser.add_argument("--no-cache", action="store_true",
+                            help="Always call the service, even for previously analyzed images")
+        parser.add_argument("--engine", choices=["threads", "async"], default="threads",
+                            help="Batch engine: a thread pool, or one asyncio event loop (requires aiohttp)")
+        parser.add_argument("--journal",
+                            help="SQLite file recording the batch's progress, so a stopped batch can be resumed")
+        parser.add_argument("--shard-pages", type=int,
+                            help="Split a PDF with more pages than this into page ranges analyzed at the same time (requires pypdf)")
+        args = parser.parse_args()
 
         # Get config settings
+        from dotenv import load_dotenv
         load_dotenv()
         ai_svc_endpoint = os.getenv('ENDPOINT')
         ai_svc_key = os.getenv('KEY')
         analyzer = os.getenv('ANALYZER_NAME')
 
-        # Analyze the business card
-        analyze_card(image_file, analyzer, ai_svc_endpoint, ai_svc_key)
+        # Every analysis is timed (upload, acceptance, poll wait, download and decode)
+        # and recorded to METRICS_LOG / METRICS_FILE, if they are set
+        get_recorder("read-card")
+
+        # Results are cached on disk, keyed by the image bytes, analyzer, API version and schema
+        # so re-analyzing an unchanged image with an unchanged analyzer skips the service entirely
+        # The schema also tells us how to decode each field, so a decoder is compiled from it once
+        schema_json = None
+        if os.path.exists(args.schema):
+            with open(args.schema, "r") as file:
+                schema_json = json.load(file)
+        cache = None if args.no_cache else ResultCache()
+        schema_hash = schema_digest(schema_json) if schema_json else ""
+        decoder = FieldDecoder(schema_json["fieldSchema"]) if schema_json else None
+
+        # The client keeps a pool of open connections, large enough for every in-flight analysis,
+        # so submissions and polls reuse connections instead of opening a new one per request
+        # Requests are paced by a rate limiter shared by everything using this endpoint and key;
+        # a batch runs at bulk priority, so a single card analyzed at the same time goes first
+        # The asyncio engine is only imported when asked for, so aiohttp stays optional
+        # (it isn't in requirements.txt); it only runs batches, so a single card always uses the threads client
+        image_files = expand_targets(args.target)
+        pool_size = max(10, args.max_in_flight)
+        priority = INTERACTIVE if image_files is None else BULK
+        if args.engine == "async" and image_files is not None:
+            try:
+                from cu_async import ContentUnderstandingSyncClient
+            except ImportError:
+                raise ImportError("The async engine requires aiohttp (pip install aiohttp)")
+            client = ContentUnderstandingSyncClient(ai_svc_endpoint, ai_svc_key, pool_size=pool_size, priority=priority)
+        else:
+            client = ContentUnderstandingClient(ai_svc_endpoint, ai_svc_key, pool_size=pool_size, priority=priority)
+        with client:
+            if image_files is None:
+                # Analyze the business card
+                analyze_card(args.target, analyzer, client, cache, schema_hash, decoder, args.shard_pages, args.max_in_flight)
+            else:
+                # Analyze every business card in the directory / glob
+                # The journal is per analyzer and schema, so a changed schema never reuses old results
+                journal = JobJournal(args.journal, f"{analyzer}:{schema_hash}") if args.journal else None
+                try:
+                    run_batch(image_files, analyzer, client, args.max_in_flight, args.output_dir, cache, schema_hash,
+                              decoder, args.export, journal)
+                finally:
+                    if journal is not None:
+                        journal.close()
 
         print("\n")
 
@@ -34,56 +121,80 @@ def main():
 
 
 
-def analyze_card(image_file, analyzer, endpoint, key):
+def analyze_card(image_file, analyzer, client, cache=None, schema_hash="", decoder=None, shard_pages=None, max_in_flight=8):
     """
     Analyzes a business card image using the Content Understanding REST API.
     
     This function:
-    - Reads the image file from disk
-    - Submits it to the analyzer via REST API
+    - Returns the cached result if this image was already analyzed
+    - Splits a PDF with more than shard_pages pages into page ranges analyzed at the same time
+    - Streams the image file from disk to the analyzer via REST API
     - Polls the operation status until completion
     - Extracts and displays the recognized field values
     - Saves the full JSON response to a file
+    - Records how long each stage took (see instrumentation.Operation)
     
     Args:
         image_file (str): Path to the business card image file
         analyzer (str): Name of the analyzer to use
-        endpoint (str): Azure AI Services endpoint URL
-        key (str): Azure AI Services API key for authentication
+        client (ContentUnderstandingClient): Client for the Azure AI Services endpoint
+        cache (ResultCache): Cache of previous results, or None to always call the service
+        schema_hash (str): Digest of the analyzer schema, used in the cache key
+        decoder (FieldDecoder): Decoder compiled from the analyzer schema, used to display the fields
+        shard_pages (int): Page count above which a PDF is analyzed in page ranges, or None
+        max_in_flight (int): Maximum number of page ranges analyzed at the same time
     """
     
     # Display which image is being analyzed
     print (f"Analyzing {image_file}")
+    operation = get_recorder().operation("analyze", image_file)
 
-    # Set the API version for Content Understanding
-    # This ensures compatibility with the Azure service
-    CU_VERSION = "2025-05-01-preview"
+    # Check the cache before uploading anything
+    # A hit means this exact image was already analyzed with the same analyzer and schema
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.key(image_file, analyzer, CU_VERSION, schema_hash)
+        result_json = cache.get(cache_key)
+        if result_json is not None:
+            print("Analysis succeeded (cached result):\n")
+            with operation.time("decode_seconds"):
+                save_results(result_json, "results.json")
+                print_fields(result_json, decoder)
+            operation.finish("Cached")
+            return
+
+    # A large PDF is split into page ranges that are analyzed at the same time,
+    # so it takes about as long as its slowest range rather than all its pages in turn
+    # The ranges' results are merged back into one document (see document_shards.merge_results)
+    if shard_pages and image_file.lower().endswith(".pdf") and count_pages(image_file) > shard_pages:
+        print(f"Submitting page ranges of up to {shard_pages} pages...")
+        try:
+            result_json = analyze_pdf_shards(image_file, analyzer, client, shard_pages, max_in_flight, operation)
+        except (PollingError, RuntimeError) as ex:
+            print(f"ERROR: Failed to analyze {image_file}")
+            print(ex)
+            operation.finish("Failed", str(ex))
+            return
+        print("Analysis succeeded:\n")
+        if cache is not None:
+            cache.put(cache_key, result_json)
+        with operation.time("decode_seconds"):
+            save_results(result_json, "results.json")
+            print_fields(result_json, decoder)
+        operation.finish()
+        return
 
-    # Read the image file from disk into memory as binary data
-    # Binary mode ('rb') is necessary because images are binary files
-    # This data will be sent to the analyzer
-    with open(image_file, "rb") as file:
-        image_data = file.read()
-    
     # Use a POST request to submit the image data to the analyzer
     # POST is used for submitting data for analysis/processing
     print("Submitting request...")
     
-    # Prepare HTTP headers for the API request
-    # Ocp-Apim-Subscription-Key: Authentication header with API key
-    # Content-Type: application/octet-stream indicates binary image data
-    headers = {
-        "Ocp-Apim-Subscription-Key": key,
-        "Content-Type": "application/octet-stream"}
-    
-    # Construct the REST API URL for the analyze operation
-    # The :analyze action tells the API to process the image
-    # Format: {endpoint}/contentunderstanding/analyzers/{analyzer}:analyze?api-version={version}
-    url = f'{endpoint}/contentunderstanding/analyzers/{analyzer}:analyze?api-version={CU_VERSION}'
-    
     # Submit the image to the analyzer
+    # The client streams the file from disk to the :analyze action of the analyzer as binary data
+    # (Content-Type: application/octet-stream), so it is never read into memory as a whole
+    # Format: {endpoint}/contentunderstanding/analyzers/{analyzer}:analyze?api-version={version}
     # The analyzer will extract structured data from the business card
-    response = requests.post(url, headers=headers, data=image_data)
+    # Passing the operation lets the client time the upload separately from the service's response
+    response = client.analyze_file(analyzer, image_file, operation)
 
     # Print the HTTP response status code
     # 202 = Accepted, indicating the analysis has started asynchronously
@@ -92,8 +203,9 @@ def analyze_card(image_file, analyzer, endpoint, key):
     # Check if the POST request was successful
     # Status codes 400 or higher indicate an error
     if response.status_code >= 400:
-        print(f"ERROR: Failed to submit image for analysis")
+        print("ERROR: Failed to submit image for analysis")
         print(f"Response: {response.text}")
+        operation.finish("Failed", f"HTTP {response.status_code}")
         return
     
     # Extract the response JSON and get the operation ID
@@ -105,91 +217,483 @@ def analyze_card(image_file, analyzer, endpoint, key):
     # Verify that we got a valid operation ID
     if not id_value:
         print("ERROR: No operation ID returned from the API")
+        operation.finish("Failed", "No operation ID")
         return
 
     # Use a GET request to check the status of the analysis operation
     # This is where we'll poll to see when the analysis completes
     print ('Getting results...')
-    time.sleep(1)  # Small delay before first poll
     
     # Construct the URL to retrieve the analysis results
     # Format: {endpoint}/contentunderstanding/analyzerResults/{id}?api-version={version}
-    result_url = f'{endpoint}/contentunderstanding/analyzerResults/{id_value}?api-version={CU_VERSION}'
-    
-    # Submit the GET request to retrieve the current status
-    result_response = requests.get(result_url, headers=headers)
-    print(result_response.status_code)  # Print HTTP status code
+    result_url = client.result_url(id_value)
     
-    # Check if the GET request was successful
-    if result_response.status_code >= 400:
-        print(f"ERROR: Failed to retrieve analysis results")
-        print(f"Response: {result_response.text}")
-        return
-
     # Keep polling until the analysis is complete
     # The status will be "Running" until analysis is done, then "Succeeded" or "Failed"
-    status = result_response.json().get("status")
-    while status == "Running":
-        time.sleep(1)  # Wait before polling again to avoid overwhelming the service
-        result_response = requests.get(result_url, headers=headers)
-        status = result_response.json().get("status")
+    # poll_operation starts with a short wait and backs off exponentially (with jitter),
+    # honoring any Retry-After header and retrying throttled (429) or 5xx responses
+    try:
+        status, result_json, _ = client.poll(result_url, initial_response=response, deadline=DEADLINE, operation=operation)
+    except PollingError as ex:
+        print("ERROR: Failed to retrieve analysis results")
+        print(ex)
+        operation.finish("Failed", str(ex))
+        return
 
     # Process the analysis results once the operation completes
     if status == "Succeeded":
         print("Analysis succeeded:\n")
         
-        # Extract the complete JSON response from the API
-        result_json = result_response.json()
-        
+        # Remember the result so the same image is never paid for twice
+        if cache is not None:
+            cache.put(cache_key, result_json)
+
         # Save the full JSON response to a file for reference
         # This is useful for debugging and understanding the response structure
-        output_file = "results.json"
-        with open(output_file, "w") as json_file:
-            json.dump(result_json, json_file, indent=4)  # indent=4 makes the JSON readable
-            print(f"Response saved in {output_file}\n")
-
-        # Extract the content from the results
-        # The API response structure contains a 'result' object with 'contents' array
-        # contents is a list of analyzed items (typically just one for a single image)
-        contents = result_json["result"]["contents"]
-        
-        # Iterate through each content item (in this case, the business card)
-        for content in contents:
-            # Check if the content has 'fields' (extracted data)
-            # Not all content types may have fields, so we check first
-            if "fields" in content:
-                fields = content["fields"]
-                
-                # Iterate through each field and display its value
-                # The field_name is the key (e.g., "name", "email", "phone")
-                # The field_data contains type and value information
-                # This loop extracts and displays all recognized information from the card
-                for field_name, field_data in fields.items():
-                    # Extract the value based on the field's data type
-                    # Different types require accessing different value properties
-                    # This is important because the API returns type-specific value fields
-                    if field_data['type'] == "string":
-                        print(f"{field_name}: {field_data['valueString']}")
-                    elif field_data['type'] == "number":
-                        print(f"{field_name}: {field_data['valueNumber']}")
-                    elif field_data['type'] == "integer":
-                        print(f"{field_name}: {field_data['valueInteger']}")
-                    elif field_data['type'] == "date":
-                        print(f"{field_name}: {field_data['valueDate']}")
-                    elif field_data['type'] == "time":
-                        print(f"{field_name}: {field_data['valueTime']}")
-                    elif field_data['type'] == "array":
-                        # Arrays can contain multiple values separated by commas
-                        print(f"{field_name}: {field_data['valueArray']}")
+        # Extract and display the field values
+        with operation.time("decode_seconds"):
+            save_results(result_json, "results.json")
+            print_fields(result_json, decoder)
     else:
         # Handle analysis failure
         print(f"Analysis failed with status: {status}\n")
-        result_json = result_response.json()
         print("Error details:")
         print(result_json)  # Print the full error response for debugging
+    operation.finish(status)
+
+
+def analyze_pdf_shards(pdf_file, analyzer, client, shard_pages, max_in_flight=8, operation=None):
+    """
+    Analyzes a large PDF as page ranges that run at the same time.
+
+    Args:
+        pdf_file (str): Path to the PDF
+        analyzer (str): Name of the analyzer to use
+        client (ContentUnderstandingClient): Client for the Azure AI Services endpoint
+        shard_pages (int): Maximum number of pages in each range
+        max_in_flight (int): Maximum number of ranges analyzed at the same time
+        operation (Operation): Optional instrumentation.Operation for the whole document
+
+    Returns:
+        dict: The analysis response, whose "result" is the ranges' results merged into one document
+
+    Raises:
+        RuntimeError: If any range could not be submitted or its analysis did not succeed
+    """
+
+    responses = {}
+
+    def analyze_shard(shard):
+        # Each range is streamed from its temporary file and polled like a whole file
+        response = client.analyze_file(analyzer, shard.path)
+        if response.status_code >= 400:
+            raise RuntimeError(f"Failed to submit pages {shard.first_page}-{shard.last_page} ({response.status_code}): {response.text}")
+        id_value = response.json().get("id")
+        if not id_value:
+            raise RuntimeError(f"No operation ID returned from the API for pages {shard.first_page}-{shard.last_page}")
+        status, result_json, _ = client.poll(client.result_url(id_value), initial_response=response, deadline=DEADLINE)
+        if status != "Succeeded":
+            raise RuntimeError(f"Analysis of pages {shard.first_page}-{shard.last_page} failed with status {status}: {result_json}")
+        responses[shard.first_page] = result_json
+        return result_json.get("result", {})
+
+    result = analyze_shards(pdf_file, analyze_shard, shard_pages, max_in_flight, operation)
+
+    # The response of the first range stands for the whole document
+    return dict(responses[min(responses)], result=result)
+
+
+def save_results(result_json, output_file):
+    """
+    Saves the full JSON response of an analysis to a file.
+
+    Args:
+        result_json (dict): The JSON response returned by the analyzerResults operation
+        output_file (str): Path of the file to write
+    """
+
+    with open(output_file, "w") as json_file:
+        json.dump(result_json, json_file, indent=4)  # indent=4 makes the JSON readable
+        print(f"Response saved in {output_file}\n")
+
+
+def print_fields(result_json, decoder=None):
+    """
+    Displays the field values recognized in a Content Understanding result.
+
+    Args:
+        result_json (dict): The JSON response returned by the analyzerResults operation
+        decoder (FieldDecoder): Decoder compiled from the analyzer schema, or None to decode
+            each field from the type reported in the result
+    """
+
+    # Without a schema, decode each field from its own 'type'
+    # decode_value handles every field type, including nested arrays and objects
+    # The API response structure contains a 'result' object with 'contents' array
+    # contents is a list of analyzed items (typically just one for a single image)
+    if decoder is None:
+        for content in result_json["result"]["contents"]:
+            for field_name, field_data in content.get("fields", {}).items():
+                print(f"{field_name}: {decode_value(field_data)}")
+        return
+
+    # With a schema, the decoder was compiled once from its fieldSchema
+    # and turns each content item's fields into a typed record
+    for record in decoder.decode(result_json):
+        for field_name, value in record.as_dict().items():
+            print(f"{field_name}: {value}")
+
+
+def expand_targets(target):
+    """
+    Expands a batch target into the list of image files it refers to.
+
+    Args:
+        target (str): An image file, a directory of images, or a glob pattern
+
+    Returns:
+        list: Sorted image file paths, or None if the target is a single file
+    """
+
+    # A directory means "every file in it"
+    if os.path.isdir(target):
+        return sorted(os.path.join(target, name) for name in os.listdir(target)
+                      if os.path.isfile(os.path.join(target, name)))
+
+    # A pattern such as "cards/*.png" is expanded with glob
+    if glob.has_magic(target):
+        return sorted(path for path in glob.glob(target) if os.path.isfile(path))
+
+    # Anything else is a single image file
+    return None
+
+
+def submit_card(image_file, analyzer, client, operation=None):
+    """
+    Submits a business card image for analysis without waiting for the result.
+
+    Args:
+        image_file (str): Path to the business card image file
+        analyzer (str): Name of the analyzer to use
+        client (ContentUnderstandingClient): Client for the Azure AI Services endpoint
+        operation (Operation): Optional instrumentation.Operation for this analysis
+
+    Returns:
+        str: The operation ID used to retrieve the analysis results
+
+    Raises:
+        RuntimeError: If the service rejects the request or returns no operation ID
+    """
+
+    response = client.analyze_file(analyzer, image_file, operation)
+    if response.status_code >= 400:
+        raise RuntimeError(f"Failed to submit {image_file} for analysis ({response.status_code}): {response.text}")
+
+    id_value = response.json().get("id")
+    if not id_value:
+        raise RuntimeError(f"No operation ID returned from the API for {image_file}")
+    return id_value
+
+
+def analyze_cards(image_files, analyzer, client, max_in_flight=8, cache=None, schema_hash="", journal=None, resume=None,
+                  deadline=DEADLINE):
+    """
+    Analyzes many business card images concurrently.
+
+    This function:
+    - Returns cached results without calling the service; each image is hashed and looked up
+      in the cache by the worker that would submit it, so the first submissions don't wait
+      for the whole batch to be hashed
+    - Keeps up to max_in_flight analyses submitted at any one time
+    - Hands the whole batch to the asyncio engine instead, if the client is a cu_async client
+    - Submits new images in parallel as soon as earlier ones complete, in the background,
+      so a slow upload or a throttled submission never holds up the polls
+    - Resumes polling the operations given in resume instead of submitting those images again
+    - Records each operation ID in the journal as soon as the service accepts the image
+    - Gives every operation its own polling schedule (see polling.Backoff)
+    - Polls all operations that are due together in one sweep
+    - Gives up only on the card concerned if a poll raises (e.g. a dropped connection) or
+      its analysis hasn't finished deadline seconds after it was submitted; it is yielded
+      as UNFINISHED, since the service accepted it and it may still succeed
+    - Yields each result as soon as its operation reaches a terminal state
+    - Records each analysis (see instrumentation.Operation); the time the caller
+      spends handling a result before asking for the next one is its decode time
+
+    Total time therefore depends on how many analyses the service runs at once,
+    rather than on the sum of the per-card latencies.
+
+    Args:
+        image_files (list): Paths to the business card image files
+        analyzer (str): Name of the analyzer to use
+        client (ContentUnderstandingClient or ContentUnderstandingSyncClient): Client for the Azure AI Services endpoint
+        max_in_flight (int): Maximum number of outstanding analyses
+        cache (ResultCache): Cache of previous results, or None to always call the service
+        schema_hash (str): Digest of the analyzer schema, used in the cache key
+        journal (JobJournal): Journal of the batch, in which each submission is recorded, or None
+        resume (dict): Operation ID of each image whose analysis is already running (from the journal)
+        deadline (float): Maximum seconds to wait for each analysis (the asyncio engine uses its client's deadline)
+
+    Yields:
+        tuple: (image_file, status, result_json) for each image; the status is the service's
+        terminal status, "Failed" if the image was rejected, or UNFINISHED
+    """
+
+    resume = resume or {}
+    pending = deque()
+    in_flight = {}  # operation ID -> (image file, Backoff, time it was submitted or resumed)
+    cache_keys = {}  # image file -> cache key
+    operations = {}  # image file -> instrumentation.Operation
+    recorder = get_recorder()
+
+    def deliver(image_file, status, result_json, recorded_status=None):
+        # The caller decodes and saves the result while the generator is suspended at the yield
+        operation = operations.pop(image_file)
+        with operation.time("decode_seconds"):
+            yield image_file, status, result_json
+        error = result_json.get("error") if status not in ("Succeeded", "Cached") else None
+        operation.finish(recorded_status or status, str(error) if error else None)
+
+    def cache_key(image_file):
+        # Hashing reads the whole image, so it is done once per image and only when needed
+        if image_file not in cache_keys:
+            cache_keys[image_file] = cache.key(image_file, analyzer, CU_VERSION, schema_hash)
+        return cache_keys[image_file]
+
+    def lookup(image_file):
+        return cache.get(cache_key(image_file)) if cache is not None else None
+
+    # Resumed images aren't looked up; their results are cached when they complete
+    for image_file in image_files:
+        operations[image_file] = recorder.operation("analyze", image_file)
+        if image_file not in resume:
+            pending.append(image_file)
+
+    # The asyncio engine submits and polls every analysis on a single event loop
+    # It is only given the cache misses, which are looked up in parallel first
+    if hasattr(client, "analyze_many"):
+        if cache is not None and pending:
+            with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+                cached = list(zip(pending, executor.map(lookup, pending)))
+            pending = deque(image_file for image_file, result_json in cached if result_json is None)
+            for image_file, result_json in cached:
+                if result_json is not None:
+                    yield from deliver(image_file, "Succeeded", result_json, "Cached")
+        on_submitted = journal.submitted if journal is not None else None
+        paths = [image_file for image_file in image_files if image_file in resume] + list(pending)
+        for image_file, status, result_json in client.analyze_many(analyzer, paths, max_in_flight, operations,
+                                                                   resume, on_submitted):
+            if status == "Succeeded" and cache is not None:
+                cache.put(cache_key(image_file), result_json)
+            yield from deliver(image_file, status, result_json)
+        return
+
+    due = []        # heap of (time the next poll is due, operation ID)
+
+    def try_submit(image_file):
+        # Returns (operation ID, error, cached result); a cache hit is never submitted
+        try:
+            result_json = lookup(image_file)
+        except Exception as ex:
+            return None, str(ex), None
+        if result_json is not None:
+            return None, None, result_json
+        operations[image_file].start()
+        try:
+            id_value = submit_card(image_file, analyzer, client, operations[image_file])
+        except Exception as ex:
+            return None, str(ex), None
+        # Recorded before anything else happens, so a crash from here on never pays for this image twice
+        if journal is not None:
+            journal.submitted(image_file, id_value)
+        return id_value, None, None
+
+    def try_poll(id_value):
+        try:
+            return client.get_result(id_value), None
+        except Exception as ex:
+            return None, str(ex)
+
+    # Operations that were still running when an earlier run stopped are polled, not submitted again
+    for image_file, id_value in resume.items():
+        operations[image_file].start()
+        backoff = Backoff()
+        in_flight[id_value] = (image_file, backoff, time.monotonic())
+        heapq.heappush(due, (time.monotonic(), id_value))
+
+    submitting = {}  # future of each submission being sent -> image file
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        while pending or in_flight or submitting:
+
+            # Top up the in-flight set with new submissions, and collect the ones that are done
+            while pending and len(in_flight) + len(submitting) < max_in_flight:
+                image_file = pending.popleft()
+                submitting[executor.submit(try_submit, image_file)] = image_file
+            for future in [future for future in submitting if future.done()]:
+                image_file = submitting.pop(future)
+                id_value, error, result_json = future.result()
+                if result_json is not None:
+                    yield from deliver(image_file, "Succeeded", result_json, "Cached")
+                elif id_value:
+                    backoff = Backoff()
+                    in_flight[id_value] = (image_file, backoff, time.monotonic())
+                    heapq.heappush(due, (time.monotonic() + backoff.next_delay(), id_value))
+                else:
+                    yield from deliver(image_file, "Failed", {"error": error})
+
+            if not in_flight:
+                wait(submitting, return_when=FIRST_COMPLETED)
+                continue
+
+            # Wait until the earliest operation is due (or a submission is done, so its slot
+            # can be refilled), then poll every operation that is due
+            timeout = due[0][0] - time.monotonic()
+            if timeout > 0 and submitting:
+                wait(submitting, timeout=timeout, return_when=FIRST_COMPLETED)
+            elif timeout > 0:
+                time.sleep(timeout)
+            now = time.monotonic()
+            ready = []
+            while due and due[0][0] <= now:
+                ready.append(heapq.heappop(due)[1])
+
+            # Each poll's errors are its own, so one dropped connection doesn't stop the batch
+            polls = executor.map(try_poll, ready)
+            for id_value, (result_response, error) in zip(ready, polls):
+                received = time.perf_counter()
+                image_file, backoff, submitted = in_flight[id_value]
+                operation = operations[image_file]
+                operation.add("polls", 1)
+                if error is not None:
+                    del in_flight[id_value]
+                    yield from deliver(image_file, UNFINISHED, {"error": error, "id": id_value})
+                    continue
+
+                # An analysis that is still running (or still throttled) at its deadline is given up
+                expired = now - submitted > deadline
+
+                # Throttled or transient failures are retried on a later sweep
+                if result_response.status_code in RETRYABLE_STATUS_CODES and not expired:
+                    heapq.heappush(due, (now + backoff.next_delay(result_response), id_value))
+                    continue
+                if result_response.status_code in RETRYABLE_STATUS_CODES:
+                    del in_flight[id_value]
+                    yield from deliver(image_file, UNFINISHED, {"error": result_response.text, "id": id_value})
+                    continue
+                if result_response.status_code >= 400:
+                    del in_flight[id_value]
+                    yield from deliver(image_file, "Failed", {"error": result_response.text})
+                    continue
+
+                result_json = result_response.json()
+                status = result_json.get("status")
+                if status in IN_PROGRESS_STATES and expired:
+                    del in_flight[id_value]
+                    yield from deliver(image_file, UNFINISHED,
+                                       {"error": f"Analysis did not complete within {deadline} seconds (last status {status})",
+                                        "id": id_value})
+                elif status in IN_PROGRESS_STATES:
+                    heapq.heappush(due, (now + backoff.next_delay(result_response), id_value))
+                else:
+                    del in_flight[id_value]
+                    operation.mark_completed(received)
+                    operation.add("download_bytes", len(result_response.content))
+                    operation.add("decode_seconds", time.perf_counter() - received)
+                    if status == "Succeeded" and cache is not None:
+                        cache.put(cache_key(image_file), result_json)
+                    yield from deliver(image_file, status, result_json)
+
+
+def run_batch(image_files, analyzer, client, max_in_flight, output_dir, cache=None, schema_hash="", decoder=None, export=None,
+              journal=None):
+    """
+    Analyzes a batch of business cards and saves one result file per image,
+    or appends one row per card to a columnar dataset if export is set.
+
+    With a journal, the batch can be stopped and run again: cards whose results
+    were saved are skipped, and analyses that were still running are polled
+    rather than submitted again. Every result is then also saved to its own JSON
+    file, since that file is what the journal points to (and what rebuilds the
+    export when the batch is resumed).
+
+    Args:
+        image_files (list): Paths to the business card image files
+        analyzer (str): Name of the analyzer to use
+        client (ContentUnderstandingClient or ContentUnderstandingSyncClient): Client for the Azure AI Services endpoint
+        max_in_flight (int): Maximum number of outstanding analyses
+        output_dir (str): Folder where the JSON results are saved
+        cache (ResultCache): Cache of previous results, or None to always call the service
+        schema_hash (str): Digest of the analyzer schema, used in the cache key
+        decoder (FieldDecoder): Decoder compiled from the analyzer schema, used to display the fields
+        export (str): Path of a .parquet, .arrow or .csv dataset to write instead of JSON files
+        journal (JobJournal): Journal recording the batch's progress, or None
+    """
+
+    # Work out what an earlier run of this batch already did
+    done, resume, to_analyze = {}, {}, image_files
+    if journal is not None:
+        done, running, todo = journal.plan(image_files)
+        resume = {image_file: entry.operation for image_file, entry in running.items()}
+        to_analyze = list(running) + todo
+        print(f"Journal {journal.path}: {len(done)} already analyzed, {len(running)} still running, {len(todo)} to submit")
+
+    print(f"Analyzing {len(to_analyze)} images (up to {max_in_flight} at a time)")
+
+    # A columnar export has one column per schema field, so it needs the compiled decoder
+    sink = None
+    if export:
+        if decoder is None:
+            raise ValueError("Exporting results requires the analyzer schema (see --schema)")
+        sink = ColumnarSink(export, decoder)
+    if sink is None or journal is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    succeeded = 0
+    try:
+        # Results saved by an earlier run only need to be added to a new export
+        for image_file, entry in done.items():
+            succeeded += 1
+            if sink is not None:
+                with open(entry.result_path, "r") as json_file:
+                    for record in decoder.decode(json.load(json_file)):
+                        sink.write(image_file, record)
+
+        for image_file, status, result_json in analyze_cards(to_analyze, analyzer, client, max_in_flight, cache, schema_hash,
+                                                             journal, resume):
+            print(f"\n{image_file}: {status}")
+            if status == UNFINISHED:
+                # Already accepted (and paid for): the journal keeps it submitted, so a resumed batch polls it again
+                print(result_json)
+                continue
+            if status != "Succeeded":
+                print(result_json)
+                if journal is not None:
+                    journal.failed(image_file, status, str(result_json.get("error") or status))
+                continue
 
+            succeeded += 1
+            result_path = None
+            if sink is None or journal is not None:
+                result_path = os.path.join(output_dir, result_file_name(image_file))
+                save_results(result_json, result_path)
+            if sink is not None:
+                # One row per card; rows are flushed to disk in batches
+                for record in decoder.decode(result_json):
+                    sink.write(image_file, record)
+            else:
+                print_fields(result_json, decoder)
 
+            # Only recorded once the result is on disk, so a crash before this point polls the operation again
+            # The path is absolute, so the batch can be resumed from another folder
+            if journal is not None:
+                journal.succeeded(image_file, status, os.path.abspath(result_path) if result_path else None)
+    finally:
+        if sink is not None:
+            sink.close()
+            print(f"\n{sink.rows_written} rows exported to {export}")
 
+    elapsed = time.perf_counter() - start
+    print(f"\n{succeeded}/{len(image_files)} analyses succeeded in {elapsed:.1f}s")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    Computes the SHA-256 digest of a file without loading it all into memory.
+
+    Args:
+        path (str): Path to the file
+        chunk_size (int): Number of bytes read at a time
+
+    Returns:
+        str: The hex digest of the file contents
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def schema_digest(schema):
+    """
+    Computes a digest of an analyzer schema that ignores formatting and key order.
+
+    Args:
+        schema (dict or str): The analyzer schema, as a dict or a JSON string
+
+    Returns:
+        str: The hex digest of the normalized schema
+    """
+
+    if isinstance(schema, str):
+        schema = json.loads(schema)
+    normalized = json.dumps(schema, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    An on-disk cache of Content Understanding analysis results.
+
+    Results are stored under a content-addressed key built from the SHA-256 of
+    the analyzed file plus the analyzer name, API version and schema digest, so
+    a changed image, analyzer or schema never returns a stale result.
+    Entries stored more than max_age ago are ignored, however often they are
+    read, and once the cache grows past max_bytes the least recently used
+    entries are removed. Each entry records when it was stored; the file's
+    modification time is only used to order entries by their last use.
+    """
+
+    def __init__(self, directory=".cu-cache", max_bytes=512 * 1024 * 1024, max_age=30 * 24 * 3600):
+        """
+        Args:
+            directory (str): Folder where cached results are stored
+            max_bytes (int): Maximum total size of the cache, in bytes
+            max_age (float): Maximum age of a cached result, in seconds (None = no limit)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._size = None  # running total of the cache size, computed on first write
+
+    def key(self, path, analyzer, api_version, schema_digest=""):
+        """
+        Builds the cache key for analyzing a file with an analyzer.
+
+        Args:
+            path (str): Path to the file being analyzed
+            analyzer (str): Name of the analyzer
+            api_version (str): Content Understanding API version
+            schema_digest (str): Digest of the analyzer schema (see schema_digest)
+
+        Returns:
+            str: The cache key
+        """
+
+        parts = "\n".join([file_digest(path), analyzer or "", api_version, schema_digest])
+        return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        # Spread entries over sub-folders so no single folder gets too large
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        """
+        Returns the cached result for a key.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            dict: The cached result JSON, or None on a cache miss
+        """
+
+        path = self._path(key)
+        try:
+            with open(path, "r") as file:
+                entry = json.load(file)
+            # Entries written before the storage time was recorded are treated as misses (and replaced)
+            if not isinstance(entry, dict) or "stored_at" not in entry:
+                return None
+            if self.max_age is not None and time.time() - entry["stored_at"] > self.max_age:
+                os.remove(path)
+                return None
+            # Touch the entry so eviction removes the least recently used results first
+            os.utime(path)
+        except (OSError, ValueError, TypeError):
+            return None
+
+        return entry["result"]
+
+    def put(self, key, result_json):
+        """
+        Stores a result in the cache.
+
+        The result is written to a temporary file that is then renamed into
+        place, so readers never see a partially written entry.
+
+        Args:
+            key (str): The cache key
+            result_json (dict): The result JSON to store
+        """
+
+        if self._size is None:
+            self.evict()
+
+        path = self._path(key)
+        try:
+            # Overwriting an entry replaces its size in the running total rather than adding to it
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump({"stored_at": time.time(), "result": result_json}, file, separators=(",", ":"))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        # Only scan the cache folder again once it may have outgrown max_bytes
+        self._size += os.path.getsize(path) - replaced
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes expired entries, then the least recently used ones until the cache fits in max_bytes.
+
+        An entry not used for max_age was stored at least that long ago, so it is
+        removed without being read; entries that are still used but were stored
+        too long ago are removed by get.
+        """
+
+        entries = []
+        now = time.time()
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if self.max_age is not None and now - stat.st_mtime > self.max_age:
+                    # Another process evicting the same cache may have removed it already
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self._size = total
@@ -0,0 +1,217 @@
+import asyncio
+import importlib.util
+import os
+import shutil
+import sys
+import threading
+import pytest
+
+# The tests run read-card.py's batch engine against the simulated service from the benchmark suite
+# (the lab's modules use the shared helpers in Labfiles/common, which read-card.py adds to the path)
+CONTENT_APP = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(CONTENT_APP, "..", "benchmark"))
+sys.path.insert(0, os.path.join(CONTENT_APP, "..", "common"))
+from simulated_service import SimulatedService
+from cu_client import ContentUnderstandingClient
+from rate_limiter import RateLimiter
+from polling import PollingError, UNFINISHED
+from job_journal import JobJournal, SUBMITTED, SUCCEEDED
+from result_cache import ResultCache
+
+
+def load_script(path):
+    # The script's file name isn't a valid module name, so it is imported from its path
+    spec = importlib.util.spec_from_file_location("read_card", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+read_card = load_script(os.path.join(CONTENT_APP, "read-card.py"))
+
+
+def make_cards(folder, count):
+    os.makedirs(folder)
+    paths = []
+    for index in range(count):
+        paths.append(os.path.join(folder, f"card-{index}.png"))
+        shutil.copy(os.path.join(CONTENT_APP, "biz-card-1.png"), paths[-1])
+    return paths
+
+
+def new_client(service):
+    # Each test gets its own rate limiter, so a 429 in one test never slows another
+    return ContentUnderstandingClient(service.endpoint, "key", pool_size=16, limiter=RateLimiter(rate=200))
+
+
+def analyze(cards, client, **kwargs):
+    return {os.path.basename(image_file): (status, result_json)
+            for image_file, status, result_json in read_card.analyze_cards(cards, "biz-card", client, **kwargs)}
+
+
+class FlakyClient:
+    """Wraps a client so that polling one operation raises, as a dropped connection does."""
+
+    def __init__(self, client, broken_file):
+        self.client = client
+        self.broken_file = broken_file
+        self.broken_ids = set()
+
+    def analyze_file(self, analyzer, path, operation=None):
+        response = self.client.analyze_file(analyzer, path, operation)
+        if os.path.basename(path) == self.broken_file:
+            self.broken_ids.add(response.json()["id"])
+        return response
+
+    def get_result(self, id_value):
+        if id_value in self.broken_ids:
+            raise ConnectionError("Connection reset by peer")
+        return self.client.get_result(id_value)
+
+
+def test_every_card_is_submitted_and_polled_to_completion(tmp_path):
+    cards = make_cards(tmp_path / "cards", 10)
+    with SimulatedService(latency=0.005, processing_time=0.3, seed=1) as service, new_client(service) as client:
+        results = analyze(cards, client, max_in_flight=4)
+
+    assert sorted(results) == sorted(os.path.basename(card) for card in cards)
+    assert all(status == "Succeeded" for status, _ in results.values())
+    assert all(result_json["result"]["contents"] for _, result_json in results.values())
+    assert service.stats[("cu-analyze", 202)] == 10
+    # Every card is polled until its result is ready (how often depends on its backoff)
+    assert service.stats[("cu-result", 200)] >= 10
+    # Submissions and polls reuse the client's pooled connections instead of opening one per request
+    assert service.connections <= 4
+
+
+def test_throttled_requests_are_retried(tmp_path):
+    cards = make_cards(tmp_path / "cards", 8)
+    with SimulatedService(latency=0.005, processing_time=0.2, throttle_rate=0.2, seed=3) as service, \
+            new_client(service) as client:
+        results = analyze(cards, client, max_in_flight=4)
+
+    assert all(status == "Succeeded" for status, _ in results.values())
+    assert sum(count for (route, status), count in service.stats.items() if status == 429) > 0
+
+
+def test_a_failed_poll_gives_up_only_on_its_card(tmp_path):
+    cards = make_cards(tmp_path / "cards", 6)
+    with SimulatedService(latency=0.005, processing_time=0.2, seed=1) as service, new_client(service) as client:
+        results = analyze(cards, FlakyClient(client, "card-2.png"), max_in_flight=3)
+
+    # The service accepted the card, so it is unfinished rather than failed
+    assert results["card-2.png"][0] == UNFINISHED
+    assert "Connection reset" in results["card-2.png"][1]["error"]
+    assert all(status == "Succeeded" for name, (status, _) in results.items() if name != "card-2.png")
+
+
+def test_a_card_that_cannot_be_read_fails_only_its_card(tmp_path):
+    cards = make_cards(tmp_path / "cards", 4)
+    missing = str(tmp_path / "cards" / "missing.png")
+    with SimulatedService(latency=0.005, processing_time=0.1, seed=1) as service, new_client(service) as client:
+        results = analyze(cards + [missing], client, max_in_flight=2)
+
+    assert results["missing.png"][0] == "Failed"
+    assert sum(status == "Succeeded" for status, _ in results.values()) == 4
+
+
+def test_an_analysis_still_running_at_its_deadline_is_unfinished(tmp_path):
+    cards = make_cards(tmp_path / "cards", 2)
+    with SimulatedService(latency=0.005, processing_time=30, seed=1) as service, new_client(service) as client:
+        results = analyze(cards, client, max_in_flight=2, deadline=0.5)
+
+    assert [status for status, _ in results.values()] == [UNFINISHED, UNFINISHED]
+    assert all(result_json["id"] for _, result_json in results.values())
+    assert all("did not complete within 0.5 seconds" in result_json["error"] for _, result_json in results.values())
+
+
+def test_unfinished_cards_are_polled_not_resubmitted_when_the_batch_is_resumed(tmp_path, monkeypatch):
+    # The first run loses track of one card; the second runs from another folder, where the
+    # saved results (recorded relative to the first folder) must still be found
+    cards = make_cards(tmp_path / "cards", 6)
+    journal_path = str(tmp_path / "cards.db")
+    for folder in ("first", "second"):
+        os.makedirs(tmp_path / folder)
+    with SimulatedService(latency=0.005, processing_time=0.2, seed=1) as service, new_client(service) as client:
+        monkeypatch.chdir(tmp_path / "first")
+        with JobJournal(journal_path) as journal:
+            read_card.run_batch(cards, "biz-card", FlakyClient(client, "card-2.png"), 3, "results", journal=journal)
+            entries = journal.entries()
+        assert entries[cards[2]].state == SUBMITTED and entries[cards[2]].operation
+        assert all(entries[card].state == SUCCEEDED and os.path.isabs(entries[card].result_path)
+                   for card in cards if card != cards[2])
+
+        monkeypatch.chdir(tmp_path / "second")
+        with JobJournal(journal_path) as journal:
+            done, running, todo = journal.plan(cards)
+            assert (len(done), list(running), todo) == (5, [cards[2]], [])
+            read_card.run_batch(cards, "biz-card", client, 3, "results", journal=journal)
+            assert journal.summary() == {SUCCEEDED: 6}
+
+    assert service.stats[("cu-analyze", 202)] == 6
+
+
+class RecordingCache(ResultCache):
+    """A ResultCache that records which threads hashed the images."""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.threads = []
+
+    def key(self, path, analyzer, api_version, schema_digest=""):
+        self.threads.append(threading.current_thread())
+        return super().key(path, analyzer, api_version, schema_digest)
+
+
+def test_cards_are_hashed_by_the_submitting_workers_and_cached_ones_are_not_submitted(tmp_path):
+    cards = make_cards(tmp_path / "cards", 3)
+    with SimulatedService(latency=0.005, processing_time=0.1, seed=1) as service, new_client(service) as client:
+        cache = RecordingCache(str(tmp_path / "cache"))
+        first = analyze(cards, client, max_in_flight=3, cache=cache)
+        second = analyze(cards, client, max_in_flight=3, cache=cache)
+
+    assert all(status == "Succeeded" for status, _ in list(first.values()) + list(second.values()))
+    # The second run is served from the cache (the copies of one image share an entry), so
+    # only the first run's cards reach the service
+    assert service.stats[("cu-analyze", 202)] == 3
+    assert {result_json["id"] for _, result_json in second.values()} <= {result_json["id"] for _, result_json in first.values()}
+    # No image is hashed on the thread that schedules the submissions
+    assert len(cache.threads) == 6 and threading.main_thread() not in cache.threads
+
+
+def test_rejected_submissions_fail_their_cards(tmp_path):
+    # Every request fails with 500, so each submission is retried and then given up
+    cards = make_cards(tmp_path / "cards", 3)
+    with SimulatedService(latency=0.005, failure_rate=1.0, seed=1) as service, new_client(service) as client:
+        results = analyze(cards, client, max_in_flight=3)
+
+    assert [status for status, _ in results.values()] == ["Failed"] * 3
+
+
+def test_async_submissions_are_not_resent_after_a_server_error(tmp_path):
+    # A 5xx can come after the service has accepted (and billed) a document, so the POST is not sent again
+    pytest.importorskip("aiohttp")
+    from cu_async import ContentUnderstandingSyncClient
+    cards = make_cards(tmp_path / "cards", 1)
+    with SimulatedService(latency=0.005, failure_rate=1.0, seed=1) as service, \
+            ContentUnderstandingSyncClient(service.endpoint, "key", limiter=RateLimiter(rate=200)) as client:
+        with pytest.raises(PollingError, match="500"):
+            client.analyze("biz-card", cards[0])
+
+    assert service.stats[("cu-analyze", 500)] == 1
+
+
+def test_async_analyzer_creation_without_operation_location_fails(monkeypatch):
+    pytest.importorskip("aiohttp")
+    from cu_async import AsyncContentUnderstandingClient
+    client = AsyncContentUnderstandingClient("http://localhost", "key", limiter=RateLimiter(rate=200))
+    responses = iter([(404, {}, {}), (201, {}, {"status": "creating"})])
+
+    async def send(method, url, **kwargs):
+        return next(responses)
+
+    monkeypatch.setattr(client, "_send", send)
+    status, result_json = asyncio.run(client.create_analyzer("biz-card", "{}"))
+
+    assert status == "Failed"
+    assert "No Operation-Location header" in result_json["error"]
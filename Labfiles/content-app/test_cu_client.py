@@ -0,0 +1,109 @@
+import copy
+import importlib.util
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# cu_client uses the shared helpers in Labfiles/common, which the lab scripts add to the path
+CONTENT_APP = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(CONTENT_APP, "..", "common"))
+from cu_client import analyzer_unchanged
+
+
+def load_script(path):
+    # The script's file name isn't a valid module name, so it is imported from its path
+    spec = importlib.util.spec_from_file_location("create_analyzer", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+create_analyzer = load_script(os.path.join(CONTENT_APP, "create-analyzer.py"))
+
+
+with open(os.path.join(CONTENT_APP, "biz-card.json"), "r") as file:
+    SCHEMA = json.load(file)
+
+
+def deployed_copy():
+    # The service returns the definition with its own properties and defaults added
+    deployed = copy.deepcopy(SCHEMA)
+    deployed.update(analyzerId="biz-card", status="ready", createdAt="2025-05-01T00:00:00Z")
+    deployed["config"].update(enableOcr=True, enableLayout=True, estimateFieldSourceAndConfidence=False)
+    deployed["fieldSchema"]["name"] = "biz-card"
+    return deployed
+
+
+def test_service_defaults_are_not_changes():
+    assert analyzer_unchanged(deployed_copy(), json.dumps(SCHEMA))
+
+
+def test_a_changed_config_setting_is_a_change():
+    deployed = deployed_copy()
+    deployed["config"]["returnDetails"] = False
+
+    assert not analyzer_unchanged(deployed, SCHEMA)
+
+
+def test_a_changed_field_description_is_a_change():
+    deployed = deployed_copy()
+    deployed["fieldSchema"]["fields"]["Email"]["description"] = "Email"
+
+    assert not analyzer_unchanged(deployed, SCHEMA)
+
+
+def test_added_or_removed_fields_are_changes():
+    removed = deployed_copy()
+    del removed["fieldSchema"]["fields"]["Email"]
+    added = deployed_copy()
+    added["fieldSchema"]["fields"]["Fax"] = {"type": "string", "method": "extract"}
+
+    assert not analyzer_unchanged(removed, SCHEMA)
+    assert not analyzer_unchanged(added, SCHEMA)
+
+
+def test_a_missing_property_is_a_change():
+    deployed = deployed_copy()
+    del deployed["description"]
+
+    assert not analyzer_unchanged(deployed, SCHEMA)
+
+
+class RecordingClient:
+    """Answers the analyzer GET with a fixed status and records every request made."""
+
+    def __init__(self, get_status):
+        self.get_status = get_status
+        self.calls = []
+
+    def get_analyzer(self, analyzer):
+        self.calls.append("GET")
+        return SimpleNamespace(status_code=self.get_status, text="error text", json=lambda: {})
+
+    def delete_analyzer(self, analyzer):
+        self.calls.append("DELETE")
+        return SimpleNamespace(status_code=204)
+
+    def put_analyzer(self, analyzer, schema):
+        self.calls.append("PUT")
+        return SimpleNamespace(status_code=400, text="stop here", headers={})
+
+
+@pytest.mark.parametrize("status", [401, 403, 500, 503])
+def test_an_analyzer_that_cannot_be_read_is_left_alone(status, capsys):
+    client = RecordingClient(status)
+
+    assert create_analyzer.create_analyzer(json.dumps(SCHEMA), "biz-card", client) == "Failed"
+    assert client.calls == ["GET"]
+    assert "error text" in capsys.readouterr().out
+
+
+def test_a_missing_analyzer_is_created_without_a_delete():
+    client = RecordingClient(404)
+
+    create_analyzer.create_analyzer(json.dumps(SCHEMA), "biz-card", client)
+
+    assert client.calls == ["GET", "PUT"]
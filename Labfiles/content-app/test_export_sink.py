@@ -0,0 +1,129 @@
+import builtins
+import csv
+import os
+import sys
+
+import pytest
+
+# export_sink uses the shared helpers in Labfiles/common, which the lab scripts add to the path
+CONTENT_APP = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(CONTENT_APP, "..", "common"))
+from field_decoder import FieldDecoder
+from export_sink import ColumnarSink
+
+
+FIELD_SCHEMA = {"fields": {
+    "Name": {"type": "string"},
+    "Age": {"type": "integer"},
+    "Score": {"type": "number"},
+    "Active": {"type": "boolean"},
+    "Tags": {"type": "array", "items": {"type": "string"}},
+}}
+
+
+def records(decoder):
+    fields = [
+        {"Name": {"type": "string", "valueString": "Jane", "confidence": 0.9},
+         "Age": {"type": "integer", "valueInteger": 42, "confidence": 0.8},
+         "Score": {"type": "number", "valueNumber": 1.5, "confidence": 0.7},
+         "Active": {"type": "boolean", "valueBoolean": True, "confidence": 0.6},
+         "Tags": {"type": "array", "confidence": 0.5, "valueArray": [{"type": "string", "valueString": "a"},
+                                                                     {"type": "string", "valueString": "b"}]}},
+        {"Name": {"type": "string", "valueString": "Li", "confidence": 0.4}},
+    ]
+    return decoder.decode({"result": {"contents": [{"fields": item} for item in fields]}})
+
+
+def write(path, batch_size=1000):
+    decoder = FieldDecoder(FIELD_SCHEMA)
+    with ColumnarSink(str(path), decoder, batch_size=batch_size) as sink:
+        for index, record in enumerate(records(decoder)):
+            sink.write(f"card-{index}.png", record)
+    return sink
+
+
+EXPECTED_COLUMNS = ["source_file", "Name", "Age", "Score", "Active", "Tags",
+                    "Name_confidence", "Age_confidence", "Score_confidence", "Active_confidence", "Tags_confidence"]
+
+
+def test_csv(tmp_path):
+    sink = write(tmp_path / "cards.csv", batch_size=1)
+
+    with open(tmp_path / "cards.csv", newline="", encoding="utf-8") as file:
+        rows = list(csv.reader(file))
+
+    assert sink.rows_written == 2
+    assert rows[0] == EXPECTED_COLUMNS
+    assert rows[1] == ["card-0.png", "Jane", "42", "1.5", "True", '["a","b"]', "0.9", "0.8", "0.7", "0.6", "0.5"]
+    assert rows[2] == ["card-1.png", "Li", "", "", "", "", "0.4", "", "", "", ""]
+
+
+def test_parquet(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    parquet = pytest.importorskip("pyarrow.parquet")
+
+    write(tmp_path / "cards.parquet", batch_size=1)
+    table = parquet.read_table(tmp_path / "cards.parquet")
+
+    assert table.column_names == EXPECTED_COLUMNS
+    assert table.schema.field("Age").type == pyarrow.int64()
+    assert table.schema.field("Score").type == pyarrow.float64()
+    assert table.schema.field("Active").type == pyarrow.bool_()
+    assert table.schema.field("Tags").type == pyarrow.string()
+    assert table.column("Name").to_pylist() == ["Jane", "Li"]
+    assert table.column("Age").to_pylist() == [42, None]
+    assert table.column("Tags").to_pylist() == ['["a","b"]', None]
+    assert table.column("Name_confidence").to_pylist() == [0.9, 0.4]
+    # One row group per flush
+    assert parquet.ParquetFile(tmp_path / "cards.parquet").num_row_groups == 2
+
+
+def test_arrow(tmp_path):
+    ipc = pytest.importorskip("pyarrow.ipc")
+
+    write(tmp_path / "cards.arrow")
+    with ipc.open_file(tmp_path / "cards.arrow") as reader:
+        table = reader.read_all()
+
+    assert table.column_names == EXPECTED_COLUMNS
+    assert table.column("source_file").to_pylist() == ["card-0.png", "card-1.png"]
+    assert table.column("Active").to_pylist() == [True, None]
+    assert table.column("Score_confidence").to_pylist() == [0.7, None]
+
+
+@pytest.mark.parametrize("name", ["empty.parquet", "empty.arrow"])
+def test_no_rows_still_creates_a_dataset(tmp_path, name):
+    ipc = pytest.importorskip("pyarrow.ipc")
+    parquet = pytest.importorskip("pyarrow.parquet")
+
+    with ColumnarSink(str(tmp_path / name), FieldDecoder(FIELD_SCHEMA)):
+        pass
+
+    if name.endswith(".parquet"):
+        table = parquet.read_table(tmp_path / name)
+    else:
+        with ipc.open_file(tmp_path / name) as reader:
+            table = reader.read_all()
+    assert table.num_rows == 0 and table.column_names == EXPECTED_COLUMNS
+
+
+def test_without_pyarrow(tmp_path, monkeypatch):
+    # Parquet and Arrow explain how to install pyarrow; CSV needs nothing extra
+    real_import = builtins.__import__
+
+    def import_without_pyarrow(name, *args, **kwargs):
+        if name == "pyarrow" or name.startswith("pyarrow."):
+            raise ImportError(f"No module named '{name}'")
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", import_without_pyarrow)
+
+    for name in ("cards.parquet", "cards.feather"):
+        with pytest.raises(ImportError, match="pip install pyarrow"):
+            ColumnarSink(str(tmp_path / name), FieldDecoder(FIELD_SCHEMA))
+    assert write(tmp_path / "cards.csv").rows_written == 2
+
+
+def test_unsupported_extension(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported export format '.xlsx'"):
+        ColumnarSink(str(tmp_path / "cards.xlsx"), FieldDecoder(FIELD_SCHEMA))
@@ -0,0 +1,135 @@
+import json
+import os
+import sys
+
+# field_decoder uses the shared helpers in Labfiles/common, which the lab scripts add to the path
+CONTENT_APP = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(CONTENT_APP, "..", "common"))
+from field_decoder import FieldDecoder, Record, decode_value
+
+
+FIELD_SCHEMA = {"fields": {
+    "Name": {"type": "string"},
+    "Age": {"type": "integer"},
+    "Phones": {"type": "array", "items": {"type": "string"}},
+    "Address": {"type": "object", "properties": {
+        "City": {"type": "string"},
+        "Lines": {"type": "array", "items": {"type": "string"}},
+    }},
+    "Orders": {"type": "array", "items": {"type": "object", "properties": {
+        "Item": {"type": "string"},
+        "Total": {"type": "number"},
+    }}},
+}}
+
+
+def result(*field_sets):
+    # An analyzerResults response with one content item per set of fields
+    return {"status": "Succeeded", "result": {"contents": [{"markdown": "...", "fields": fields} for fields in field_sets]}}
+
+
+FULL_FIELDS = {
+    "Name": {"type": "string", "valueString": "Jane Doe", "confidence": 0.91},
+    "Age": {"type": "integer", "valueInteger": 42, "confidence": 0.8},
+    "Phones": {"type": "array", "confidence": 0.7, "valueArray": [
+        {"type": "string", "valueString": "555-0100"},
+        {"type": "string", "valueString": "555-0101"}]},
+    "Address": {"type": "object", "confidence": 0.6, "valueObject": {
+        "City": {"type": "string", "valueString": "Seattle"},
+        "Lines": {"type": "array", "valueArray": [{"type": "string", "valueString": "1 Main St"}]}}},
+    "Orders": {"type": "array", "confidence": 0.5, "valueArray": [
+        {"type": "object", "valueObject": {"Item": {"type": "string", "valueString": "Pen"},
+                                           "Total": {"type": "number", "valueNumber": 1.5}}}]},
+    "Unexpected": {"type": "string", "valueString": "not in the schema"},
+}
+
+
+def test_nested_objects_and_arrays():
+    decoder = FieldDecoder(FIELD_SCHEMA)
+
+    [record] = decoder.decode(result(FULL_FIELDS))
+
+    assert record.Name == "Jane Doe" and record.Age == 42
+    assert record.Phones == ["555-0100", "555-0101"]
+    assert isinstance(record.Address, Record)
+    assert record.Address.City == "Seattle" and record.Address.Lines == ["1 Main St"]
+    assert record.Orders[0].Item == "Pen" and record.Orders[0].Total == 1.5
+    assert record.as_dict() == {
+        "Name": "Jane Doe", "Age": 42, "Phones": ["555-0100", "555-0101"],
+        "Address": {"City": "Seattle", "Lines": ["1 Main St"]},
+        "Orders": [{"Item": "Pen", "Total": 1.5}],
+    }
+
+
+def test_missing_and_null_fields_decode_to_none():
+    decoder = FieldDecoder(FIELD_SCHEMA)
+    fields = {
+        "Name": None,
+        "Address": {"type": "object", "valueObject": {"City": {"type": "string", "valueString": "Oslo"}}},
+        "Orders": {"type": "array"},
+    }
+
+    [record] = decoder.decode(result(fields))
+
+    assert record.Name is None and record.Age is None and record.Phones is None
+    assert record.Address.City == "Oslo" and record.Address.Lines is None
+    assert record.Orders == []
+
+
+def test_confidence_values_in_schema_order():
+    decoder = FieldDecoder(FIELD_SCHEMA)
+
+    full, partial = decoder.decode(result(FULL_FIELDS, {"Age": {"type": "integer", "valueInteger": 7}}))
+
+    assert full.confidence == (0.91, 0.8, 0.7, 0.6, 0.5)
+    # A missing field, and a field returned without a confidence, both have None
+    assert partial.confidence == (None, None, None, None, None)
+
+
+def test_content_items_without_fields_are_skipped():
+    decoder = FieldDecoder(FIELD_SCHEMA)
+    response = result(FULL_FIELDS)
+    response["result"]["contents"].append({"markdown": "a page without fields"})
+
+    assert len(decoder.decode(response)) == 1
+
+
+def test_field_names_that_are_not_identifiers():
+    decoder = FieldDecoder({"fields": {"Phone Number": {"type": "string"}, "2ndLine": {"type": "string"},
+                                       "class": {"type": "string"}}})
+
+    [record] = decoder.decode(result({"Phone Number": {"type": "string", "valueString": "555"},
+                                      "2ndLine": {"type": "string", "valueString": "Suite 1"},
+                                      "class": {"type": "string", "valueString": "A"}}))
+
+    assert record.Phone_Number == "555" and record.f_2ndLine == "Suite 1" and record.f_class == "A"
+    assert record.as_dict() == {"Phone Number": "555", "2ndLine": "Suite 1", "class": "A"}
+
+
+def test_fields_without_a_type_use_the_type_in_the_result():
+    decoder = FieldDecoder({"fields": {"Anything": {}}})
+
+    [record] = decoder.decode(result({"Anything": {"type": "array", "valueArray": [
+        {"type": "object", "valueObject": {"A": {"type": "number", "valueNumber": 2}}}]}}))
+
+    assert record.Anything == [{"A": 2}]
+    assert decode_value({"type": "boolean", "valueBoolean": False}) is False
+
+
+def test_columns():
+    decoder = FieldDecoder(FIELD_SCHEMA)
+
+    columns = decoder.columns([result(FULL_FIELDS), result({"Name": {"type": "string", "valueString": "Li"}})])
+
+    assert columns["Name"] == ["Jane Doe", "Li"]
+    assert columns["Age"] == [42, None]
+    assert columns["confidence"] == [(0.91, 0.8, 0.7, 0.6, 0.5), (None,) * 5]
+
+
+def test_decode_file_matches_decode(tmp_path):
+    decoder = FieldDecoder(FIELD_SCHEMA)
+    response = result(FULL_FIELDS, {"Name": {"type": "string", "valueString": "Li"}})
+    path = tmp_path / "results.json"
+    path.write_text(json.dumps(response))
+
+    assert list(decoder.decode_file(str(path))) == decoder.decode(response)
@@ -0,0 +1,131 @@
+import email.utils
+import json
+
+import pytest
+
+import polling
+from polling import Backoff, PollingError, PollingTimeout, parse_retry_after, poll_operation
+
+
+class Clock:
+    """Stands in for time.monotonic and time.sleep in polling, so waits take no real time and are recorded."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(polling.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(polling.time, "sleep", clock.sleep)
+    return clock
+
+
+class Response:
+    """The parts of requests.Response that poll_operation reads."""
+
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = json.dumps(body) if body is not None else ""
+        self.content = self.text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def responses(*items):
+    # A get() that returns the given responses in turn and records the URLs it was called with
+    remaining = list(items)
+    calls = []
+
+    def get(url, headers=None):
+        calls.append(url)
+        return remaining.pop(0)
+    get.calls = calls
+    return get
+
+
+def test_backoff_doubles_up_to_its_ceiling_without_jitter():
+    backoff = Backoff(initial=0.25, factor=2.0, max_interval=2.0, jitter=0)
+
+    assert [backoff.next_delay() for _ in range(6)] == [0.25, 0.5, 1.0, 2.0, 2.0, 2.0]
+
+
+def test_backoff_jitter_stays_within_its_bounds(monkeypatch):
+    # Each delay is the interval less up to jitter of it: intervals 1, 2, then the ceiling of 4
+    for _ in range(50):
+        backoff = Backoff(initial=1.0, factor=2.0, max_interval=4.0, jitter=0.5)
+        delays = [backoff.next_delay() for _ in range(5)]
+        assert 0.5 <= delays[0] <= 1.0 and 1.0 <= delays[1] <= 2.0
+        assert all(2.0 <= delay <= 4.0 for delay in delays[2:])
+
+    monkeypatch.setattr(polling.random, "random", lambda: 0.0)
+    assert Backoff(initial=1.0, jitter=0.5).next_delay() == 1.0
+    monkeypatch.setattr(polling.random, "random", lambda: 1.0)
+    assert Backoff(initial=1.0, jitter=0.5).next_delay() == 0.5
+
+
+def test_retry_after_takes_precedence_over_the_schedule():
+    backoff = Backoff(initial=0.25, jitter=0)
+
+    assert backoff.next_delay(Response(429, headers={"Retry-After": "3"})) == 3.0
+    # The attempt still counts, so the schedule carries on where it was
+    assert backoff.next_delay() == 0.5
+
+
+@pytest.mark.parametrize("value, expected", [("2", 2.0), ("0.5", 0.5), ("-4", 0.0), ("soon", None), ("", None)])
+def test_retry_after_in_seconds(value, expected):
+    assert parse_retry_after({"Retry-After": value}) == expected
+
+
+def test_retry_after_as_an_http_date(monkeypatch):
+    monkeypatch.setattr(polling.time, "time", lambda: 1_700_000_000.0)
+    in_ten_seconds = email.utils.formatdate(1_700_000_010, usegmt=True)
+    in_the_past = email.utils.formatdate(1_699_999_000, usegmt=True)
+
+    assert parse_retry_after({"Retry-After": in_ten_seconds}) == pytest.approx(10.0)
+    assert parse_retry_after({"Retry-After": in_the_past}) == 0.0
+    assert parse_retry_after({}) is None and parse_retry_after(None) is None
+
+
+def test_throttled_and_transient_polls_are_retried(clock):
+    get = responses(Response(429, headers={"Retry-After": "2"}), Response(503), Response(200, {"status": "Running"}),
+                    Response(200, {"status": "Succeeded", "result": {}}))
+    initial = Response(202, headers={"Operation-Location": "https://example.com/operations/1"})
+
+    status, result_json, polls = poll_operation("https://example.com/fallback", None, initial_response=initial,
+                                                backoff=Backoff(initial=0.25, jitter=0), get=get)
+
+    assert (status, result_json["status"], polls) == ("Succeeded", "Succeeded", 4)
+    assert get.calls == ["https://example.com/operations/1"] * 4
+    # The wait after the 429 is its Retry-After; the others follow the schedule
+    assert clock.sleeps == [0.25, 2.0, 1.0, 2.0]
+
+
+def test_a_non_retryable_poll_raises_polling_error(clock):
+    get = responses(Response(404, {"error": {"code": "NotFound"}}))
+
+    with pytest.raises(PollingError, match="404") as error:
+        poll_operation("https://example.com/operations/1", None, get=get)
+    assert not isinstance(error.value, PollingTimeout)
+
+
+def test_the_deadline_raises_polling_timeout(clock):
+    get = responses(*[Response(200, {"status": "Running"})] * 100)
+
+    with pytest.raises(PollingTimeout, match="within 5s"):
+        poll_operation("https://example.com/operations/1", None, deadline=5, backoff=Backoff(initial=1, jitter=0), get=get)
+
+    # No wait goes past the deadline
+    assert sum(clock.sleeps) == pytest.approx(5.0)
+    assert isinstance(PollingTimeout("x"), PollingError)
@@ -0,0 +1,188 @@
+import threading
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import BULK, INTERACTIVE, RateLimiter, get_rate_limiter, reset_rate_limiters
+
+
+class Clock:
+    """Stands in for time.monotonic in rate_limiter, so tokens and windows only advance when a test says so."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def advance(limiter, clock, seconds):
+    # Moves the clock on and wakes the waiting requests, which would otherwise sleep for real time
+    clock.now += seconds
+    with limiter._condition:
+        limiter._condition.notify_all()
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_interactive_requests_are_served_before_queued_bulk_requests(clock):
+    limiter = RateLimiter(rate=1, burst=1, max_rate=1)
+    limiter.acquire()   # the only token
+    served = []
+
+    def request(name, priority):
+        limiter.acquire(priority)
+        served.append(name)
+
+    threads = [threading.Thread(target=request, args=("bulk-1", BULK)),
+               threading.Thread(target=request, args=("bulk-2", BULK)),
+               threading.Thread(target=request, args=("interactive", INTERACTIVE))]
+    for thread in threads:
+        # Each request starts waiting before the next one arrives
+        thread.start()
+        wait_until(lambda thread=thread: len(limiter._waiting) == threads.index(thread) + 1)
+
+    # One token a second: the interactive request arrived last but goes first, then the bulk ones in order
+    for count in range(1, 4):
+        advance(limiter, clock, 1.0)
+        wait_until(lambda count=count: len(served) == count)
+    for thread in threads:
+        thread.join()
+
+    assert served == ["interactive", "bulk-1", "bulk-2"]
+
+
+def test_a_burst_of_throttles_in_one_window_halves_the_rate_once(clock):
+    limiter = RateLimiter(rate=16, window=1.0)
+
+    for _ in range(20):
+        clock.now += 0.04
+        assert limiter.on_throttled(retry_after=2) == 2
+    assert limiter.rate == 16   # the window isn't over yet
+
+    # The first response after the window ends lowers the rate, once for the whole window
+    clock.now += 0.3
+    limiter.on_throttled()
+    for _ in range(9):
+        clock.now += 0.1
+        limiter.on_throttled()
+
+    assert limiter.rate == 8
+    assert limiter.decreases == 1
+    assert limiter.throttled == 30
+
+    # The next window of throttling halves it again
+    clock.now += 0.2
+    limiter.on_throttled()
+    assert limiter.rate == 4
+    assert limiter.decreases == 2
+
+
+def test_a_few_throttles_among_accepted_requests_keep_the_rate(clock):
+    limiter = RateLimiter(rate=10, max_rate=10, window=1.0, tolerance=0.2)
+
+    for _ in range(9):
+        clock.now += 0.1
+        limiter.on_success()
+    limiter.on_throttled()
+    clock.now += 0.5
+    limiter.on_success()
+
+    assert limiter.rate == 10
+    assert limiter.decreases == 0
+
+
+def test_the_rate_never_goes_below_min_rate(clock):
+    limiter = RateLimiter(rate=1, min_rate=0.75, window=1.0)
+
+    for _ in range(5):
+        limiter.on_throttled()
+        clock.now += 1.0
+    limiter.on_throttled()
+
+    assert limiter.rate == 0.75
+
+
+def test_slow_start_then_additive_increase(clock):
+    limiter = RateLimiter(rate=2, increase=0.5, window=1.0)
+
+    # Until the service first pushes back, each accepted request adds one request per second
+    for _ in range(6):
+        limiter.on_success()
+    assert limiter.rate == 8
+
+    # A window of mostly throttled responses ends slow start by halving the rate
+    clock.now += 1.0
+    limiter.on_success()
+    for _ in range(3):
+        limiter.on_throttled()
+    clock.now += 1.0
+    limiter.on_throttled()
+    assert limiter.rate == 4.5
+
+    # After that, a second's worth of accepted requests (about rate of them) adds about increase in total
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(5.0, abs=0.05)
+    assert limiter.decreases == 1
+
+
+def test_max_rate_caps_the_rate(clock):
+    limiter = RateLimiter(rate=10, max_rate=4)
+    assert limiter.rate == 4
+
+    for _ in range(100):
+        limiter.on_success()
+
+    assert limiter.rate == 4
+
+
+def test_rate_limit_caps_the_shared_limiter(clock, monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT", "3")
+    reset_rate_limiters()
+
+    limiter = get_rate_limiter("https://rate-limit-test.example.com/", "key")
+    for _ in range(50):
+        limiter.on_success()
+
+    assert (limiter.rate, limiter.max_rate) == (3.0, 3.0)
+    # Clients of the same endpoint and key share the limiter, whatever the endpoint's case or trailing slash
+    assert get_rate_limiter("https://RATE-LIMIT-TEST.example.com", "key") is limiter
+    assert get_rate_limiter("https://rate-limit-test.example.com/", "other key") is not limiter
+
+
+def test_reset_starts_the_shared_limiters_afresh(clock):
+    # Slow start has raised the shared limiter's rate; after a reset the next client starts from the initial rate
+    limiter = get_rate_limiter("https://reset-test.example.com/", "key")
+    for _ in range(5):
+        limiter.on_success()
+
+    reset_rate_limiters()
+    fresh = get_rate_limiter("https://reset-test.example.com/", "key")
+
+    assert fresh is not limiter
+    assert fresh.rate == 10.0 and limiter.rate == 15.0
+    assert get_rate_limiter("https://reset-test.example.com/", "key") is fresh
+
+
+def test_tokens_refill_at_the_rate(clock):
+    limiter = RateLimiter(rate=2, burst=2, max_rate=2)
+    limiter.acquire()
+    limiter.acquire()
+
+    assert limiter._take(limiter._enter(INTERACTIVE)) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter._take(limiter._queue[0]) == 0.0
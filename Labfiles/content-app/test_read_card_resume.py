@@ -0,0 +1,77 @@
+import hashlib
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+# The tests run read-card.py against the simulated service from the benchmark suite
+CONTENT_APP = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(CONTENT_APP, "..", "benchmark"))
+from simulated_service import SimulatedService
+
+
+def make_cards(folder, count):
+    # Each card differs by a trailing byte, so each has its own cache key (and upload digest)
+    os.makedirs(folder)
+    with open(os.path.join(CONTENT_APP, "biz-card-1.png"), "rb") as file:
+        image = file.read()
+    digests = []
+    for index in range(count):
+        with open(os.path.join(folder, f"c{index}.png"), "wb") as file:
+            file.write(image + bytes([index]))
+        digests.append(hashlib.sha256(image + bytes([index])).hexdigest())
+    return digests
+
+
+def journaled_count(journal_path, state):
+    try:
+        with sqlite3.connect(journal_path) as connection:
+            return connection.execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (state,)).fetchone()[0]
+    except sqlite3.Error:
+        return 0
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_killed_batch_resumes_with_cache(tmp_path, engine):
+    if engine == "async":
+        pytest.importorskip("aiohttp")
+    digests = make_cards(tmp_path / "cards", 12)
+    journal_path = str(tmp_path / "cards.db")
+
+    with SimulatedService(processing_time=1.5, seed=1) as service:
+        env = dict(os.environ, ENDPOINT=service.endpoint, KEY="key", ANALYZER_NAME="biz-card")
+        command = [sys.executable, os.path.join(CONTENT_APP, "read-card.py"), "cards", "--journal", journal_path,
+                   "--schema", os.path.join(CONTENT_APP, "biz-card.json"), "--max-in-flight", "4", "--engine", engine]
+
+        # Kill the batch once some cards are submitted but before they all finish
+        process = subprocess.Popen(command, cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 20
+        while journaled_count(journal_path, "submitted") == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        # A card the service accepted is only resubmitted if the kill lands before its journal entry is written,
+        # so new uploads are refused (throttled) and the kill waits until every accepted one is journaled
+        service.refuse_uploads = True
+        while (journaled_count(journal_path, "submitted") + journaled_count(journal_path, "succeeded")
+               < sum(service.uploads.values()) and time.monotonic() < deadline):
+            time.sleep(0.05)
+        process.send_signal(signal.SIGKILL)
+        process.wait()
+        # Uploads that were under way when the batch was killed are still refused
+        while service.in_flight and time.monotonic() < deadline:
+            time.sleep(0.05)
+        service.refuse_uploads = False
+        assert journaled_count(journal_path, "submitted") > 0
+        assert 0 < sum(service.uploads.values()) < 12
+
+        # The resumed batch (with the result cache on) polls the running cards and finishes every card
+        resumed = subprocess.run(command, cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+        assert "12/12 analyses succeeded" in resumed.stdout, resumed.stdout
+        assert journaled_count(journal_path, "succeeded") == 12
+        # Every card was analyzed exactly once across both runs: the resumed batch polled the cards
+        # the killed one had submitted rather than submitting them again
+        assert {digest: service.uploads[digest] for digest in digests} == {digest: 1 for digest in digests}
+        assert sum(service.uploads.values()) == 12
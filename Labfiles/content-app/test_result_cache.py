@@ -0,0 +1,114 @@
+import json
+import os
+
+import result_cache
+from result_cache import ResultCache
+
+
+class Clock:
+    """Stands in for time.time in result_cache, so entries can be aged without waiting."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(tmp_path, monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "time", clock)
+    return ResultCache(str(tmp_path / "cache"), **kwargs), clock
+
+
+def test_a_stored_result_is_returned(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch)
+    cache.put("ab12", {"status": "Succeeded", "result": {"contents": []}})
+
+    assert cache.get("ab12") == {"status": "Succeeded", "result": {"contents": []}}
+    assert cache.get("cd34") is None
+
+
+def test_an_entry_read_often_still_expires(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, max_age=100)
+    cache.put("ab12", {"status": "Succeeded"})
+
+    # Every read touches the entry for LRU order, but its age is counted from when it was stored
+    for _ in range(5):
+        clock.now += 30
+        result = cache.get("ab12")
+    assert result is None
+    assert not os.path.exists(cache._path("ab12"))
+
+
+def test_an_entry_is_returned_until_max_age(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, max_age=100)
+    cache.put("ab12", {"status": "Succeeded"})
+
+    clock.now += 100
+    assert cache.get("ab12") == {"status": "Succeeded"}
+    clock.now += 1
+    assert cache.get("ab12") is None
+
+
+def test_storing_an_entry_again_restarts_its_age(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, max_age=100)
+    cache.put("ab12", {"status": "Succeeded", "run": 1})
+    clock.now += 90
+    cache.put("ab12", {"status": "Succeeded", "run": 2})
+    clock.now += 90
+
+    assert cache.get("ab12") == {"status": "Succeeded", "run": 2}
+
+
+def test_an_entry_without_a_storage_time_is_a_miss(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch)
+    os.makedirs(os.path.dirname(cache._path("ab12")))
+    with open(cache._path("ab12"), "w") as file:
+        json.dump({"status": "Succeeded", "result": {}}, file)
+
+    assert cache.get("ab12") is None
+
+
+def test_the_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch)
+    for index, key in enumerate(["aa01", "bb02", "cc03"]):
+        cache.put(key, {"value": "x" * 1000})
+        os.utime(cache._path(key), (index, index))
+    # Reading the oldest entry makes it the most recently used
+    cache.get("aa01")
+
+    cache.max_bytes = 2 * os.path.getsize(cache._path("aa01"))
+    cache.evict()
+
+    assert cache.get("aa01") is not None
+    assert cache.get("bb02") is None
+    assert cache.get("cc03") is not None
+
+
+def test_overwriting_an_entry_does_not_grow_the_size_total(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch)
+    cache.put("ab12", {"value": "x" * 100})
+    size = cache._size
+    cache.put("ab12", {"value": "y" * 100})
+
+    assert cache._size == size
+
+
+def test_an_expired_entry_removed_by_another_process_is_skipped(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch, max_age=100)
+    for key in ("aa01", "bb02"):
+        cache.put(key, {"value": "x" * 100})
+    os.utime(cache._path("aa01"), (0, 0))
+    remove = os.remove
+
+    def remove_raced(path):
+        # Another process evicting the cache removes the file first
+        remove(path)
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(result_cache.os, "remove", remove_raced)
+
+    cache.evict()
+
+    assert not os.path.exists(cache._path("aa01"))
+    assert cache._size == os.path.getsize(cache._path("bb02"))
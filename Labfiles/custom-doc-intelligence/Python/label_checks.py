@@ -0,0 +1,185 @@
+import json
+import os
+import re
+import time
+from ocr_index import load_ocr_index, match_labels
+from json_stream import iter_items
+
+
+# Patterns for the fieldType/fieldFormat combinations used by the labeling tool
+# A label's text must match the pattern of its field; "not-specified" accepts the common forms
+NUMBER = r"[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?"
+FORMATS = {
+    ("number", "not-specified"): rf"[$€£]?{NUMBER}%?",
+    ("number", "currency"): rf"[-+]?[$€£]?{NUMBER}",
+    ("number", "decimal"): r"[-+]?\d+(?:\.\d+)?",
+    ("number", "decimal-commas"): r"[-+]?\d+(?:,\d+)?",
+    ("integer", "not-specified"): r"[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)",
+    ("date", "not-specified"): r"\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}|\w+\.? \d{1,2},? \d{4}|\d{1,2} \w+\.? \d{4}",
+    ("date", "dmy"): r"(?:0?[1-9]|[12]\d|3[01])[/.-](?:0?[1-9]|1[0-2])[/.-]\d{2,4}",
+    ("date", "mdy"): r"(?:0?[1-9]|1[0-2])[/.-](?:0?[1-9]|[12]\d|3[01])[/.-]\d{2,4}",
+    ("date", "ymd"): r"\d{2,4}[/.-](?:0?[1-9]|1[0-2])[/.-](?:0?[1-9]|[12]\d|3[01])",
+    ("time", "not-specified"): r"\d{1,2}:\d{2}(?::\d{2})?(?: ?[AaPp]\.?[Mm]\.?)?",
+    ("selectionMark", "not-specified"): r"selected|unselected",
+    ("string", "no-whitespaces"): r"\S+",
+    ("string", "alphanumeric"): r"[A-Za-z0-9]+",
+}
+PATTERNS = {key: re.compile(pattern) for key, pattern in FORMATS.items()}
+
+# Problems that are reported without failing the check: a form need not label every
+# field, and the OCR comparisons can't tell a misread from a wrong label
+# Every other problem (malformed JSON, unknown or mistyped labels, boxes outside the
+# page, pages or OCR results that don't exist) would break training, so it is an error
+WARNINGS = {"missing label", "no OCR words", "text mismatch"}
+
+
+def load_field_schema(fields_path):
+    """
+    Reads the field definitions of a training set.
+
+    Args:
+        fields_path (str): Path to a fields.json file
+
+    Returns:
+        dict: fieldKey -> (fieldType, fieldFormat)
+    """
+
+    with open(fields_path, "r", encoding="utf-8") as file:
+        fields = json.load(file).get("fields", [])
+    return {field["fieldKey"]: (field.get("fieldType", "string"), field.get("fieldFormat", "not-specified"))
+            for field in fields}
+
+
+def check_value(text, field_type, field_format="not-specified"):
+    """
+    Checks that a labeled value can be read as its field's type and format.
+
+    Args:
+        text (str): The labeled text
+        field_type (str): fieldType from fields.json (string, number, date, ...)
+        field_format (str): fieldFormat from fields.json
+
+    Returns:
+        bool: True if the text matches (types and formats without a pattern always match)
+    """
+
+    pattern = PATTERNS.get((field_type, field_format)) or PATTERNS.get((field_type, "not-specified"))
+    return pattern is None or pattern.fullmatch(text.strip()) is not None
+
+
+def severity(issue):
+    """Returns "warning" or "error" for an issue reported by check_labels or check_form (see WARNINGS)."""
+    return "warning" if issue["problem"] in WARNINGS else "error"
+
+
+def valid_box(box):
+    """Returns True if a label bounding box has 8 coordinates, all within the 0-1 normalized page."""
+    return (isinstance(box, list) and len(box) == 8
+            and all(isinstance(value, (int, float)) and 0 <= value <= 1 for value in box))
+
+
+def check_labels(labels, schema):
+    """
+    Checks a form's labels against the training set's field definitions.
+
+    Args:
+        labels (dict): The contents of a .labels.json file
+        schema (dict): fieldKey -> (fieldType, fieldFormat), as returned by load_field_schema
+
+    Returns:
+        list: One issue dict per problem, with "label", "page", "expected", "found" and
+        "problem" ("missing label", "unknown label", "type mismatch" or "box out of range")
+    """
+
+    issues = []
+    labeled = set()
+    for label in labels.get("labels", ()):
+        name = label.get("label")
+        values = label.get("value") or []
+        labeled.add(name)
+        if name not in schema:
+            issues.append({"label": name, "page": None, "expected": None, "found": name,
+                           "problem": "unknown label"})
+            continue
+
+        field_type, field_format = schema[name]
+        text = " ".join(value.get("text", "") for value in values)
+        if values and not check_value(text, field_type, field_format):
+            issues.append({"label": name, "page": values[0].get("page"), "expected": f"{field_type} ({field_format})",
+                           "found": text, "problem": "type mismatch"})
+
+        for value in values:
+            for box in value.get("boundingBoxes", ()):
+                if not valid_box(box):
+                    issues.append({"label": name, "page": value.get("page"), "expected": "0-1 coordinates",
+                                   "found": box, "problem": "box out of range"})
+
+    for name in schema:
+        if name not in labeled:
+            issues.append({"label": name, "page": None, "expected": name, "found": None,
+                           "problem": "missing label"})
+    return issues
+
+
+def check_form(labels_path, schema, check_text=True):
+    """
+    Runs every check on one labeled form. Used as the unit of work of the parallel checker,
+    so it only takes and returns picklable values.
+
+    Args:
+        labels_path (str): Path to a Form_N.jpg.labels.json file
+        schema (dict): fieldKey -> (fieldType, fieldFormat)
+        check_text (bool): Whether to compare each label with the OCR words under its boxes
+
+    Returns:
+        tuple: (document name, number of labels, list of issues, seconds taken)
+    """
+
+    start = time.perf_counter()
+    document = os.path.basename(labels_path)[:-len(".labels.json")]
+    # A form whose labels can't be read is reported like any other issue, so the other forms are still checked
+    try:
+        with open(labels_path, "r", encoding="utf-8") as file:
+            labels = json.load(file)
+    except ValueError as ex:
+        issue = {"label": None, "page": None, "expected": "valid JSON", "found": str(ex), "problem": "malformed JSON"}
+        return document, 0, [issue], time.perf_counter() - start
+    issues = check_labels(labels, schema)
+
+    ocr_path = labels_path[:-len(".labels.json")] + ".ocr.json"
+    if not os.path.exists(ocr_path):
+        issues.append({"label": None, "page": None, "expected": os.path.basename(ocr_path), "found": None,
+                       "problem": "missing OCR results"})
+    else:
+        try:
+            issues.extend(_check_ocr(labels, ocr_path, check_text))
+        except ValueError as ex:
+            issues.append({"label": None, "page": None, "expected": "valid JSON", "found": f"{os.path.basename(ocr_path)}: {ex}",
+                           "problem": "malformed JSON"})
+
+    return document, len(labels.get("labels", ())), issues, time.perf_counter() - start
+
+
+def _check_ocr(labels, ocr_path, check_text):
+    # Checks a form's labels against its OCR results, returning the issues
+    if check_text:
+        # Labels on pages beyond the OCR page count are reported as "missing page";
+        # boxes already reported as out of range are left out of the text comparison
+        return match_labels(_with_valid_boxes(labels), load_ocr_index(ocr_path))
+
+    # Only read the OCR page numbers, without building word indexes
+    issues = []
+    pages = set(iter_items(ocr_path, "analyzeResult.readResults.item.page"))
+    for label in labels.get("labels", ()):
+        for value in label.get("value") or ():
+            if value.get("page", 1) not in pages:
+                issues.append({"label": label.get("label"), "page": value.get("page", 1),
+                               "expected": value.get("text", ""), "found": None, "problem": "missing page"})
+    return issues
+
+
+def _with_valid_boxes(labels):
+    # Returns a copy of a form's labels without the values that have an invalid box
+    return {"labels": [dict(label, value=[value for value in label.get("value") or ()
+                                          if all(valid_box(box) for box in value.get("boundingBoxes", ()))])
+                       for label in labels.get("labels", ())]}
@@ -0,0 +1,339 @@
+import glob
+import json
+import math
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ocr_index import normalize_text
+from instrumentation import get_recorder
+
+
+def load_ground_truth(labels_path):
+    """
+    Reads the labeled value of every field of one form.
+
+    A label's value is a list of OCR words (e.g. "Hero", "Limited"); they are
+    joined in order into the text the model is expected to return.
+
+    Args:
+        labels_path (str): Path to a Form_N.jpg.labels.json file
+
+    Returns:
+        dict: fieldKey -> labeled text
+    """
+
+    with open(labels_path, "r", encoding="utf-8") as file:
+        labels = json.load(file)
+    truth = {}
+    for label in labels.get("labels", ()):
+        text = " ".join(value.get("text", "") for value in label.get("value") or ())
+        if text.strip():
+            truth[label["label"]] = text
+    return truth
+
+
+def find_labeled_forms(folder):
+    """
+    Lists the labeled forms of a folder.
+
+    Args:
+        folder (str): Folder containing the forms and their *.labels.json files
+
+    Returns:
+        list: (form path, labels path) for every form that has both files, in name order
+    """
+
+    forms = []
+    for labels_path in sorted(glob.glob(os.path.join(folder, "*.labels.json"))):
+        form_path = labels_path[:-len(".labels.json")]
+        if os.path.exists(form_path):
+            forms.append((form_path, labels_path))
+    return forms
+
+
+def same_text(expected, predicted):
+    """Compares a labeled value with a predicted one, ignoring whitespace and case."""
+    return normalize_text(expected).casefold() == normalize_text(predicted).casefold()
+
+
+def predicted_fields(result):
+    """
+    Reads the fields predicted for a form.
+
+    The text the model read (content) is compared with the labels, since labels
+    are OCR text too; the typed value is only used when there is no content.
+    Fields the model returned without a value are treated as not predicted.
+
+    Args:
+        result (AnalyzeResult): The analysis of one form
+
+    Returns:
+        dict: fieldKey -> (predicted text, confidence)
+    """
+
+    fields = {}
+    for document in result.documents:
+        for name, field in document.fields.items():
+            text = field.content if field.content is not None else field.value
+            if text is None or str(text).strip() == "" or name in fields:
+                continue
+            fields[name] = (str(text), field.confidence)
+    return fields
+
+
+def evaluate_form(client, model_id, form_path, labels_path):
+    """
+    Analyzes one labeled form and compares the prediction with its labels.
+
+    Args:
+        client (DocumentAnalysisClient): Client for the Azure Document Intelligence service
+        model_id (str): The custom model to evaluate
+        form_path (str): Path of the form
+        labels_path (str): Path of the form's .labels.json file
+
+    Returns:
+        dict: The form's name, labeled and predicted fields, and latency in seconds
+    """
+
+    truth = load_ground_truth(labels_path)
+
+    # The analysis is timed and recorded to METRICS_LOG / METRICS_FILE, if they are set
+    with get_recorder("test-model").operation("evaluate", form_path) as operation:
+        with open(form_path, "rb") as file:
+            poller = client.begin_analyze_document(model_id, file)
+        operation.mark_accepted()
+        result = poller.result()
+        operation.mark_completed()
+        with operation.time("decode_seconds"):
+            predicted = predicted_fields(result)
+        operation.add("documents", len(result.documents))
+
+    return {"form": os.path.basename(form_path), "truth": truth, "predicted": predicted,
+            "seconds": operation.metrics["total_seconds"]}
+
+
+def evaluate_forms(client, model_id, forms, max_in_flight=8):
+    """
+    Analyzes many labeled forms concurrently.
+
+    This function:
+    - Keeps up to max_in_flight analyses running at once
+    - Yields each form's comparison as soon as its analysis completes
+    - Reports failures as results with an "error" entry instead of stopping the evaluation
+
+    Args:
+        client (DocumentAnalysisClient): Client for the Azure Document Intelligence service
+        model_id (str): The custom model to evaluate
+        forms (list): (form path, labels path) pairs, as returned by find_labeled_forms
+        max_in_flight (int): Maximum number of forms analyzed at the same time
+
+    Yields:
+        dict: A result returned by evaluate_form
+    """
+
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        futures = {executor.submit(evaluate_form, client, model_id, form_path, labels_path): form_path
+                   for form_path, labels_path in forms}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as ex:
+                yield {"form": os.path.basename(futures[future]), "error": str(ex)}
+
+
+class Evaluation:
+    """
+    Accuracy and speed of a model over a set of labeled forms.
+
+    For every field of every form:
+
+    - A prediction that matches the label is a true positive
+    - A prediction for a field that isn't labeled, or that doesn't match the label, is a false positive
+    - A labeled field that wasn't predicted, or was predicted wrongly, is a false negative
+
+    So a wrong value counts against both precision and recall. Every prediction
+    also goes into a confidence bin, to compare the confidence the model reports
+    with how often it is actually right (calibration).
+    """
+
+    def __init__(self, fields=None, bins=10):
+        """
+        Args:
+            fields (list): Fields to report on (default: every field seen in the labels or predictions)
+            bins (int): Number of equal-width confidence bins
+        """
+
+        self.fields = list(fields) if fields else None
+        self.bins = bins
+        self.counts = {}   # fieldKey -> {"tp": ..., "fp": ..., "fn": ...}
+        self.calibration = [{"count": 0, "confidence": 0.0, "correct": 0} for _ in range(bins)]
+        self.latencies = []
+        self.forms = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add(self, result):
+        """
+        Adds one form's result (from evaluate_forms).
+
+        Args:
+            result (dict): The form's labeled and predicted fields, or an error
+        """
+
+        self.elapsed = time.perf_counter() - self.started
+        if "error" in result:
+            self.errors.append((result["form"], result["error"]))
+            return
+        self.forms += 1
+        self.latencies.append(result["seconds"])
+
+        truth, predicted = result["truth"], result["predicted"]
+        names = self.fields or sorted(set(truth) | set(predicted))
+        for name in names:
+            counts = self.counts.setdefault(name, {"tp": 0, "fp": 0, "fn": 0})
+            expected = truth.get(name)
+            prediction = predicted.get(name)
+            correct = expected is not None and prediction is not None and same_text(expected, prediction[0])
+            if correct:
+                counts["tp"] += 1
+            else:
+                if prediction is not None:
+                    counts["fp"] += 1
+                if expected is not None:
+                    counts["fn"] += 1
+            if prediction is not None and prediction[1] is not None:
+                confidence = min(max(prediction[1], 0.0), 1.0)
+                calibration = self.calibration[min(int(confidence * self.bins), self.bins - 1)]
+                calibration["count"] += 1
+                calibration["confidence"] += confidence
+                calibration["correct"] += correct
+
+    def field_report(self):
+        """
+        Returns:
+            list: A dict per field with its counts, precision and recall (None when undefined)
+        """
+
+        report = []
+        for name in self.fields or sorted(self.counts):
+            counts = self.counts.get(name, {"tp": 0, "fp": 0, "fn": 0})
+            report.append(dict(counts, field=name,
+                               precision=_ratio(counts["tp"], counts["tp"] + counts["fp"]),
+                               recall=_ratio(counts["tp"], counts["tp"] + counts["fn"])))
+        return report
+
+    def calibration_report(self):
+        """
+        Returns:
+            tuple: (a dict per non-empty bin with its mean confidence and accuracy,
+            expected calibration error: the count-weighted mean gap between the two)
+        """
+
+        total = sum(calibration["count"] for calibration in self.calibration)
+        report, error = [], 0.0
+        for index, calibration in enumerate(self.calibration):
+            if not calibration["count"]:
+                continue
+            confidence = calibration["confidence"] / calibration["count"]
+            accuracy = calibration["correct"] / calibration["count"]
+            error += calibration["count"] / total * abs(accuracy - confidence)
+            report.append({"low": index / self.bins, "high": (index + 1) / self.bins, "count": calibration["count"],
+                           "confidence": confidence, "accuracy": accuracy})
+        return report, (error if total else None)
+
+    def summary(self):
+        """
+        Returns:
+            dict: Micro-averaged precision and recall, calibration error, documents per second and latency percentiles
+        """
+
+        tp = sum(counts["tp"] for counts in self.counts.values())
+        fp = sum(counts["fp"] for counts in self.counts.values())
+        fn = sum(counts["fn"] for counts in self.counts.values())
+        latencies = sorted(self.latencies)
+        return {
+            "forms": self.forms,
+            "errors": len(self.errors),
+            "precision": _ratio(tp, tp + fp),
+            "recall": _ratio(tp, tp + fn),
+            "calibration_error": self.calibration_report()[1],
+            "seconds": self.elapsed,
+            "docs_per_second": self.forms / self.elapsed if self.elapsed else None,
+            "p50_seconds": statistics.median(latencies) if latencies else None,
+            "p99_seconds": latencies[min(len(latencies) - 1, math.ceil(len(latencies) * 0.99) - 1)] if latencies else None,
+        }
+
+    def report(self):
+        """
+        Returns:
+            dict: The summary, per-field results, calibration bins and errors, ready to save as JSON
+        """
+
+        return {"summary": self.summary(), "fields": self.field_report(), "calibration": self.calibration_report()[0],
+                "errors": [{"form": form, "error": error} for form, error in self.errors]}
+
+
+def check_gates(summary, min_precision=None, min_recall=None, min_docs_per_second=None, max_p99_seconds=None):
+    """
+    Checks an evaluation's summary against the thresholds a model must meet to be rolled out.
+
+    Args:
+        summary (dict): Returned by Evaluation.summary
+        min_precision (float): Lowest acceptable precision, or None
+        min_recall (float): Lowest acceptable recall, or None
+        min_docs_per_second (float): Lowest acceptable throughput, or None
+        max_p99_seconds (float): Highest acceptable 99th percentile latency, or None
+
+    Returns:
+        list: A message for every threshold that wasn't met (empty if the model passes)
+    """
+
+    failures = []
+    if summary["errors"]:
+        failures.append(f"{summary['errors']} forms could not be analyzed")
+    for name, limit, lowest in (("precision", min_precision, True), ("recall", min_recall, True),
+                                ("docs_per_second", min_docs_per_second, True), ("p99_seconds", max_p99_seconds, False)):
+        if limit is None:
+            continue
+        value = summary[name]
+        if value is None or (value < limit if lowest else value > limit):
+            failures.append(f"{name} {_format(value)} is {'below' if lowest else 'above'} {limit}")
+    return failures
+
+
+def print_report(evaluation):
+    """
+    Displays an evaluation: per-field accuracy, calibration, then the overall quality and speed.
+
+    Args:
+        evaluation (Evaluation): The finished evaluation
+    """
+
+    print(f"\n{'Field':24} {'TP':>5} {'FP':>5} {'FN':>5} {'Precision':>10} {'Recall':>8}")
+    for field in evaluation.field_report():
+        print(f"{field['field']:24} {field['tp']:5} {field['fp']:5} {field['fn']:5} "
+              f"{_format(field['precision']):>10} {_format(field['recall']):>8}")
+
+    calibration, calibration_error = evaluation.calibration_report()
+    print(f"\n{'Confidence':12} {'Fields':>7} {'Mean confidence':>16} {'Accuracy':>9}")
+    for calibration_bin in calibration:
+        print(f"{calibration_bin['low']:.2f}-{calibration_bin['high']:.2f}    {calibration_bin['count']:7} "
+              f"{calibration_bin['confidence']:16.3f} {calibration_bin['accuracy']:9.3f}")
+    print(f"Expected calibration error {_format(calibration_error)}")
+
+    # Forms that failed were reported as they completed; the summary only counts them
+    summary = evaluation.summary()
+    print(f"\n{summary['forms']} forms ({summary['errors']} failed) in {summary['seconds']:.2f}s: "
+          f"{_format(summary['docs_per_second'], '.2f')} docs/s, latency p50 {_format(summary['p50_seconds'])}s "
+          f"p99 {_format(summary['p99_seconds'])}s")
+    print(f"Precision {_format(summary['precision'])}, recall {_format(summary['recall'])}")
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else None
+
+
+def _format(value, spec=".3f"):
+    return "-" if value is None else format(value, spec)
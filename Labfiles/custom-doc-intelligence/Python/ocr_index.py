@@ -0,0 +1,200 @@
+import json
+from json_stream import iter_items
+
+
+def bounding_rect(box, width=1.0, height=1.0):
+    """
+    Converts an 8-point bounding box into an axis-aligned rectangle.
+
+    Args:
+        box (list): [x1, y1, x2, y2, x3, y3, x4, y4] corner coordinates
+        width (float): Page width, used to normalize the coordinates to 0-1
+        height (float): Page height, used to normalize the coordinates to 0-1
+
+    Returns:
+        tuple: (left, top, right, bottom) in normalized page coordinates
+    """
+
+    xs = box[0::2]
+    ys = box[1::2]
+    return (min(xs) / width, min(ys) / height, max(xs) / width, max(ys) / height)
+
+
+def overlap_area(a, b):
+    """Returns the area of the intersection of two (left, top, right, bottom) rectangles."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    return width * height if width > 0 and height > 0 else 0.0
+
+
+def normalize_text(text):
+    """Removes whitespace so that "City, CO" and "City,CO" compare equal."""
+    return "".join(text.split())
+
+
+class OcrPageIndex:
+    """
+    A uniform grid index over the OCR words of one page.
+
+    Word rectangles are normalized to the 0-1 page size used by .labels.json
+    files and registered in every grid cell they touch. Finding the words under
+    a label box then only looks at the few cells that box covers, instead of
+    comparing it with every word on the page.
+    """
+
+    def __init__(self, page, grid_size=32):
+        """
+        Args:
+            page (dict): One entry of analyzeResult.readResults from a .ocr.json file
+            grid_size (int): Number of grid cells along each side of the page
+        """
+
+        self.page = page.get("page", 1)
+        self.grid_size = grid_size
+        self.words = []   # (rectangle, text)
+        self.cells = {}   # (column, row) -> list of word indexes
+
+        width = page.get("width") or 1.0
+        height = page.get("height") or 1.0
+        for line in page.get("lines", ()):
+            for word in line.get("words", ()):
+                self.add(bounding_rect(word["boundingBox"], width, height), word["text"])
+
+    def _cell_range(self, rect):
+        # Returns the range of grid columns and rows that a rectangle touches
+        last = self.grid_size - 1
+        left = min(last, max(0, int(rect[0] * self.grid_size)))
+        top = min(last, max(0, int(rect[1] * self.grid_size)))
+        right = min(last, max(0, int(rect[2] * self.grid_size)))
+        bottom = min(last, max(0, int(rect[3] * self.grid_size)))
+        return range(left, right + 1), range(top, bottom + 1)
+
+    def add(self, rect, text):
+        """
+        Adds a word to the index.
+
+        Args:
+            rect (tuple): The word's (left, top, right, bottom) normalized rectangle
+            text (str): The word's text
+        """
+
+        index = len(self.words)
+        self.words.append((rect, text))
+        columns, rows = self._cell_range(rect)
+        for column in columns:
+            for row in rows:
+                self.cells.setdefault((column, row), []).append(index)
+
+    def query(self, rect):
+        """
+        Returns the words whose rectangle intersects a rectangle.
+
+        Args:
+            rect (tuple): A (left, top, right, bottom) normalized rectangle
+
+        Returns:
+            list: (word rectangle, text) tuples, in reading order (top to bottom, left to right)
+        """
+
+        found = set()
+        columns, rows = self._cell_range(rect)
+        for column in columns:
+            for row in rows:
+                for index in self.cells.get((column, row), ()):
+                    if index not in found and overlap_area(self.words[index][0], rect) > 0:
+                        found.add(index)
+        return [self.words[index] for index in sorted(found, key=lambda i: (self.words[i][0][1], self.words[i][0][0]))]
+
+    def words_in(self, rect, min_coverage=0.5):
+        """
+        Returns the words that lie mostly inside a rectangle.
+
+        Args:
+            rect (tuple): A (left, top, right, bottom) normalized rectangle
+            min_coverage (float): Fraction of a word's area that must be inside the rectangle
+
+        Returns:
+            list: (word rectangle, text) tuples in reading order
+        """
+
+        words = []
+        for word_rect, text in self.query(rect):
+            area = (word_rect[2] - word_rect[0]) * (word_rect[3] - word_rect[1])
+            if area <= 0 or overlap_area(word_rect, rect) / area >= min_coverage:
+                words.append((word_rect, text))
+        return words
+
+
+def load_ocr_index(ocr_path, grid_size=32):
+    """
+    Builds a spatial index for every page of a .ocr.json file.
+
+    Args:
+        ocr_path (str): Path to a Form_N.jpg.ocr.json file
+        grid_size (int): Number of grid cells along each side of a page
+
+    Returns:
+        dict: Page number -> OcrPageIndex
+    """
+
+    # Pages are read one at a time, so only the index (not the whole OCR result) stays in memory
+    pages = iter_items(ocr_path, "analyzeResult.readResults.item")
+    return {page.get("page", number): OcrPageIndex(page, grid_size) for number, page in enumerate(pages, start=1)}
+
+
+def match_labels(labels, index, min_coverage=0.5):
+    """
+    Matches every labeled value of a form to the OCR words under its bounding boxes.
+
+    Args:
+        labels (dict): The contents of a .labels.json file
+        index (dict): Page number -> OcrPageIndex, as returned by load_ocr_index
+        min_coverage (float): Fraction of a word's area that must be inside a label box
+
+    Returns:
+        list: One issue dict per mismatch, with "label", "page", "expected", "found"
+        and "problem" ("missing page", "no OCR words" or "text mismatch")
+    """
+
+    issues = []
+    for label in labels.get("labels", ()):
+        for value in label.get("value", ()):
+            page = value.get("page", 1)
+            expected = value.get("text", "")
+            issue = {"label": label.get("label"), "page": page, "expected": expected, "found": None}
+
+            page_index = index.get(page)
+            if page_index is None:
+                issues.append(dict(issue, problem="missing page"))
+                continue
+
+            words = []
+            for box in value.get("boundingBoxes", ()):
+                words.extend(page_index.words_in(bounding_rect(box), min_coverage))
+            if not words:
+                issues.append(dict(issue, problem="no OCR words"))
+                continue
+
+            found = " ".join(text for _, text in words)
+            if normalize_text(found) != normalize_text(expected):
+                issues.append(dict(issue, found=found, problem="text mismatch"))
+    return issues
+
+
+def validate_form(labels_path, ocr_path, grid_size=32, min_coverage=0.5):
+    """
+    Checks that every label of a form matches the form's OCR results.
+
+    Args:
+        labels_path (str): Path to a Form_N.jpg.labels.json file
+        ocr_path (str): Path to the matching Form_N.jpg.ocr.json file
+        grid_size (int): Number of grid cells along each side of a page
+        min_coverage (float): Fraction of a word's area that must be inside a label box
+
+    Returns:
+        list: The issues found (see match_labels)
+    """
+
+    with open(labels_path, "r", encoding="utf-8") as file:
+        labels = json.load(file)
+    return match_labels(labels, load_ocr_index(ocr_path, grid_size), min_coverage)
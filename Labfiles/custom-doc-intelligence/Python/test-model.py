@@ -1,16 +1,44 @@
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.formrecognizer import DocumentAnalysisClient
-from dotenv import load_dotenv
+import argparse
+import json
 import os
+import sys
+
+# Shared helpers used by several labs live in Labfiles/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from console import clear_console
+from instrumentation import get_recorder
+from label_checks import load_field_schema
+from model_eval import Evaluation, check_gates, evaluate_forms, find_labeled_forms, print_report
 
 
 def main():
 
-    # Clear the console
-    os.system('cls' if os.name=='nt' else 'clear')
+    # Clear the console (with escape codes, so no cls/clear process is started)
+    clear_console()
 
     try:
+        # Get a folder of labeled forms to evaluate the model on, if any
+        # e.g. python test-model.py
+        #      python test-model.py ../sample-forms
+        #      python test-model.py /data/held-out-forms --max-in-flight 16 --json evaluation.json
+        #      python test-model.py /data/held-out-forms --min-precision 0.95 --min-recall 0.9 --max-p99-seconds 10
+        parser = argparse.ArgumentParser(description="Test a custom Document Intelligence model, or evaluate it on labeled forms")
+        parser.add_argument("folder", nargs="?",
+                            help="Folder of held-out forms and their *.labels.json files (default: analyze the test1.jpg sample)")
+        parser.add_argument("--fields", default=None,
+                            help="Field definitions to report on (default: fields.json in the folder, if there is one)")
+        parser.add_argument("--max-in-flight", type=int, default=8,
+                            help="Maximum number of forms analyzed at the same time")
+        parser.add_argument("--bins", type=int, default=10, help="Number of confidence bins in the calibration report")
+        parser.add_argument("--json", help="Also write the evaluation to this JSON file")
+        parser.add_argument("--min-precision", type=float, help="Fail if the overall precision is lower")
+        parser.add_argument("--min-recall", type=float, help="Fail if the overall recall is lower")
+        parser.add_argument("--min-docs-per-second", type=float, help="Fail if the throughput is lower")
+        parser.add_argument("--max-p99-seconds", type=float, help="Fail if the 99th percentile latency is higher")
+        args = parser.parse_args()
+
         # Get configuration settings 
+        from dotenv import load_dotenv
         load_dotenv()
         endpoint = os.getenv("DOC_INTELLIGENCE_ENDPOINT")
         key = os.getenv("DOC_INTELLIGENCE_KEY")
@@ -18,22 +46,35 @@ def main():
 
         formUrl = "https://github.com/MicrosoftLearning/mslearn-ai-information-extraction/blob/main/Labfiles/custom-doc-intelligence/test1.jpg?raw=true"
 
+        # The Azure SDK is only imported once the arguments are parsed, so --help starts quickly
+        from azure.core.credentials import AzureKeyCredential
+        from azure.ai.formrecognizer import DocumentAnalysisClient
         document_analysis_client = DocumentAnalysisClient(
             endpoint=endpoint, credential=AzureKeyCredential(key)
         )
 
-        # Make sure your document's type is included in the list of document types the custom model can analyze
-        response = document_analysis_client.begin_analyze_document_from_url(model_id, formUrl)
-        result = response.result()
+        if args.folder:
+            evaluate_model(document_analysis_client, model_id, args)
+            return
+
+        # The analysis is timed and recorded to METRICS_LOG / METRICS_FILE, if they are set
+        with get_recorder("test-model").operation("analyze", formUrl) as operation:
+
+            # Make sure your document's type is included in the list of document types the custom model can analyze
+            response = document_analysis_client.begin_analyze_document_from_url(model_id, formUrl)
+            operation.mark_accepted()
+            result = response.result()
+            operation.mark_completed()
 
-        for idx, document in enumerate(result.documents):
-            print("--------Analyzing document #{}--------".format(idx + 1))
-            print("Document has type {}".format(document.doc_type))
-            print("Document has confidence {}".format(document.confidence))
-            print("Document was analyzed by model with ID {}".format(result.model_id))
-            for name, field in document.fields.items():
-                field_value = field.value if field.value else field.content
-                print("Found field '{}' with value '{}' and with confidence {}".format(name, field_value, field.confidence))
+            with operation.time("decode_seconds"):
+                for idx, document in enumerate(result.documents):
+                    print("--------Analyzing document #{}--------".format(idx + 1))
+                    print("Document has type {}".format(document.doc_type))
+                    print("Document has confidence {}".format(document.confidence))
+                    print("Document was analyzed by model with ID {}".format(result.model_id))
+                    for name, field in document.fields.items():
+                        field_value = field.value if field.value else field.content
+                        print("Found field '{}' with value '{}' and with confidence {}".format(name, field_value, field.confidence))
 
         print("-----------------------------------")
     except Exception as ex:
@@ -41,5 +82,53 @@ def main():
 
     print("\nAnalysis complete.\n")
 
+
+def evaluate_model(client, model_id, args):
+    """
+    Evaluates the model on a folder of labeled forms, so a new model can be qualified before it is rolled out.
+
+    This function:
+    - Analyzes the forms in parallel, up to args.max_in_flight at a time
+    - Compares each form's predicted fields with its .labels.json ground truth
+    - Reports per-field precision and recall, confidence calibration, docs/s and latency percentiles
+    - Exits with a non-zero code if the model misses any of the --min-* / --max-* thresholds
+
+    Args:
+        client (DocumentAnalysisClient): Client for the Azure Document Intelligence service
+        model_id (str): The custom model to evaluate
+        args (argparse.Namespace): The folder, concurrency, report and threshold settings
+    """
+
+    forms = find_labeled_forms(args.folder)
+    if not forms:
+        raise ValueError(f"No labeled forms found in {args.folder}")
+
+    # Report on every field the model was trained with, so a field it never predicts still shows up
+    fields_path = args.fields or os.path.join(args.folder, "fields.json")
+    fields = list(load_field_schema(fields_path)) if os.path.exists(fields_path) else None
+
+    print(f"Evaluating model {model_id} on {len(forms)} labeled forms (up to {args.max_in_flight} at a time)")
+    evaluation = Evaluation(fields, args.bins)
+    for result in evaluate_forms(client, model_id, forms, args.max_in_flight):
+        evaluation.add(result)
+        if "error" in result:
+            print(f"{result['form']}: ERROR: {result['error']}")
+        else:
+            print(f"{result['form']}: {len(result['predicted'])} fields in {result['seconds']:.2f}s")
+    print_report(evaluation)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(dict(evaluation.report(), model_id=model_id), file, indent=4)
+
+    # A non-zero exit code lets a rollout pipeline stop a model that is less accurate or slower than required
+    failures = check_gates(evaluation.summary(), args.min_precision, args.min_recall,
+                           args.min_docs_per_second, args.max_p99_seconds)
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()     
\ No newline at end of file
@@ -0,0 +1,152 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+# label_checks uses the shared helpers in Labfiles/common, which validate-labels.py adds to the path
+PYTHON = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PYTHON, "..", "..", "common"))
+from label_checks import check_form, check_labels, check_value, load_field_schema, severity
+
+SAMPLE_FORMS = os.path.join(PYTHON, "..", "sample-forms")
+SCHEMA = load_field_schema(os.path.join(SAMPLE_FORMS, "fields.json"))
+
+
+def copy_form(folder, name="Form_1.jpg"):
+    # Copies a sample form's labels and OCR results, returning the path of the copied labels
+    for extension in (".labels.json", ".ocr.json"):
+        shutil.copy(os.path.join(SAMPLE_FORMS, name + extension), folder)
+    return os.path.join(folder, name + ".labels.json")
+
+
+def edit_labels(labels_path, edit):
+    with open(labels_path, "r", encoding="utf-8") as file:
+        labels = json.load(file)
+    edit(labels["labels"])
+    with open(labels_path, "w", encoding="utf-8") as file:
+        json.dump(labels, file)
+    return labels["labels"]
+
+
+def problems(issues):
+    return sorted((issue["label"], issue["problem"], severity(issue)) for issue in issues)
+
+
+@pytest.mark.parametrize("check_text", [True, False])
+def test_the_sample_forms_have_no_issues(check_text):
+    for number in range(1, 6):
+        document, label_count, issues, _ = check_form(os.path.join(SAMPLE_FORMS, f"Form_{number}.jpg.labels.json"),
+                                                      SCHEMA, check_text)
+
+        assert (document, label_count, issues) == (f"Form_{number}.jpg", 15, [])
+
+
+def test_check_labels_reports_each_kind_of_issue():
+    schema = {"Merchant": ("string", "not-specified"), "Total": ("number", "currency"), "DatedAs": ("date", "mdy")}
+    labels = {"labels": [
+        {"label": "Merchant", "value": [{"page": 1, "text": "Hero", "boundingBoxes": [[0.1, 0.1, 0.2, 0.1, 0.2, 0.2, 1.3, 0.2]]}]},
+        {"label": "Total", "value": [{"page": 1, "text": "about ten", "boundingBoxes": []}]},
+        {"label": "Tip", "value": [{"page": 1, "text": "$1.00", "boundingBoxes": []}]},
+    ]}
+
+    assert problems(check_labels(labels, schema)) == [
+        ("DatedAs", "missing label", "warning"),
+        ("Merchant", "box out of range", "error"),
+        ("Tip", "unknown label", "error"),
+        ("Total", "type mismatch", "error"),
+    ]
+
+
+@pytest.mark.parametrize("text, field_type, field_format, expected", [
+    ("$1,234.50", "number", "currency", True),
+    ("12 apples", "number", "currency", False),
+    ("3,5", "number", "decimal-commas", True),
+    ("12/31/2024", "date", "mdy", True),
+    ("31/12/2024", "date", "mdy", False),
+    ("31/12/2024", "date", "dmy", True),
+    ("10:30 PM", "time", "not-specified", True),
+    ("two words", "string", "no-whitespaces", False),
+    ("anything at all", "signature", "not-specified", True),
+])
+def test_check_value_matches_the_field_format(text, field_type, field_format, expected):
+    assert check_value(text, field_type, field_format) == expected
+
+
+def test_labels_that_dont_match_the_ocr_words_are_warnings(tmp_path):
+    labels_path = copy_form(str(tmp_path))
+
+    def edit(labels):
+        labels[0]["value"][0]["text"] = "Villain"
+        labels[1]["value"][0]["page"] = 2
+
+    merchant, phone = (label["label"] for label in edit_labels(labels_path, edit)[:2])
+
+    _, _, issues, _ = check_form(labels_path, SCHEMA)
+
+    assert problems(issues) == [(merchant, "text mismatch", "warning"), (phone, "missing page", "error")]
+
+
+def validate_labels(folder):
+    # Runs validate-labels.py as the setup scripts do, returning its exit code and output
+    process = subprocess.run([sys.executable, os.path.join(PYTHON, "validate-labels.py"), folder, "--workers", "1"],
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return process.returncode, process.stdout
+
+
+def test_a_mistyped_label_fails_validate_labels(tmp_path):
+    folder = str(tmp_path)
+    for number in range(1, 6):
+        copy_form(folder, f"Form_{number}.jpg")
+    with open(os.path.join(SAMPLE_FORMS, "fields.json"), "r", encoding="utf-8") as file:
+        fields = json.load(file)
+    with open(os.path.join(folder, "fields.json"), "w", encoding="utf-8") as file:
+        json.dump(fields, file)
+
+    assert validate_labels(folder)[0] == 0
+
+    # Every form labels DatedAs with a date, which can't be read as a number
+    for field in fields["fields"]:
+        if field["fieldKey"] == "DatedAs":
+            field["fieldType"] = "number"
+    with open(os.path.join(folder, "fields.json"), "w", encoding="utf-8") as file:
+        json.dump(fields, file)
+
+    returncode, output = validate_labels(folder)
+    assert returncode == 1
+    assert "Form_1.jpg: error: DatedAs (page 1) type mismatch" in output
+
+
+def test_a_box_out_of_range_is_not_also_compared_with_the_ocr_words(tmp_path):
+    labels_path = copy_form(str(tmp_path))
+
+    def edit(labels):
+        labels[0]["value"][0]["boundingBoxes"][0][0] = 2.0
+
+    edit_labels(labels_path, edit)
+
+    _, _, issues, _ = check_form(labels_path, SCHEMA)
+
+    assert [(issue["problem"], severity(issue)) for issue in issues] == [("box out of range", "error")]
+
+
+@pytest.mark.parametrize("check_text", [True, False])
+def test_malformed_or_missing_files_are_errors(tmp_path, check_text):
+    bad_labels = copy_form(str(tmp_path), "Form_1.jpg")
+    bad_ocr = copy_form(str(tmp_path), "Form_2.jpg")
+    no_ocr = copy_form(str(tmp_path), "Form_3.jpg")
+    with open(bad_labels, "w", encoding="utf-8") as file:
+        file.write('{"labels": [')
+    with open(bad_ocr[:-len(".labels.json")] + ".ocr.json", "w", encoding="utf-8") as file:
+        file.write('{"analyzeResult": {"readResults": [{"page": 1,')
+    os.remove(no_ocr[:-len(".labels.json")] + ".ocr.json")
+
+    results = {path: check_form(path, SCHEMA, check_text) for path in (bad_labels, bad_ocr, no_ocr)}
+
+    assert problems(results[bad_labels][2]) == [(None, "malformed JSON", "error")]
+    assert results[bad_labels][1] == 0
+    assert problems(results[bad_ocr][2]) == [(None, "malformed JSON", "error")]
+    assert "Form_2.jpg.ocr.json" in results[bad_ocr][2][0]["found"]
+    assert problems(results[no_ocr][2]) == [(None, "missing OCR results", "error")]
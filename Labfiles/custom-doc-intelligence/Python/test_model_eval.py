@@ -0,0 +1,170 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# model_eval uses the shared helpers in Labfiles/common, which the lab's scripts add to the path
+PYTHON = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PYTHON, "..", "..", "common"))
+from model_eval import Evaluation, check_gates, evaluate_forms, find_labeled_forms, load_ground_truth, print_report
+
+SAMPLE_FORMS = os.path.join(PYTHON, "..", "sample-forms")
+
+
+def form_result(truth, predicted, seconds=1.0, form="Form.jpg"):
+    # predicted: fieldKey -> (text, confidence), as returned by predicted_fields
+    return {"form": form, "truth": truth, "predicted": predicted, "seconds": seconds}
+
+
+def passing_summary(**changes):
+    summary = {"forms": 10, "errors": 0, "precision": 0.9, "recall": 0.8, "calibration_error": 0.05,
+               "seconds": 5.0, "docs_per_second": 2.0, "p50_seconds": 1.0, "p99_seconds": 3.0}
+    summary.update(changes)
+    return summary
+
+
+def test_precision_and_recall_from_known_fields():
+    evaluation = Evaluation()
+    # Form 1: two right, one wrong (a false positive and a false negative), one missed
+    evaluation.add(form_result({"Name": "Jane Doe", "Total": "$10.00", "Date": "1/2/2025", "Vendor": "Contoso"},
+                               {"Name": ("jane  doe", 0.9), "Total": ("$10.00", 0.8), "Date": ("2/1/2025", 0.6)}))
+    # Form 2: one right, one predicted that isn't labeled
+    evaluation.add(form_result({"Name": "John Smith"}, {"Name": ("John Smith", 0.95), "Vendor": ("Fabrikam", 0.3)}))
+
+    fields = {field["field"]: field for field in evaluation.field_report()}
+    summary = evaluation.summary()
+
+    assert fields["Name"] == {"field": "Name", "tp": 2, "fp": 0, "fn": 0, "precision": 1.0, "recall": 1.0}
+    assert (fields["Date"]["tp"], fields["Date"]["fp"], fields["Date"]["fn"]) == (0, 1, 1)
+    assert (fields["Vendor"]["tp"], fields["Vendor"]["fp"], fields["Vendor"]["fn"]) == (0, 1, 1)
+    assert fields["Vendor"]["precision"] == 0.0 and fields["Vendor"]["recall"] == 0.0
+    # 3 true positives, 2 false positives and 2 false negatives over every field
+    assert summary["precision"] == pytest.approx(3 / 5)
+    assert summary["recall"] == pytest.approx(3 / 5)
+
+
+def test_undefined_ratios_are_none():
+    evaluation = Evaluation(fields=["Name", "Total"])
+    evaluation.add(form_result({"Name": "Jane Doe"}, {}))
+
+    fields = {field["field"]: field for field in evaluation.field_report()}
+
+    assert fields["Name"]["precision"] is None and fields["Name"]["recall"] == 0.0
+    assert fields["Total"]["precision"] is None and fields["Total"]["recall"] is None
+
+
+def test_only_the_chosen_fields_are_counted():
+    evaluation = Evaluation(fields=["Name"])
+    evaluation.add(form_result({"Name": "Jane", "Total": "1"}, {"Name": ("Jane", 0.9), "Total": ("2", 0.9)}))
+
+    assert [field["field"] for field in evaluation.field_report()] == ["Name"]
+    assert evaluation.summary()["precision"] == 1.0
+
+
+def test_calibration_bins_and_expected_calibration_error():
+    evaluation = Evaluation(bins=10)
+    # 0.95 bin: both right; 0.35 bin: one right, one wrong
+    evaluation.add(form_result({"A": "x", "B": "x", "C": "x", "D": "x"},
+                               {"A": ("x", 0.95), "B": ("x", 0.95), "C": ("x", 0.35), "D": ("y", 0.35)}))
+
+    bins, error = evaluation.calibration_report()
+
+    assert [(round(b["low"], 1), b["count"], b["accuracy"]) for b in bins] == [(0.3, 2, 0.5), (0.9, 2, 1.0)]
+    assert bins[0]["confidence"] == pytest.approx(0.35) and bins[1]["confidence"] == pytest.approx(0.95)
+    # Each bin holds half the predictions: 0.5 * |0.5 - 0.35| + 0.5 * |1.0 - 0.95|
+    assert error == pytest.approx(0.5 * 0.15 + 0.5 * 0.05)
+
+
+def test_confidence_of_one_goes_in_the_top_bin():
+    evaluation = Evaluation(bins=4)
+    evaluation.add(form_result({"A": "x"}, {"A": ("x", 1.0)}))
+
+    bins, error = evaluation.calibration_report()
+
+    assert [(b["low"], b["high"], b["count"]) for b in bins] == [(0.75, 1.0, 1)]
+    assert error == 0.0
+
+
+def test_latency_percentiles_and_errors():
+    evaluation = Evaluation()
+    for seconds in range(1, 101):
+        evaluation.add(form_result({"A": "x"}, {"A": ("x", 0.9)}, seconds=float(seconds)))
+    evaluation.add({"form": "Broken.jpg", "error": "Timed out"})
+
+    summary = evaluation.summary()
+
+    assert summary["forms"] == 100 and summary["errors"] == 1
+    assert summary["p50_seconds"] == 50.5
+    assert summary["p99_seconds"] == 99.0
+    assert summary["docs_per_second"] > 0
+    assert evaluation.report()["errors"] == [{"form": "Broken.jpg", "error": "Timed out"}]
+
+
+def test_report_shows_the_calibration_error_and_leaves_errors_to_the_batch(capsys):
+    evaluation = Evaluation(bins=10)
+    evaluation.add(form_result({"A": "x", "B": "x"}, {"A": ("x", 0.95), "B": ("y", 0.35)}))
+    evaluation.add({"form": "Broken.jpg", "error": "Timed out"})
+
+    print_report(evaluation)
+    output = capsys.readouterr().out
+
+    # 0.5 * |1.0 - 0.95| + 0.5 * |0.0 - 0.35|
+    assert "Expected calibration error 0.200" in output
+    assert "1 forms (1 failed)" in output
+    # Each failed form is printed as it completes, so the report doesn't repeat it
+    assert "Timed out" not in output
+
+
+def test_gates_pass_when_every_threshold_is_met():
+    assert check_gates(passing_summary(), min_precision=0.9, min_recall=0.8, min_docs_per_second=2.0,
+                       max_p99_seconds=3.0) == []
+    assert check_gates(passing_summary()) == []
+
+
+@pytest.mark.parametrize("changes, gates, message", [
+    ({"precision": 0.89}, {"min_precision": 0.9}, "precision 0.890 is below 0.9"),
+    ({"recall": 0.5}, {"min_recall": 0.8}, "recall 0.500 is below 0.8"),
+    ({"docs_per_second": 1.5}, {"min_docs_per_second": 2.0}, "docs_per_second 1.500 is below 2.0"),
+    ({"p99_seconds": 3.5}, {"max_p99_seconds": 3.0}, "p99_seconds 3.500 is above 3.0"),
+    ({"precision": None}, {"min_precision": 0.9}, "precision - is below 0.9"),
+    ({"errors": 2}, {}, "2 forms could not be analyzed"),
+])
+def test_gates_fail_when_a_threshold_is_crossed(changes, gates, message):
+    assert check_gates(passing_summary(**changes), **gates) == [message]
+
+
+def test_gates_report_every_failure():
+    failures = check_gates(passing_summary(precision=0.1, p99_seconds=10.0), min_precision=0.5, max_p99_seconds=5.0)
+
+    assert len(failures) == 2
+
+
+class FakeDocumentAnalysisClient:
+    """Stands in for DocumentAnalysisClient: every form's fields are predicted from its labels, except broken ones."""
+
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+
+    def begin_analyze_document(self, model_id, file):
+        name = os.path.basename(file.name)
+        if name in self.broken:
+            raise RuntimeError(f"{name} could not be analyzed")
+        truth = load_ground_truth(file.name + ".labels.json")
+        fields = {key: SimpleNamespace(content=text, value=None, confidence=0.9) for key, text in truth.items()}
+        result = SimpleNamespace(documents=[SimpleNamespace(fields=fields)])
+        return SimpleNamespace(result=lambda: result)
+
+
+def test_evaluate_forms_on_the_sample_forms():
+    forms = find_labeled_forms(SAMPLE_FORMS)
+    evaluation = Evaluation()
+
+    for result in evaluate_forms(FakeDocumentAnalysisClient(broken=["Form_2.jpg"]), "model", forms, max_in_flight=3):
+        evaluation.add(result)
+
+    summary = evaluation.summary()
+    assert summary["forms"] == len(forms) - 1
+    assert evaluation.errors == [("Form_2.jpg", "Form_2.jpg could not be analyzed")]
+    assert summary["precision"] == 1.0 and summary["recall"] == 1.0
+    assert check_gates(summary, min_precision=0.9) == ["1 forms could not be analyzed"]
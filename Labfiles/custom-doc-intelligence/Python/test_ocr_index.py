@@ -0,0 +1,92 @@
+import copy
+import json
+import os
+import sys
+
+import pytest
+
+# ocr_index uses the shared helpers in Labfiles/common, which the lab's scripts add to the path
+PYTHON = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PYTHON, "..", "..", "common"))
+from ocr_index import OcrPageIndex, bounding_rect, load_ocr_index, match_labels, overlap_area, validate_form
+
+SAMPLE_FORMS = os.path.join(PYTHON, "..", "sample-forms")
+
+
+def sample_path(name):
+    return os.path.join(SAMPLE_FORMS, name)
+
+
+def load_labels(name="Form_1.jpg.labels.json"):
+    with open(sample_path(name), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def make_page(words, page=1, width=100.0, height=100.0):
+    # One line per (text, left, top, right, bottom) word, in page units
+    return {"page": page, "width": width, "height": height,
+            "lines": [{"words": [{"text": text, "boundingBox": [left, top, right, top, right, bottom, left, bottom]}]}
+                      for text, left, top, right, bottom in words]}
+
+
+def scan(index, rect):
+    # The words a linear scan of the page finds, in the index's reading order
+    found = [word for word in index.words if overlap_area(word[0], rect) > 0]
+    return sorted(found, key=lambda word: (word[0][1], word[0][0]))
+
+
+@pytest.mark.parametrize("grid_size", [1, 7, 32])
+def test_query_finds_the_same_words_as_a_linear_scan(grid_size):
+    index = load_ocr_index(sample_path("Form_1.jpg.ocr.json"), grid_size)[1]
+    rects = [(0.0, 0.0, 1.0, 1.0), (0.1, 0.1, 0.3, 0.2), (0.36, 0.09, 0.64, 0.13), (0.5, 0.5, 0.5001, 0.5001)]
+
+    for rect in rects:
+        assert index.query(rect) == scan(index, rect)
+
+
+def test_a_word_across_many_cells_is_returned_once_in_reading_order():
+    index = OcrPageIndex(make_page([("Total", 60, 50, 90, 55), ("Hero", 5, 5, 95, 20), ("Limited", 10, 50, 40, 55)]),
+                         grid_size=8)
+
+    assert [text for _, text in index.query((0.0, 0.0, 1.0, 1.0))] == ["Hero", "Limited", "Total"]
+    assert [text for _, text in index.query((0.5, 0.1, 0.55, 0.15))] == ["Hero"]
+
+
+def test_rectangles_outside_the_page_are_clamped_to_its_edge_cells():
+    index = OcrPageIndex(make_page([("corner", 95, 95, 100, 100)]), grid_size=4)
+
+    assert [text for _, text in index.query((0.9, 0.9, 1.5, 1.5))] == ["corner"]
+    assert index.query((-0.5, -0.5, 0.1, 0.1)) == []
+
+
+def test_words_in_keeps_words_mostly_inside_the_box():
+    index = OcrPageIndex(make_page([("inside", 10, 10, 20, 20), ("half", 25, 10, 35, 20)]))
+
+    box = (0.0, 0.0, 0.3, 0.3)
+    assert [text for _, text in index.words_in(box)] == ["inside", "half"]
+    assert [text for _, text in index.words_in(box, min_coverage=0.9)] == ["inside"]
+
+
+def test_bounding_rect_normalizes_to_the_page_size():
+    assert bounding_rect([10, 20, 50, 20, 50, 40, 10, 40], width=100, height=200) == (0.1, 0.1, 0.5, 0.2)
+
+
+def test_the_sample_labels_match_their_ocr_words():
+    assert validate_form(sample_path("Form_1.jpg.labels.json"), sample_path("Form_1.jpg.ocr.json")) == []
+
+
+def test_match_labels_reports_each_kind_of_mismatch():
+    labels = load_labels()
+    index = load_ocr_index(sample_path("Form_1.jpg.ocr.json"))
+    wrong_text, no_words, missing_page = copy.deepcopy(labels["labels"][:3])
+    wrong_text["value"][0]["text"] = "Villain"
+    no_words["value"] = [{"page": 1, "text": "Nothing", "boundingBoxes": [[0.99, 0.99, 1, 0.99, 1, 1, 0.99, 1]]}]
+    for value in missing_page["value"]:
+        value["page"] = 2
+
+    issues = match_labels({"labels": [wrong_text, no_words, missing_page]}, index)
+
+    assert [(issue["label"], issue["problem"]) for issue in issues] == (
+        [(wrong_text["label"], "text mismatch"), (no_words["label"], "no OCR words")]
+        + [(missing_page["label"], "missing page")] * len(missing_page["value"]))
+    assert issues[0]["found"] == "Hero"
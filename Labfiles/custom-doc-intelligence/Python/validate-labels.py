@@ -0,0 +1,79 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+# Shared helpers used by several labs live in Labfiles/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from label_checks import check_form, load_field_schema, severity
+
+
+def main():
+
+    try:
+        # Get the folder of labeled training forms
+        # e.g. python validate-labels.py
+        #      python validate-labels.py ../sample-forms
+        #      python validate-labels.py /data/training-forms --workers 8 --timings
+        parser = argparse.ArgumentParser(description="Check training labels against fields.json and their OCR results before uploading")
+        parser.add_argument("folder", nargs="?", default=os.path.join("..", "sample-forms"),
+                            help="Folder containing fields.json and the *.labels.json and *.ocr.json files")
+        parser.add_argument("--fields", default=None,
+                            help="Field definitions to check the labels against (default: fields.json in the folder)")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Number of processes used to check forms in parallel")
+        parser.add_argument("--no-text", action="store_true",
+                            help="Skip comparing each label with the OCR words under its boxes")
+        parser.add_argument("--timings", action="store_true",
+                            help="Print how long each form took to check")
+        args = parser.parse_args()
+
+        schema = load_field_schema(args.fields or os.path.join(args.folder, "fields.json"))
+        labels_paths = sorted(glob.glob(os.path.join(args.folder, "*.labels.json")))
+
+        # Check the forms in parallel, one process per core; results come back in file order
+        # Each form checks the labels against the field definitions (missing, unknown and
+        # mistyped labels, boxes outside the page) and against the form's OCR results;
+        # only errors fail the check (see label_checks.WARNINGS)
+        start = time.perf_counter()
+        check = partial(check_form, schema=schema, check_text=not args.no_text)
+        if args.workers > 1 and len(labels_paths) > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                chunk_size = max(1, len(labels_paths) // (args.workers * 8))
+                results = list(executor.map(check, labels_paths, chunksize=chunk_size))
+        else:
+            results = [check(labels_path) for labels_path in labels_paths]
+        elapsed = time.perf_counter() - start
+
+        counts = {"error": 0, "warning": 0}
+        for document, label_count, form_issues, seconds in results:
+            if args.timings:
+                print(f"{document}: {label_count} labels, {len(form_issues)} issues ({seconds * 1000:.1f} ms)")
+            for issue in form_issues:
+                print(f"{document}: {severity(issue)}: {issue['label'] or ''} (page {issue['page'] or '-'}) {issue['problem']}: "
+                      f"expected '{issue['expected'] or ''}', found '{issue['found'] or ''}'")
+                counts[severity(issue)] += 1
+
+        print(f"\nChecked {len(results)} forms in {elapsed:.2f}s with {args.workers} workers: "
+              f"{counts['error']} errors, {counts['warning']} warnings")
+        if results:
+            slowest = max(results, key=lambda result: result[3])
+            total = sum(result[3] for result in results)
+            print(f"Per form: {total / len(results) * 1000:.1f} ms on average, "
+                  f"slowest {slowest[0]} ({slowest[3] * 1000:.1f} ms)")
+
+        # A non-zero exit code lets setup scripts stop before uploading a bad training set
+        # Warnings (e.g. a field a form doesn't label) are shown but don't stop the upload
+        if counts["error"]:
+            sys.exit(1)
+
+    except Exception as ex:
+        print(ex)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,10 @@ set expiry_date=2026-01-01T00:00:00Z
 rem Get random numbers to create unique resource names
 set unique_id=!random!!random!
 
+rem Check the training labels against their OCR results before creating or uploading anything
+echo Validating labels...
+python Python\validate-labels.py sample-forms || exit /b 1
+
 rem Create a storage account in your Azure resource group 
 echo Creating storage...
 call az storage account create --name ai102form!unique_id! --subscription !subscription_id! --resource-group !resource_group! --location !location! --sku Standard_LRS --encryption-services blob --default-action Allow --allow-blob-public-access true --only-show-errors --output none
@@ -9,6 +9,10 @@ expiry_date="2028-01-01T00:00:00Z"
 # Get random numbers to create unique resource names
 unique_id=$((1 + RANDOM % 99999))
 
+# Check the training labels against their OCR results before creating or uploading anything
+echo "Validating labels..."
+python3 Python/validate-labels.py ./sample-forms || exit 1
+
 # Create a storage account in your Azure resource group
 echo "Creating storage..."
 az storage account create --name "ai102form$unique_id" --subscription "$subscription_id" --resource-group "$resource_group" --location "$location" --sku Standard_LRS --encryption-services blob --default-action Allow --allow-blob-public-access true --only-show-errors --output none
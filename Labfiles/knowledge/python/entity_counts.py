@@ -0,0 +1,159 @@
+import heapq
+from search_batch import iter_documents
+
+
+class SpaceSaving:
+    """
+    Approximate top-N counter with a fixed number of counters (the Space-Saving algorithm).
+
+    When a new item arrives and all counters are used, it takes over the counter
+    with the smallest count, inheriting that count as its possible error. Memory
+    therefore stays at capacity counters however many distinct values there are.
+    Every item whose true count exceeds total / capacity is guaranteed to be kept,
+    and each reported count is at most total / capacity too high.
+    """
+
+    def __init__(self, capacity=1000):
+        """
+        Args:
+            capacity (int): Number of counters (use several times the number of items you want)
+        """
+
+        self.capacity = capacity
+        self.total = 0
+        self.counters = {}   # item -> [count, error]
+        self._heap = []      # (count, item) for every counted item; counts may be out of date
+
+    def add(self, item, count=1):
+        """
+        Counts an occurrence of an item.
+
+        Args:
+            item (str): The item to count
+            count (int): Number of occurrences
+        """
+
+        self.total += count
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            heapq.heappush(self._heap, (count, item))
+            return
+
+        # Find the item with the smallest count; heap entries are refreshed as they are popped
+        while True:
+            smallest, victim = heapq.heappop(self._heap)
+            current = self.counters[victim][0]
+            if current == smallest:
+                break
+            heapq.heappush(self._heap, (current, victim))
+        del self.counters[victim]
+        self.counters[item] = [smallest + count, smallest]
+        heapq.heappush(self._heap, (smallest + count, item))
+
+    def top(self, n):
+        """
+        Returns the most frequent items.
+
+        Args:
+            n (int): Number of items to return
+
+        Returns:
+            list: (item, estimated count, maximum overestimate) tuples, most frequent first
+        """
+
+        items = heapq.nlargest(n, self.counters.items(), key=lambda item: item[1][0])
+        return [(item, count, error) for item, (count, error) in items]
+
+
+def facet_counts(search_client, query_text, fields, top_n=10):
+    """
+    Gets the most frequent values of collection fields from the search service's facets.
+
+    Args:
+        search_client (SearchClient): The client for the search index
+        query_text (str): The documents to aggregate ("*" for all)
+        fields (list): The fields to aggregate (they must be facetable in the index)
+        top_n (int): Number of values to return per field
+
+    Returns:
+        tuple: (number of matching documents, {field: [(value, count, 0), ...]}), or None if
+        the index doesn't return facets for all the fields
+    """
+
+    # top=0: only the counts are needed, not the documents
+    results = search_client.search(
+        search_text=query_text,
+        facets=[f"{field},count:{top_n}" for field in fields],
+        include_total_count=True,
+        top=0
+    )
+    facets = results.get_facets() if hasattr(results, "get_facets") else None
+    if not facets or any(field not in facets for field in fields):
+        return None
+    return results.get_count(), {field: [(facet["value"], facet["count"], 0) for facet in facets[field]]
+                                 for field in fields}
+
+
+def streamed_counts(search_client, query_text, fields, top_n=10, capacity=1000, page_size=1000):
+    """
+    Counts the most frequent values of collection fields by paging through the matching documents.
+
+    Each field has its own SpaceSaving counter, so memory stays bounded however
+    many documents and distinct values there are. Each value is counted once per document.
+
+    Args:
+        search_client (SearchClient): The client for the search index
+        query_text (str): The documents to aggregate ("*" for all)
+        fields (list): The fields to aggregate
+        top_n (int): Number of values to return per field
+        capacity (int): Number of counters per field
+        page_size (int): Number of documents requested per page
+
+    Returns:
+        tuple: (number of documents read, {field: [(value, estimated count, maximum overestimate), ...]})
+    """
+
+    counters = {field: SpaceSaving(capacity) for field in fields}
+    documents_read = 0
+    for document in iter_documents(search_client, query_text, page_size):
+        documents_read += 1
+        for field in fields:
+            counter = counters[field]
+            for value in set(document.get(field) or ()):
+                counter.add(value)
+    return documents_read, {field: counters[field].top(top_n) for field in fields}
+
+
+def top_entities(search_client, query_text, fields, top_n=10, capacity=1000, page_size=1000):
+    """
+    Gets the most frequent entity values, using facets if the index supports them.
+
+    Args:
+        search_client (SearchClient): The client for the search index
+        query_text (str): The documents to aggregate ("*" for all)
+        fields (list): The collection fields to aggregate
+        top_n (int): Number of values to return per field
+        capacity (int): Number of counters per field when counting client-side
+        page_size (int): Number of documents requested per page when counting client-side
+
+    Returns:
+        tuple: (method used, number of documents, {field: [(value, count, maximum overestimate), ...]})
+    """
+
+    try:
+        counts = facet_counts(search_client, query_text, fields, top_n)
+    except Exception as ex:
+        # e.g. the fields are not facetable in this index
+        counts = None
+        reason = str(ex).splitlines()[0] if str(ex) else type(ex).__name__
+    else:
+        reason = "no facets returned"
+    if counts is not None:
+        return "facets", counts[0], counts[1]
+
+    documents, values = streamed_counts(search_client, query_text, fields, top_n, capacity, page_size)
+    return f"counted client-side ({reason})", documents, values
@@ -0,0 +1,62 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Shared helpers used by several labs live in Labfiles/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from local_index import LocalIndex
+from search_batch import search_page
+
+
+def main():
+
+    try:
+        # Get the local index and the queries to time
+        # e.g. python index-benchmark.py local-index --queries queries.txt
+        #      python index-benchmark.py local-index --queries queries.txt --repeat 20 --top 10
+        #      python index-benchmark.py local-index --queries queries.txt --local-only   (no search service needed)
+        parser = argparse.ArgumentParser(description="Compare query latency of a local index with the search service")
+        parser.add_argument("index", help="Local index folder created with search-app.py --export-index")
+        parser.add_argument("--queries", required=True, help="File with one query per line")
+        parser.add_argument("--repeat", type=int, default=10, help="Number of times each query is run")
+        parser.add_argument("--top", type=int, default=50, help="Number of documents requested per query")
+        parser.add_argument("--local-only", action="store_true", help="Only time the local index, without calling the search service")
+        args = parser.parse_args()
+
+        with open(args.queries, "r", encoding="utf-8") as file:
+            queries = [line.strip() for line in file if line.strip()]
+
+        # Get config settings from the .env file
+        # dotenv and the search SDK are only imported once the arguments are parsed, so --help starts quickly
+        clients = []
+        if not args.local_only:
+            from dotenv import load_dotenv
+            from azure.core.credentials import AzureKeyCredential
+            from azure.search.documents import SearchClient
+            load_dotenv()
+            clients.append(("remote", SearchClient(os.getenv('SEARCH_ENDPOINT'), os.getenv('INDEX_NAME'),
+                                                   AzureKeyCredential(os.getenv('QUERY_KEY')))))
+
+        # Time the same first page of every query against both, without a cache
+        with LocalIndex(args.index) as local_index:
+            print(f"{len(queries)} queries x {args.repeat}, top {args.top} ({len(local_index)} documents in the local index)\n")
+            for name, client in clients + [("local", local_index)]:
+                latencies = []
+                for _ in range(args.repeat):
+                    for query_text in queries:
+                        start = time.perf_counter()
+                        search_page(client, query_text, 0, args.top)
+                        latencies.append(time.perf_counter() - start)
+                latencies.sort()
+                p50 = statistics.median(latencies)
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                print(f"{name:6}  p50 {p50 * 1e6:10.1f} us  p99 {p99 * 1e6:10.1f} us  ({len(latencies) / sum(latencies):.0f} queries/s)")
+
+    except Exception as ex:
+        print(ex)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import tempfile
+from array import array
+from collections import Counter
+from search_batch import KEY_FIELD, SELECT_FIELDS, iter_documents
+
+
+# The enriched fields that are indexed (every selected field except the document key and name)
+ENTITY_FIELDS = [field for field in SELECT_FIELDS if field not in (KEY_FIELD, "metadata_storage_name")]
+# Version of the segment files; an index written in another format has to be exported again
+FORMAT = 2
+# Number of segments after which an update merges them all into one
+MAX_SEGMENTS = 8
+TOKEN = re.compile(r"\w+")
+# A query part: words and "quoted phrases" (an apostrophe, as in Margie's, is part of a word)
+QUERY_PART = re.compile(r'(?:[^\s"]+|"[^"]*")+')
+# The page cursor used by search_batch.iter_documents (see search_batch.cursor_filter)
+CURSOR_FILTER = re.compile(r"metadata_storage_name gt '((?:[^']|'')*)' or "
+                           r"\(metadata_storage_name eq '(?:[^']|'')*' and " + KEY_FIELD + r" gt '((?:[^']|'')*)'\)")
+
+
+class LocalResults(list):
+    """A page of local search results, with the same get_count() and get_facets() as the SDK's results."""
+
+    def __init__(self, documents, count, facets=None):
+        super().__init__(documents)
+        self._count = count
+        self._facets = facets
+
+    def get_count(self):
+        return self._count
+
+    def get_facets(self):
+        return self._facets
+
+
+class Segment:
+    """
+    One immutable part of a LocalIndex: a term dictionary, its documents and a
+    memory-mapped postings file.
+
+    The postings file holds sorted 32-bit document IDs, one run per term. The
+    dictionary maps each term to the offset and length of its run, so looking up
+    a term reads a slice of the mapped file without loading the postings.
+    """
+
+    def __init__(self, directory, name):
+        """
+        Args:
+            directory (str): The index folder
+            name (str): The segment name (its files are <name>.json and <name>.postings)
+        """
+
+        self.name = name
+        with open(os.path.join(directory, name + ".json"), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+
+        # Entity values repeat across documents and segments, so each string is interned once
+        strings = [sys.intern(string) for string in meta["strings"]]
+        self.terms = {sys.intern(term): tuple(span) for term, span in meta["terms"].items()}
+        self.deleted = set(meta["deleted"])
+        self.documents = {}   # document ID -> (key, name, digest, {field: [values]})
+        for doc_id, key, name_id, digest, fields in meta["documents"]:
+            self.documents[doc_id] = (key, strings[name_id], digest,
+                                      {field: [strings[i] for i in ids] for field, ids in fields.items()})
+
+        self._file = open(os.path.join(directory, name + ".postings"), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._postings = memoryview(self._map).cast("I") if size else memoryview(array("I"))
+
+    def postings(self, term):
+        """Returns the IDs of the documents in this segment that contain a term."""
+        span = self.terms.get(term)
+        if span is None:
+            return ()
+        return self._postings[span[0]:span[0] + span[1]]
+
+    def close(self):
+        self._postings.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+class LocalIndex:
+    """
+    A local inverted index over the enriched fields of the search index.
+
+    It is built once from the search service (see export_index) and answers
+    queries without any network round trip:
+    - "*" returns every document
+    - field:value matches documents with that exact entity value
+      (e.g. locations:London or people:"Jane Doe", case-insensitive)
+    - other words match documents with the word in any entity value
+    All the terms of a query must match. Results are sorted by document name
+    (then by key, for documents with the same name).
+
+    The index is a folder of immutable segments listed in manifest.json. An
+    update only writes a new segment with the added and changed documents (and
+    the IDs of the documents they replace, matched by the index key), so refreshing the index after new
+    documents are enriched doesn't rewrite it; segments are merged once there
+    are more than MAX_SEGMENTS.
+
+    LocalIndex.search() takes the same arguments as SearchClient.search(), so it
+    can be used wherever a SearchClient is expected.
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): The index folder (created by the first update if it doesn't exist)
+        """
+
+        self.directory = directory
+        self.segments = []
+        self.next_id = 0
+        manifest_path = os.path.join(directory, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+            if manifest.get("format") != FORMAT:
+                raise ValueError(f"The local index in {directory} was written by an older version; delete it and export it again")
+            self.next_id = manifest["next_id"]
+            self.segments = [Segment(directory, name) for name in manifest["segments"]]
+        self._refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmaps the postings files."""
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    def _refresh(self):
+        # Rebuilds the lookup of live documents: a document is live unless a later segment replaced it
+        deleted = set()
+        for segment in self.segments:
+            deleted.update(segment.deleted)
+        self.deleted = deleted
+        self.documents = {}   # document ID -> (key, name, digest, fields)
+        self.keys = {}        # document key -> document ID
+        for segment in self.segments:
+            for doc_id, document in segment.documents.items():
+                if doc_id not in deleted:
+                    self.documents[doc_id] = document
+                    self.keys[document[0]] = doc_id
+        self.sorted_ids = sorted(self.documents, key=lambda doc_id: (self.documents[doc_id][1], self.documents[doc_id][0]))
+        self.rank = {doc_id: rank for rank, doc_id in enumerate(self.sorted_ids)}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def update(self, documents, remove_missing=False):
+        """
+        Adds new and changed documents to the index.
+
+        Args:
+            documents (iterable): Documents with the selected fields, as returned by the search
+            remove_missing (bool): Whether to remove indexed documents that are not in documents
+
+        Returns:
+            tuple: (number of documents added, changed, removed)
+        """
+
+        added = []
+        deleted = []
+        seen = set()
+        for document in documents:
+            key = document[KEY_FIELD]
+            name = document["metadata_storage_name"]
+            fields = {field: list(document.get(field) or ()) for field in ENTITY_FIELDS}
+            digest = hashlib.sha1(json.dumps([name, fields], sort_keys=True).encode("utf-8")).hexdigest()
+            seen.add(key)
+            doc_id = self.keys.get(key)
+            if doc_id is not None:
+                if self.documents[doc_id][2] == digest:
+                    continue
+                deleted.append(doc_id)
+            added.append((key, name, digest, fields))
+
+        changed = len(deleted)
+        if remove_missing:
+            deleted.extend(doc_id for key, doc_id in self.keys.items() if key not in seen)
+
+        if added or deleted:
+            # New and changed documents get new IDs; the IDs they replace are recorded as deleted
+            documents = [(self.next_id + i, document) for i, document in enumerate(added)]
+            self.next_id += len(added)
+            self._write(documents, deleted)
+            if len(self.segments) > MAX_SEGMENTS:
+                self.compact()
+        return len(added) - changed, changed, len(deleted) - changed
+
+    def compact(self):
+        """Merges all the segments into one, dropping replaced documents."""
+        live = [(doc_id, self.documents[doc_id]) for doc_id in sorted(self.documents)]
+        self._write(live, [], replace=True)
+
+    def _write(self, documents, deleted, replace=False):
+        # Writes a segment with the given (document ID, (key, name, digest, fields)) documents,
+        # then switches the manifest to it
+        os.makedirs(self.directory, exist_ok=True)
+        strings = []
+        string_ids = {}
+
+        def string_id(value):
+            if value not in string_ids:
+                string_ids[value] = len(strings)
+                strings.append(value)
+            return string_ids[value]
+
+        postings = {}   # term -> list of document IDs (in increasing order)
+        meta_documents = []
+        for doc_id, (key, name, digest, fields) in documents:
+            meta_documents.append([doc_id, key, string_id(name), digest,
+                                   {field: [string_id(value) for value in values] for field, values in fields.items()}])
+            terms = set()
+            for field, values in fields.items():
+                for value in values:
+                    terms.add(field_term(field, value))
+                    terms.update(word_term(word) for word in TOKEN.findall(value.lower()))
+            for term in terms:
+                postings.setdefault(term, []).append(doc_id)
+
+        ids = array("I")
+        terms = {}
+        for term in sorted(postings):
+            terms[term] = [len(ids), len(postings[term])]
+            ids.extend(postings[term])
+
+        number = max([int(segment.name.split("-")[1]) for segment in self.segments] + [0]) + 1
+        name = f"segment-{number:06}"
+        with open(os.path.join(self.directory, name + ".postings"), "wb") as file:
+            ids.tofile(file)
+        with open(os.path.join(self.directory, name + ".json"), "w", encoding="utf-8") as file:
+            json.dump({"strings": strings, "terms": terms, "documents": meta_documents, "deleted": sorted(deleted)},
+                      file, separators=(",", ":"))
+
+        # The new segment only becomes part of the index once the manifest lists it
+        kept = [] if replace else self.segments
+        _write_json(os.path.join(self.directory, "manifest.json"),
+                    {"format": FORMAT, "next_id": self.next_id, "segments": [segment.name for segment in kept] + [name]})
+        if replace:
+            for segment in self.segments:
+                segment.close()
+                for extension in (".json", ".postings"):
+                    os.remove(os.path.join(self.directory, segment.name + extension))
+        self.segments = kept + [Segment(self.directory, name)]
+        self._refresh()
+
+    def query(self, query_text):
+        """
+        Finds the documents that match a query.
+
+        Args:
+            query_text (str): "*", or field:value filters and words (see LocalIndex)
+
+        Returns:
+            list: Matching document IDs, sorted by document name and key
+        """
+
+        terms = parse_query(query_text)
+        if not terms:
+            return list(self.sorted_ids)
+
+        matches = None
+        for term in terms:
+            found = set()
+            for segment in self.segments:
+                found.update(segment.postings(term))
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        return sorted(matches - self.deleted, key=self.rank.__getitem__)
+
+    def get_document(self, doc_id):
+        """Returns an indexed document in the same form as a search result."""
+        key, name, _, fields = self.documents[doc_id]
+        return dict(fields, metadata_storage_name=name, **{KEY_FIELD: key})
+
+    def search(self, search_text="*", select=None, order_by=None, include_total_count=False, top=None, skip=0,
+               filter=None, facets=None, **kwargs):
+        """
+        Runs a query with the same arguments as SearchClient.search().
+
+        Results are always sorted by document name and key, and only the indexed fields
+        can be selected. The only supported filter is the (name, key) cursor written by
+        search_batch.cursor_filter (used to page through results); facets are
+        "<field>,count:<n>" on the entity fields.
+
+        Returns:
+            LocalResults: The page of matching documents, with get_count() and get_facets()
+        """
+
+        matches = self.query(search_text or "*")
+        if filter:
+            match = CURSOR_FILTER.fullmatch(filter.strip())
+            if match is None:
+                raise ValueError(f"Unsupported filter for a local index: {filter}")
+            after = (match.group(1).replace("''", "'"), match.group(2).replace("''", "'"))
+            matches = [doc_id for doc_id in matches if (self.documents[doc_id][1], self.documents[doc_id][0]) > after]
+
+        page = matches[skip:] if top is None else matches[skip:skip + top]
+        documents = [self.get_document(doc_id) for doc_id in page]
+        if select:
+            documents = [{field: document.get(field) for field in select} for document in documents]
+        return LocalResults(documents, len(matches), self._facets(matches, facets) if facets else None)
+
+    def _facets(self, matches, facets):
+        # Counts the values of the requested fields over all the matching documents
+        counts = {}
+        for facet in facets:
+            field, _, options = facet.partition(",")
+            limit = int(options.partition("count:")[2] or 10)
+            counter = Counter()
+            for doc_id in matches:
+                counter.update(set(self.documents[doc_id][3].get(field) or ()))
+            counts[field] = [{"value": value, "count": count} for value, count in counter.most_common(limit)]
+        return counts
+
+
+def field_term(field, value):
+    """Returns the dictionary term for an exact (case-insensitive) entity value."""
+    return f"{field}:{value.lower()}"
+
+
+def word_term(word):
+    """Returns the dictionary term for a word in any entity value."""
+    return f":{word}"
+
+
+def parse_query(query_text):
+    """
+    Turns a query into the dictionary terms that must all match.
+
+    Words are split on whitespace, except inside double quotes (people:"Jane Doe");
+    apostrophes and unbalanced quotes are treated as part of the text.
+
+    Args:
+        query_text (str): "*", or field:value filters and words
+
+    Returns:
+        list: Dictionary terms (empty for "*")
+    """
+
+    terms = []
+    for part in QUERY_PART.findall(query_text):
+        part = part.replace('"', "")
+        field, separator, value = part.partition(":")
+        if separator and field in ENTITY_FIELDS:
+            terms.append(field_term(field, value))
+        elif part != "*":
+            terms.extend(word_term(word) for word in TOKEN.findall(part.lower()))
+    return terms
+
+
+def export_index(search_client, directory, page_size=1000):
+    """
+    Copies the enriched fields of every document in the search index into a local index.
+    The documents are read one page at a time, following on from the last document (name, key).
+
+    If the local index already exists, only new and changed documents are written,
+    and documents no longer in the search index are removed.
+
+    Args:
+        search_client (SearchClient): The client for the search index
+        directory (str): The local index folder
+        page_size (int): Number of documents requested per page
+
+    Returns:
+        tuple: (number of documents added, changed, removed)
+    """
+
+    with LocalIndex(directory) as index:
+        return index.update(iter_documents(search_client, "*", page_size), remove_missing=True)
+
+
+def _write_json(path, value):
+    # Writes a JSON file atomically, so readers never see a partly written manifest
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(handle, "w", encoding="utf-8") as file:
+        json.dump(value, file)
+    os.replace(temp_path, path)
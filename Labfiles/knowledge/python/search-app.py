@@ -1,9 +1,15 @@
-from dotenv import load_dotenv
+import argparse
 import os
-# Import credentials module for authentication
-from azure.core.credentials import AzureKeyCredential
-# Import SearchClient to interact with Azure Cognitive Search
-from azure.search.documents import SearchClient
+import sys
+import time
+
+# Shared helpers used by several labs live in Labfiles/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from console import clear_console
+from instrumentation import get_recorder
+from search_batch import TTLCache, iter_pages, run_queries
+from local_index import LocalIndex, export_index
+from entity_counts import top_entities
 
 
 def main():
@@ -16,16 +22,50 @@ def main():
     - Prompts the user for search queries
     - Executes searches against the search index
     - Displays results with extracted entities (locations, people, key phrases)
+
+    With --queries, it runs every query in a file (or stdin) concurrently instead of prompting.
     """
 
     # Clear the console screen for a clean interface
-    # Works on both Windows (cls) and Unix-like systems (clear)
-    os.system('cls' if os.name=='nt' else 'clear')
+    # Escape codes work on both Windows and Unix-like terminals, without starting a cls/clear process
+    clear_console()
 
     try:
+        # Get the optional batch settings
+        # e.g. python search-app.py
+        #      python search-app.py --queries queries.txt --max-in-flight 8
+        #      cat queries.txt | python search-app.py --queries - --max-results 20
+        #      python search-app.py --export-index local-index
+        #      python search-app.py --local local-index
+        #      python search-app.py --top-entities 10 --query "beach"
+        parser = argparse.ArgumentParser(description="Search the knowledge mining index")
+        parser.add_argument("--queries", default=None,
+                            help="File with one query per line ('-' for stdin); runs them without prompting")
+        parser.add_argument("--max-in-flight", type=int, default=4,
+                            help="Maximum number of concurrent search requests in batch mode")
+        parser.add_argument("--page-size", type=int, default=50,
+                            help="Number of documents requested per page of results")
+        parser.add_argument("--max-results", type=int, default=None,
+                            help="Maximum number of documents returned per query (default: all)")
+        parser.add_argument("--cache-size", type=int, default=256,
+                            help="Maximum number of result pages kept in the query cache")
+        parser.add_argument("--cache-ttl", type=float, default=300,
+                            help="Seconds before a cached page of results expires")
+        parser.add_argument("--export-index", default=None,
+                            help="Copy the enriched fields of every document into a local index folder (or update it) and exit")
+        parser.add_argument("--local", default=None,
+                            help="Answer queries from a local index folder instead of the search service")
+        parser.add_argument("--top-entities", type=int, default=None,
+                            help="Show the N most frequent locations, people and key phrases and exit")
+        parser.add_argument("--query", default="*",
+                            help="Documents to count entities over with --top-entities (default: all)")
+        parser.add_argument("--counters", type=int, default=1000,
+                            help="Counters per field when entities have to be counted client-side")
+        args = parser.parse_args()
 
         # Get config settings from the .env file
         # load_dotenv() reads environment variables from .env file
+        from dotenv import load_dotenv
         load_dotenv()
         # Retrieve the Azure Cognitive Search endpoint URL
         search_endpoint = os.getenv('SEARCH_ENDPOINT')
@@ -34,12 +74,52 @@ def main():
         # Retrieve the name of the search index to query
         index = os.getenv('INDEX_NAME')
 
-        # Create a search client that will communicate with Azure Cognitive Search
-        # Parameters:
-        #   - search_endpoint: The URL of your search service
-        #   - index: The name of the index to search
-        #   - AzureKeyCredential(query_key): Authentication using the API key
-        search_client = SearchClient(search_endpoint, index, AzureKeyCredential(query_key))
+        # Every search request is timed and recorded to METRICS_LOG / METRICS_FILE, if they are set
+        get_recorder("search-app")
+
+        # Use the local index instead of the service, if one was given
+        # It supports "*", words and field:value filters such as locations:London or people:"Jane Doe"
+        # The search SDK is only imported when the service is used, so a local index starts faster
+        if args.local and not args.export_index:
+            search_client = LocalIndex(args.local)
+        else:
+            # Import credentials module for authentication
+            from azure.core.credentials import AzureKeyCredential
+            # Import SearchClient to interact with Azure Cognitive Search
+            from azure.search.documents import SearchClient
+
+            # Create a search client that will communicate with Azure Cognitive Search
+            # Parameters:
+            #   - search_endpoint: The URL of your search service
+            #   - index: The name of the index to search
+            #   - AzureKeyCredential(query_key): Authentication using the API key
+            search_client = SearchClient(search_endpoint, index, AzureKeyCredential(query_key))
+
+        # Export the enriched fields into a local index; an existing index only gets the changes
+        if args.export_index:
+            added, changed, removed = export_index(search_client, args.export_index)
+            print(f"Local index {args.export_index}: {added} documents added, {changed} changed, {removed} removed")
+            return
+
+        # Count the most frequent entities, using the service's facets when the fields are facetable
+        # and otherwise a bounded-memory counter over every matching document
+        if args.top_entities:
+            fields = ["locations", "people", "keyphrases"]
+            method, documents, values = top_entities(search_client, args.query, fields, args.top_entities, args.counters)
+            print(f"Top {args.top_entities} entities in {documents} documents matching '{args.query}' ({method}):")
+            for field in fields:
+                print(f"\n{field}:")
+                for value, count, error in values[field]:
+                    print(f"   {count:>8}{f' (±{error})' if error else ''}  {value}")
+            return
+
+        # Keep recent pages of results, so repeating a query doesn't need another round trip
+        cache = TTLCache(max_entries=args.cache_size, ttl=args.cache_ttl)
+
+        # In batch mode, run every query from the file (or stdin) and exit
+        if args.queries:
+            run_batch(search_client, args.queries, args.max_in_flight, args.page_size, args.max_results, cache)
+            return
 
         # Loop until the user types 'quit'
         # This creates an interactive search experience where users can enter multiple queries
@@ -60,51 +140,27 @@ def main():
 
             # Clear the console screen before displaying results
             # This gives a cleaner appearance to the output
-            os.system('cls' if os.name=='nt' else 'clear')
+            clear_console()
             
-            # Execute the search query against the search index
-            # Parameters:
+            # Execute the search query against the search index, one page of results at a time
+            # Each request asks for:
             #   - search_text: The query text to search for (full-text search)
             #   - select: Specifies which fields to return in results
             #     * metadata_storage_name: Document name/filename
             #     * locations: Extracted location entities
             #     * people: Extracted person entities
             #     * keyphrases: Extracted key phrases from the document
-            #   - order_by: Sort results by document name
+            #   - order_by: Sort results by document name (then by key, if the index can sort on it)
             #   - include_total_count: Include total number of matching documents
-            found_documents = search_client.search(
-                search_text=query_text,
-                select=["metadata_storage_name", "locations", "people", "keyphrases"],
-                order_by=["metadata_storage_name"],
-                include_total_count=True
-            )
-
-            # Parse and display the search results
-            # Get the total count of documents that matched the query
-            print(f"\nSearch returned {found_documents.get_count()} documents:")
-            
-            # Iterate through each document returned by the search
-            for document in found_documents:
-                # Display the document name/filename
-                print(f"\nDocument: {document["metadata_storage_name"]}")
-                
-                # Display extracted locations (cities, countries, etc.)
-                # These are entities recognized by Azure AI services
-                print(" - Locations:")
-                for location in document["locations"]:
-                    print(f"   - {location}")
-                
-                # Display extracted people (person names recognized in the document)
-                # This is useful for finding documents mentioning specific people
-                print(" - People:")
-                for person in document["people"]:
-                    print(f"   - {person}")
-                
-                # Display extracted key phrases (important terms/phrases from the document)
-                # These summarize the main topics of the document
-                print(" - Key phrases:")
-                for phrase in document["keyphrases"]:
-                    print(f"   - {phrase}")
+            #   - top/skip: The page of results to return, so large result sets are fetched in pieces
+            for skip, count, documents in iter_pages(search_client, query_text, args.page_size, args.max_results, cache):
+                # Get the total count of documents that matched the query
+                if skip == 0:
+                    print(f"\nSearch returned {count} documents:")
+
+                # Display each document of this page
+                for document in documents:
+                    print_document(document)
 
     except Exception as ex:
         # Catch and display any errors that occur
@@ -113,6 +169,81 @@ def main():
 
 
 
+def print_document(document):
+    """
+    Displays a search result with its extracted entities.
+
+    Args:
+        document (dict): A document returned by the search, with the selected fields
+    """
+
+    # Display the document name/filename
+    print(f"\nDocument: {document['metadata_storage_name']}")
+
+    # Display extracted locations (cities, countries, etc.)
+    # These are entities recognized by Azure AI services
+    print(" - Locations:")
+    for location in document["locations"]:
+        print(f"   - {location}")
+
+    # Display extracted people (person names recognized in the document)
+    # This is useful for finding documents mentioning specific people
+    print(" - People:")
+    for person in document["people"]:
+        print(f"   - {person}")
+
+    # Display extracted key phrases (important terms/phrases from the document)
+    # These summarize the main topics of the document
+    print(" - Key phrases:")
+    for phrase in document["keyphrases"]:
+        print(f"   - {phrase}")
+
+
+def run_batch(search_client, queries_path, max_in_flight, page_size, max_results, cache):
+    """
+    Runs every query in a file concurrently and displays the results.
+
+    This function:
+    - Reads one query per line from a file, or from stdin if the path is '-'
+    - Runs up to max_in_flight searches at the same time, paging through each query's results
+    - Displays each page of results as soon as it arrives, labeled with its query
+
+    Args:
+        search_client (SearchClient): The client for the search index
+        queries_path (str): Path to the file of queries, or '-' for stdin
+        max_in_flight (int): Maximum number of concurrent search requests
+        page_size (int): Number of documents requested per page
+        max_results (int): Maximum number of documents returned per query (None for all)
+        cache (TTLCache): Cache of recent pages of results
+    """
+
+    file = sys.stdin if queries_path == "-" else open(queries_path, "r", encoding="utf-8")
+    try:
+        # Queries are read lazily, so a long stream of queries is never held in memory
+        queries = (line.strip() for line in file)
+        start = time.perf_counter()
+        query_count = 0
+        for query_text, skip, count, documents in run_queries(search_client, queries, max_in_flight,
+                                                              page_size, max_results, cache):
+            if count is None:
+                print(f"\n[{query_text}] Search failed: {documents}")
+                continue
+            if skip == 0:
+                query_count += 1
+                if not documents:
+                    print(f"\n[{query_text}] Search returned 0 documents")
+                    continue
+            print(f"\n[{query_text}] Documents {skip + 1}-{skip + len(documents)} of {count}:")
+            for document in documents:
+                print_document(document)
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\nRan {query_count} queries in {elapsed:.2f}s ({cache.misses} pages requested, {cache.hits} from the cache)")
+
+
 if __name__ == "__main__":
     # Entry point of the script
     # This ensures main() only runs when the script is executed directly,
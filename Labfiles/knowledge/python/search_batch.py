@@ -0,0 +1,348 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from instrumentation import get_recorder
+
+
+# The index key (the blob's path, which is unique even when two documents have the same name)
+KEY_FIELD = "metadata_storage_path"
+
+# The fields returned for each document: its key, its name and the entities extracted by the enrichment skills
+SELECT_FIELDS = [KEY_FIELD, "metadata_storage_name", "locations", "people", "keyphrases"]
+
+# Whether each search client's index can sort and filter on the key (see key_is_sortable)
+_sortable_keys = weakref.WeakKeyDictionary()
+_sortable_keys_lock = threading.Lock()
+
+
+class TTLCache:
+    """
+    A thread-safe, least-recently-used cache whose entries expire after a time to live.
+
+    At most max_entries values are kept; adding one more evicts the least
+    recently used. get_or_load() also makes concurrent requests for the same
+    key wait for a single load, so a query repeated in a batch is only sent once.
+    """
+
+    def __init__(self, max_entries=256, ttl=300):
+        """
+        Args:
+            max_entries (int): Maximum number of cached values
+            ttl (float): Seconds after which a cached value is discarded
+        """
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0     # values returned from the cache
+        self.misses = 0   # values that had to be loaded
+        self._entries = OrderedDict()   # key -> (expiry time, value)
+        self._loading = {}              # key -> threading.Event set when its load finishes
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns a cached value, or None if it is missing or has expired.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached value or None
+        """
+
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def _lookup(self, key):
+        # Returns a live entry's value and marks it as recently used (the lock must be held)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value):
+        """
+        Adds a value to the cache, evicting the least recently used values if it is full.
+
+        Args:
+            key: The cache key
+            value: The value to cache
+        """
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, load):
+        """
+        Returns a cached value, calling load() to get it if it is not cached.
+
+        Args:
+            key: The cache key
+            load (callable): Function that returns the value
+
+        Returns:
+            The cached or loaded value
+        """
+
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not None:
+                    self.hits += 1
+                    return value
+                event = self._loading.get(key)
+                if event is None:
+                    self.misses += 1
+                    event = self._loading[key] = threading.Event()
+                    break
+            # Another thread is already loading this key: wait for it, then look again
+            event.wait()
+
+        try:
+            value = load()
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._loading[key]
+            event.set()
+
+
+def key_is_sortable(search_client):
+    """
+    Tells whether the index can sort and filter on its key as well as on the document name.
+
+    The lab's index only makes metadata_storage_name sortable, and a query key
+    cannot read the index definition, so the index is asked once with a
+    one-off search (top=0) that sorts and filters on both fields. If the service
+    rejects it, the key is not used. The answer is remembered for each client.
+
+    To get stable pages for documents that share a name, and cursor paging in
+    iter_documents, mark metadata_storage_path as Filterable and Sortable when
+    the index is created.
+
+    Args:
+        search_client (SearchClient): The client for the search index
+
+    Returns:
+        bool: True if the key can be used as a tie-breaker and in the page cursor
+    """
+
+    with _sortable_keys_lock:
+        sortable = _sortable_keys.get(search_client)
+    if sortable is None:
+        try:
+            results = search_client.search(
+                search_text="*",
+                order_by=["metadata_storage_name", KEY_FIELD],
+                filter=cursor_filter("", ""),
+                top=0
+            )
+            list(results)
+            sortable = True
+        except Exception:
+            # e.g. metadata_storage_path is not sortable or filterable in this index
+            sortable = False
+        with _sortable_keys_lock:
+            _sortable_keys[search_client] = sortable
+    return sortable
+
+
+def sort_order(search_client):
+    """Returns the order_by for the index: by name and, if the index allows it, then by key."""
+    return ["metadata_storage_name", KEY_FIELD] if key_is_sortable(search_client) else ["metadata_storage_name"]
+
+
+def search_page(search_client, query_text, skip=0, top=50, cache=None):
+    """
+    Gets one page of search results.
+
+    Args:
+        search_client (SearchClient): The client for the search index
+        query_text (str): The text to search for
+        skip (int): Number of results to skip
+        top (int): Maximum number of results to return
+        cache (TTLCache): Optional cache of previously returned pages
+
+    Returns:
+        tuple: (total number of matching documents, list of documents in this page)
+    """
+
+    def load():
+        # top and skip limit each request to one page, so large result sets are never fetched whole
+        # Pages served from the cache are not requests, so only loads are recorded
+        with get_recorder().operation("search", query_text) as operation:
+            # Documents can share a name, so the key breaks ties (where the index allows it)
+            # and every page boundary is stable
+            results = search_client.search(
+                search_text=query_text,
+                select=SELECT_FIELDS,
+                order_by=sort_order(search_client),
+                include_total_count=True,
+                top=top,
+                skip=skip
+            )
+            documents = list(results)
+            operation.add("documents", len(documents))
+        return results.get_count(), documents
+
+    if cache is None:
+        return load()
+    return cache.get_or_load((query_text, skip, top), load)
+
+
+def iter_pages(search_client, query_text, page_size=50, max_results=None, cache=None):
+    """
+    Yields the results of a query one page at a time.
+
+    Args:
+        search_client (SearchClient): The client for the search index
+        query_text (str): The text to search for
+        page_size (int): Number of documents requested per page
+        max_results (int): Maximum number of documents to return (None for all)
+        cache (TTLCache): Optional cache of previously returned pages
+
+    Yields:
+        tuple: (skip, total count, list of documents) for each page
+    """
+
+    skip = 0
+    while True:
+        top = page_size if max_results is None else min(page_size, max_results - skip)
+        count, documents = search_page(search_client, query_text, skip, top, cache)
+        yield skip, count, documents
+        skip += len(documents)
+        if len(documents) < top or (count is not None and skip >= count) or (max_results is not None and skip >= max_results):
+            return
+
+
+def iter_documents(search_client, query_text, page_size=1000):
+    """
+    Yields every document that matches a query, however many there are.
+
+    Each page starts after the last document of the previous page rather than
+    using skip, which the service limits to 100,000 documents. Documents are
+    sorted by name and then by the index key, and the cursor is the last
+    (name, key) pair, so documents that share a name are never skipped even when
+    they fall on both sides of a page boundary. Both fields must be filterable
+    and sortable; if the key is not (see key_is_sortable), the pages are read
+    with top/skip instead, sorted by name only.
+
+    Args:
+        search_client (SearchClient): The client for the search index
+        query_text (str): The text to search for ("*" for all documents)
+        page_size (int): Number of documents requested per page
+
+    Yields:
+        dict: Each matching document, with the selected fields, in name order
+    """
+
+    if not key_is_sortable(search_client):
+        for _, _, documents in iter_pages(search_client, query_text, page_size):
+            yield from documents
+        return
+
+    last = None
+    while True:
+        results = search_client.search(
+            search_text=query_text,
+            select=SELECT_FIELDS,
+            order_by=["metadata_storage_name", KEY_FIELD],
+            filter=None if last is None else cursor_filter(*last),
+            top=page_size
+        )
+        documents = list(results)
+        yield from documents
+        if len(documents) < page_size:
+            return
+        last = documents[-1]["metadata_storage_name"], documents[-1][KEY_FIELD]
+
+
+def cursor_filter(name, key):
+    """
+    Returns the OData filter for the documents after a (name, key) cursor.
+
+    Args:
+        name (str): The last document name returned
+        key (str): The index key of that document
+
+    Returns:
+        str: The filter expression
+    """
+
+    name, key = name.replace("'", "''"), key.replace("'", "''")
+    return f"metadata_storage_name gt '{name}' or (metadata_storage_name eq '{name}' and {KEY_FIELD} gt '{key}')"
+
+
+def run_queries(search_client, queries, max_in_flight=4, page_size=50, max_results=None, cache=None):
+    """
+    Runs many queries concurrently, yielding each page of results as soon as it arrives.
+
+    Each query's next page is only requested once its previous page has arrived,
+    so at most max_in_flight pages are being fetched or held at any time.
+
+    Args:
+        search_client (SearchClient): The client for the search index (shared by all threads)
+        queries (iterable): The query texts to run
+        max_in_flight (int): Maximum number of concurrent search requests
+        page_size (int): Number of documents requested per page
+        max_results (int): Maximum number of documents to return per query (None for all)
+        cache (TTLCache): Optional cache of previously returned pages
+
+    Yields:
+        tuple: (query text, skip, total count, list of documents) for each page, or
+        (query text, skip, None, exception) if a request failed
+    """
+
+    queries = iter(queries)
+    pending = {}   # future -> (query text, skip, top)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+
+        def submit(query_text, skip):
+            top = page_size if max_results is None else min(page_size, max_results - skip)
+            future = executor.submit(search_page, search_client, query_text, skip, top, cache)
+            pending[future] = (query_text, skip, top)
+
+        def submit_next_query():
+            for query_text in queries:
+                if query_text:
+                    submit(query_text, 0)
+                    return
+
+        # Start as many queries as there are workers, then start a new one whenever a query finishes
+        for _ in range(max_in_flight):
+            submit_next_query()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                query_text, skip, top = pending.pop(future)
+                try:
+                    count, documents = future.result()
+                except Exception as ex:
+                    yield query_text, skip, None, ex
+                    submit_next_query()
+                    continue
+
+                next_skip = skip + len(documents)
+                if (len(documents) == top and (count is None or next_skip < count)
+                        and (max_results is None or next_skip < max_results)):
+                    submit(query_text, next_skip)
+                else:
+                    submit_next_query()
+                yield query_text, skip, count, documents
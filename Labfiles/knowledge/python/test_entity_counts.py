@@ -0,0 +1,147 @@
+import os
+import random
+import sys
+from collections import Counter
+
+import pytest
+
+# entity_counts uses search_batch, which uses the shared helpers in Labfiles/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from entity_counts import SpaceSaving, facet_counts, streamed_counts, top_entities
+
+
+def skewed_stream(seed=1):
+    # A few frequent values (value-k appears about 2000 / k times) among thousands seen once or twice
+    rng = random.Random(seed)
+    stream = [f"value-{k}" for k in range(1, 41) for _ in range(2000 // k)]
+    stream += [f"rare-{index}" for index in range(6000)] + [f"rare-{index}" for index in range(0, 6000, 3)]
+    rng.shuffle(stream)
+    return stream
+
+
+def test_space_saving_finds_the_top_values_of_a_skewed_stream():
+    stream = skewed_stream()
+    truth = Counter(stream)
+    counter = SpaceSaving(capacity=200)
+
+    for item in stream:
+        counter.add(item)
+
+    assert counter.total == len(stream)
+    assert len(counter.counters) == 200
+    top = counter.top(10)
+    assert [item for item, _, _ in top] == [item for item, _ in truth.most_common(10)]
+
+    bound = counter.total / counter.capacity
+    for item, count, error in counter.top(200):
+        # Each count is an overestimate by at most its error, which is at most total / capacity
+        assert count - error <= truth[item] <= count
+        assert error <= bound
+    # Every value seen more than total / capacity times is guaranteed to be kept
+    assert all(item in counter.counters for item, count in truth.items() if count > bound)
+
+
+def test_space_saving_is_exact_while_it_has_free_counters():
+    counter = SpaceSaving(capacity=10)
+    for item, count in [("a", 3), ("b", 5), ("a", 4), ("c", 1)]:
+        counter.add(item, count)
+
+    assert counter.top(2) == [("a", 7, 0), ("b", 5, 0)]
+
+
+class FakeResults(list):
+
+    def __init__(self, documents, count, facets=None):
+        super().__init__(documents)
+        self._count = count
+        self._facets = facets
+
+    def get_count(self):
+        return self._count
+
+    def get_facets(self):
+        return self._facets
+
+
+class FakeSearchClient:
+    """
+    Stands in for SearchClient over documents with a collection field. Facets are
+    computed from the documents if the field is facetable; otherwise a facet request
+    returns no facets, or fails as the service does if fail_facets is set. Like the
+    lab's index, the key is not sortable, so documents are paged with top/skip.
+    """
+
+    def __init__(self, documents, facetable=True, fail_facets=False):
+        self.documents = documents
+        self.facetable = facetable
+        self.fail_facets = fail_facets
+        self.facet_requests = 0
+        self.pages = 0
+
+    def search(self, search_text, facets=None, include_total_count=False, top=None, skip=0, select=None,
+               order_by=None, filter=None):
+        if facets:
+            self.facet_requests += 1
+            if self.fail_facets:
+                raise RuntimeError("The field 'people' is not facetable.\nStatus code: 400")
+            if not self.facetable:
+                return FakeResults([], len(self.documents))
+            values = {}
+            for facet in facets:
+                field, count = facet.split(",count:")
+                counts = Counter(value for document in self.documents for value in set(document.get(field) or ()))
+                values[field] = [{"value": value, "count": total} for value, total in counts.most_common(int(count))]
+            return FakeResults([], len(self.documents), values)
+        if filter is not None:
+            raise RuntimeError("The field 'metadata_storage_path' is not sortable or filterable")
+        if top == 0:
+            return FakeResults([], len(self.documents))
+        self.pages += 1
+        return FakeResults(self.documents[skip:skip + top], len(self.documents))
+
+
+def documents(count=300):
+    # Alice is in every document, Bob in every second one and Carol in every third; values repeated
+    # within a document count once
+    people = []
+    for index in range(count):
+        names = ["Alice", "Alice"] + (["Bob"] if index % 2 == 0 else []) + (["Carol"] if index % 3 == 0 else [])
+        names.append(f"Person {index}")
+        people.append({"metadata_storage_name": f"doc-{index:04d}.pdf", "metadata_storage_path": f"path-{index:04d}",
+                       "people": names, "locations": ["Seattle"] if index % 5 == 0 else None})
+    return people
+
+
+def test_facets_are_used_when_the_index_returns_them():
+    client = FakeSearchClient(documents())
+
+    method, count, values = top_entities(client, "*", ["people", "locations"], top_n=3)
+
+    assert (method, count) == ("facets", 300)
+    assert values["people"] == [("Alice", 300, 0), ("Bob", 150, 0), ("Carol", 100, 0)]
+    assert values["locations"] == [("Seattle", 60, 0)]
+    assert client.pages == 0
+
+
+@pytest.mark.parametrize("fail_facets, reason", [(False, "no facets returned"), (True, "The field 'people' is not facetable.")])
+def test_documents_are_counted_client_side_without_facets(fail_facets, reason):
+    client = FakeSearchClient(documents(), facetable=False, fail_facets=fail_facets)
+
+    method, count, values = top_entities(client, "*", ["people", "locations"], top_n=3, capacity=50, page_size=64)
+
+    assert method == f"counted client-side ({reason})"
+    assert count == 300
+    assert client.pages == 5
+    # The frequent values are exact, however many rare ones pass through the 50 counters
+    assert [(value, count) for value, count, _ in values["people"]] == [("Alice", 300), ("Bob", 150), ("Carol", 100)]
+    assert values["locations"] == [("Seattle", 60, 0)]
+
+
+def test_facet_and_streamed_counts_agree():
+    client = FakeSearchClient(documents())
+
+    facet_count, facet_values = facet_counts(client, "*", ["people"], top_n=3)
+    streamed_count, streamed_values = streamed_counts(client, "*", ["people"], top_n=3, page_size=100)
+
+    assert facet_count == streamed_count == 300
+    assert [value[:2] for value in facet_values["people"]] == [value[:2] for value in streamed_values["people"]]
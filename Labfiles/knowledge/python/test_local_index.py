@@ -0,0 +1,96 @@
+import os
+import sys
+
+import pytest
+
+# local_index uses the shared helpers in Labfiles/common, which search-app.py adds to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+import local_index
+from local_index import LocalIndex
+from search_batch import KEY_FIELD, iter_documents
+
+
+def make_document(index, name=None, locations=("London",), people=(), keyphrases=()):
+    return {KEY_FIELD: f"https://storage/docs/{index:03}", "metadata_storage_name": name or f"doc-{index:03}.pdf",
+            "locations": list(locations), "people": list(people), "keyphrases": list(keyphrases)}
+
+
+def names(index, query_text):
+    return [index.documents[doc_id][1] for doc_id in index.query(query_text)]
+
+
+def test_queries_match_field_values_and_words_sorted_by_name(tmp_path):
+    documents = [make_document(0, "c.pdf", people=["Jane Doe"]),
+                 make_document(1, "a.pdf", locations=["New York"]),
+                 make_document(2, "b.pdf", locations=["London", "Paris"], people=["John Doe"])]
+    with LocalIndex(str(tmp_path)) as index:
+        assert index.update(documents) == (3, 0, 0)
+
+        assert names(index, "*") == ["a.pdf", "b.pdf", "c.pdf"]
+        assert names(index, "locations:london") == ["b.pdf", "c.pdf"]
+        assert names(index, 'people:"Jane Doe"') == ["c.pdf"]
+        assert names(index, "doe") == ["b.pdf", "c.pdf"]
+        assert names(index, "doe paris") == ["b.pdf"]
+        assert names(index, "locations:york") == []
+
+
+def test_a_reopened_index_reads_its_postings_from_disk(tmp_path):
+    with LocalIndex(str(tmp_path)) as index:
+        index.update([make_document(i, locations=["London" if i % 2 else "Paris"]) for i in range(10)])
+        expected = index.query("london")
+
+    with LocalIndex(str(tmp_path)) as index:
+        assert index.query("london") == expected
+        assert len(expected) == 5
+        assert all(index.get_document(doc_id)["locations"] == ["London"] for doc_id in expected)
+
+
+def test_updates_replace_changed_documents_and_remove_missing_ones(tmp_path):
+    with LocalIndex(str(tmp_path)) as index:
+        index.update([make_document(i) for i in range(4)])
+
+        counts = index.update([make_document(0), make_document(1, locations=["Paris"]), make_document(2),
+                               make_document(4)], remove_missing=True)
+
+        assert counts == (1, 1, 1)
+        assert names(index, "london") == ["doc-000.pdf", "doc-002.pdf", "doc-004.pdf"]
+        assert names(index, "paris") == ["doc-001.pdf"]
+        assert len(index) == 4
+        # Unchanged documents are not written again
+        assert index.update([make_document(0)]) == (0, 0, 0)
+
+
+def test_segments_are_merged_once_there_are_too_many(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_index, "MAX_SEGMENTS", 3)
+    with LocalIndex(str(tmp_path)) as index:
+        for version in range(5):
+            index.update([make_document(0, locations=[f"City{version}"]), make_document(version + 1)])
+
+        assert len(index.segments) <= 3
+        assert names(index, "city4") == ["doc-000.pdf"]
+        assert names(index, "city0") == []
+        assert len(index) == 6
+        files = {name for name in os.listdir(tmp_path) if name.startswith("segment-")}
+        assert files == {segment.name + extension for segment in index.segments for extension in (".json", ".postings")}
+
+
+def test_search_pages_through_results_like_a_search_client(tmp_path):
+    documents = [make_document(i, name=["a.pdf", "O'Brien.pdf", "b.pdf"][i % 3]) for i in range(10)]
+    with LocalIndex(str(tmp_path)) as index:
+        index.update(documents)
+
+        found = list(iter_documents(index, "london", page_size=3))
+        results = index.search("london", select=["metadata_storage_name"], include_total_count=True, top=2,
+                               facets=["locations,count:5"])
+
+    assert sorted(document[KEY_FIELD] for document in found) == sorted(document[KEY_FIELD] for document in documents)
+    assert results.get_count() == 10 and results == [{"metadata_storage_name": "O'Brien.pdf"}] * 2
+    assert results.get_facets() == {"locations": [{"value": "London", "count": 10}]}
+
+
+def test_an_unsupported_filter_is_rejected(tmp_path):
+    with LocalIndex(str(tmp_path)) as index:
+        index.update([make_document(0)])
+
+        with pytest.raises(ValueError):
+            index.search("*", filter="locations/any(l: l eq 'London')")
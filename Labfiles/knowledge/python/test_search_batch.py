@@ -0,0 +1,198 @@
+import os
+import re
+import sys
+import threading
+import time
+
+import pytest
+
+# search_batch uses the shared helpers in Labfiles/common, which search-app.py adds to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from search_batch import KEY_FIELD, TTLCache, cursor_filter, iter_documents, iter_pages, run_queries
+
+# The only filter the batch functions send: the (name, key) cursor of iter_documents
+CURSOR = re.compile(r"metadata_storage_name gt '((?:[^']|'')*)' or \(.* gt '((?:[^']|'')*)'\)")
+
+
+class FakeResults(list):
+
+    def __init__(self, documents, count):
+        super().__init__(documents)
+        self._count = count
+
+    def get_count(self):
+        return self._count
+
+
+class FakeSearchClient:
+    """
+    Stands in for SearchClient: every query matches all its documents, sorted by
+    name and key, and the client records each request and how many ran at once.
+    Like the lab's index, it can be told that the key is neither sortable nor
+    filterable; the one-off check of key_is_sortable is recorded separately.
+    """
+
+    def __init__(self, documents, delays=None, failures=(), sortable_key=True):
+        self.documents = sorted(documents, key=lambda document: (document["metadata_storage_name"], document[KEY_FIELD]))
+        self.delays = delays or {}
+        self.failures = set(failures)
+        self.sortable_key = sortable_key
+        self.probes = 0
+        self.requests = []
+        self.orders = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+
+    def search(self, search_text, select=None, order_by=None, include_total_count=False, top=None, skip=0, filter=None):
+        if top == 0:
+            self.probes += 1
+        if not self.sortable_key and (KEY_FIELD in (order_by or ()) or KEY_FIELD in (filter or "")):
+            raise RuntimeError(f"The field '{KEY_FIELD}' is not sortable or filterable")
+        if top == 0:
+            return FakeResults([], len(self.documents))
+        with self.lock:
+            self.requests.append((search_text, skip, top, filter))
+            self.orders.append(order_by)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delays.get(search_text, 0.001))
+            if search_text in self.failures:
+                raise RuntimeError(f"Search for {search_text} failed")
+            matches = self.documents
+            if filter:
+                after = tuple(value.replace("''", "'") for value in CURSOR.fullmatch(filter).groups())
+                matches = [document for document in matches
+                           if (document["metadata_storage_name"], document[KEY_FIELD]) > after]
+            page = matches[skip:] if top is None else matches[skip:skip + top]
+            return FakeResults([{field: document.get(field) for field in select} for document in page], len(matches))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def make_documents(count, names=None):
+    # Each document has its own key; names repeat if a list of names is given
+    return [{KEY_FIELD: f"https://storage/docs/{index:03}",
+             "metadata_storage_name": names[index % len(names)] if names else f"doc-{index:03}.pdf",
+             "locations": ["London"], "people": [], "keyphrases": []} for index in range(count)]
+
+
+def test_iter_pages_requests_one_page_at_a_time():
+    client = FakeSearchClient(make_documents(23))
+
+    pages = list(iter_pages(client, "london", page_size=10))
+
+    assert [(skip, count, len(documents)) for skip, count, documents in pages] == [(0, 23, 10), (10, 23, 10), (20, 23, 3)]
+    assert [(skip, top) for _, skip, top, _ in client.requests] == [(0, 10), (10, 10), (20, 10)]
+
+
+def test_pages_are_sorted_by_name_then_key():
+    client = FakeSearchClient(make_documents(12))
+
+    list(iter_pages(client, "london", page_size=5))
+    list(iter_documents(client, "london", page_size=5))
+
+    assert client.orders == [["metadata_storage_name", KEY_FIELD]] * len(client.requests)
+
+
+def test_pages_are_sorted_by_name_only_if_the_key_is_not_sortable():
+    client = FakeSearchClient(make_documents(12), sortable_key=False)
+
+    pages = list(iter_pages(client, "london", page_size=5))
+    list(iter_pages(client, "paris", page_size=5))
+
+    assert sum(len(documents) for _, _, documents in pages) == 12
+    assert client.orders == [["metadata_storage_name"]] * len(client.requests)
+    # The index is only asked once whether the key can be used
+    assert client.probes == 1
+
+
+def test_iter_documents_falls_back_to_skip_if_the_key_is_not_filterable():
+    documents = make_documents(11, names=["a.pdf", "b.pdf", "c.pdf"])
+    client = FakeSearchClient(documents, sortable_key=False)
+
+    found = list(iter_documents(client, "*", page_size=4))
+
+    assert sorted(document[KEY_FIELD] for document in found) == sorted(document[KEY_FIELD] for document in documents)
+    assert [(skip, top, filter) for _, skip, top, filter in client.requests] == [(0, 4, None), (4, 4, None), (8, 4, None)]
+
+
+def test_iter_pages_stops_at_max_results():
+    client = FakeSearchClient(make_documents(23))
+
+    pages = list(iter_pages(client, "london", page_size=10, max_results=15))
+
+    assert sum(len(documents) for _, _, documents in pages) == 15
+    assert [(skip, top) for _, skip, top, _ in client.requests] == [(0, 10), (10, 5)]
+
+
+def test_iter_documents_keeps_documents_that_share_a_name_across_pages():
+    # Every page boundary falls between documents with the same name
+    documents = make_documents(11, names=["a.pdf", "a.pdf", "a.pdf", "O'Brien.pdf", "b.pdf"])
+    client = FakeSearchClient(documents)
+
+    found = list(iter_documents(client, "*", page_size=2))
+
+    assert sorted(document[KEY_FIELD] for document in found) == sorted(document[KEY_FIELD] for document in documents)
+    assert [document["metadata_storage_name"] for document in found] == sorted(document["metadata_storage_name"] for document in documents)
+    assert all(skip == 0 for _, skip, _, _ in client.requests)
+
+
+def test_cursor_filter_escapes_quotes():
+    assert cursor_filter("O'Brien.pdf", "k'1") == (
+        "metadata_storage_name gt 'O''Brien.pdf' or (metadata_storage_name eq 'O''Brien.pdf' and metadata_storage_path gt 'k''1')")
+
+
+def test_run_queries_isolates_a_failed_query():
+    client = FakeSearchClient(make_documents(12), failures=["broken"])
+
+    pages = list(run_queries(client, ["london", "broken", "paris"], max_in_flight=2, page_size=5))
+
+    failed = [page for page in pages if page[2] is None]
+    assert len(failed) == 1 and failed[0][0] == "broken" and isinstance(failed[0][3], RuntimeError)
+    for query_text in ("london", "paris"):
+        assert sum(len(documents) for text, _, count, documents in pages if text == query_text and count is not None) == 12
+
+
+def test_run_queries_yields_each_querys_pages_in_order_within_max_in_flight():
+    client = FakeSearchClient(make_documents(12), delays={"slow": 0.05})
+    queries = ["slow", "q1", "q2", "q3", "q4"]
+
+    pages = list(run_queries(client, queries, max_in_flight=2, page_size=5))
+
+    for query_text in queries:
+        assert [skip for text, skip, _, _ in pages if text == query_text] == [0, 5, 10]
+    assert client.peak_in_flight <= 2
+    # The fast queries finish while the slow one is still on its pages
+    assert pages[-1][0] == "slow"
+
+
+def test_run_queries_skips_empty_queries():
+    client = FakeSearchClient(make_documents(3))
+
+    pages = list(run_queries(client, ["", "london", ""], page_size=5))
+
+    assert [(text, skip) for text, skip, _, _ in pages] == [("london", 0)]
+
+
+def test_repeated_queries_share_cached_pages():
+    client = FakeSearchClient(make_documents(8), delays={"london": 0.05})
+    cache = TTLCache(max_entries=16, ttl=60)
+
+    pages = list(run_queries(client, ["london"] * 4, max_in_flight=4, page_size=5, cache=cache))
+
+    assert len(pages) == 8
+    assert len(client.requests) == 2
+    assert cache.misses == 2 and cache.hits == 6
+
+
+@pytest.mark.parametrize("max_entries", [1, 3])
+def test_ttl_cache_evicts_the_least_recently_used(max_entries):
+    cache = TTLCache(max_entries=max_entries, ttl=60)
+    for key in "abc":
+        cache.put(key, key.upper())
+
+    assert cache.get("c") == "C"
+    assert (cache.get("a") is None) == (max_entries < 3)
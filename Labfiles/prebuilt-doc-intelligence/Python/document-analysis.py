@@ -1,27 +1,57 @@
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import contextlib
+import glob
+import json
 import os
+import sys
+import threading
 
-# Add references
-# Import Azure credentials for API authentication
-from azure.core.credentials import AzureKeyCredential
+# Shared helpers used by several labs live in Labfiles/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from console import clear_console
+from document_shards import analyze_shards, count_pages
+from instrumentation import get_recorder
+from job_journal import JobJournal, result_file_name
 
-# Import the Document Analysis client from Azure AI Form Recognizer SDK
-# This client is used to communicate with the Azure Document Intelligence service
-from azure.ai.formrecognizer import DocumentAnalysisClient
 
+# The invoice fields reported for each analyzed document
+INVOICE_FIELDS = ("VendorName", "CustomerName", "InvoiceTotal")
 
 
 def main():
 
-    # Clear the console
-    os.system('cls' if os.name=='nt' else 'clear')
+    # Clear the console (with escape codes, so no cls/clear process is started)
+    clear_console()
 
     try:
+        # Get the invoices to analyze (local files, folders, glob patterns or URLs)
+        # e.g. python document-analysis.py
+        #      python document-analysis.py ../../content/invoice-1234.pdf ../../content/invoice-1235.pdf
+        #      python document-analysis.py ./invoices --max-in-flight 16
+        #      python document-analysis.py ./invoices --journal invoices.db   (run it again to resume a stopped batch)
+        #      python document-analysis.py big-statement.pdf --shard-pages 50   (analyze 50-page ranges at the same time)
+        parser = argparse.ArgumentParser(description="Analyze invoices with Azure AI Document Intelligence")
+        parser.add_argument("sources", nargs="*",
+                            help="Invoice files, folders, glob patterns or URLs (defaults to the sample invoice)")
+        parser.add_argument("--max-in-flight", type=int, default=8,
+                            help="Maximum number of invoices analyzed at the same time")
+        parser.add_argument("--journal",
+                            help="SQLite file recording the batch's progress, so a stopped batch can be resumed")
+        parser.add_argument("--output-dir", default="results",
+                            help="Folder where a journaled batch saves one JSON result per invoice")
+        parser.add_argument("--shard-pages", type=int,
+                            help="Split local PDFs with more pages than this into page ranges analyzed at the same time (requires pypdf)")
+        args = parser.parse_args()
+
         # Get config settings
+        from dotenv import load_dotenv
         load_dotenv()
         endpoint = os.getenv('ENDPOINT')
         key = os.getenv('KEY')
 
+        # Every analysis is timed and recorded to METRICS_LOG / METRICS_FILE, if they are set
+        recorder = get_recorder("document-analysis")
 
         # Set analysis settings
         fileUri = "https://github.com/MicrosoftLearning/mslearn-ai-information-extraction/blob/main/Labfiles/prebuilt-doc-intelligence/sample-invoice/sample-invoice.pdf?raw=true"
@@ -29,9 +59,18 @@ def main():
         fileModelId = "prebuilt-invoice"
 
         print(f"\nConnecting to Forms Recognizer at: {endpoint}")
-        print(f"Analyzing invoice at: {fileUri}")
 
 
+        # Add references
+        # The Azure SDK takes longer to import than the rest of the script, so it is
+        # only imported once the arguments are parsed (--help never loads it)
+        # Import Azure credentials for API authentication
+        from azure.core.credentials import AzureKeyCredential
+
+        # Import the Document Analysis client from Azure AI Form Recognizer SDK
+        # This client is used to communicate with the Azure Document Intelligence service
+        from azure.ai.formrecognizer import DocumentAnalysisClient
+
         # Create the client
         # Initialize the DocumentAnalysisClient with the endpoint and API key
         # This client object is our interface to the Azure Document Intelligence service
@@ -42,59 +81,290 @@ def main():
 
 
 
-        # Analyse the invoice
-        # begin_analyze_document_from_url submits the document for analysis
-        # This is an asynchronous operation that returns a poller object
-        # Parameters:
-        #   - fileModelId: The prebuilt model to use ("prebuilt-invoice" extracts invoice-specific fields)
-        #   - fileUri: The URL of the document to analyze
-        #   - locale: The language/region of the document ("en-US" for English)
-        # The poller allows us to track the status of the analysis operation
-        poller = document_analysis_client.begin_analyze_document_from_url(
-            fileModelId, fileUri, locale=fileLocale
-        )
+        # Analyze a batch of invoices in parallel, if any were given
+        # Each record is displayed as soon as its analysis completes
+        if args.sources:
+            sources = expand_sources(args.sources)
+            print(f"Analyzing {len(sources)} invoices (up to {args.max_in_flight} at a time)")
+            journal = JobJournal(args.journal, fileModelId) if args.journal else None
+            try:
+                for record in analyze_invoices(document_analysis_client, sources, fileModelId, fileLocale, args.max_in_flight,
+                                               journal, args.output_dir, args.shard_pages):
+                    print_invoice_record(record)
+            finally:
+                if journal is not None:
+                    journal.close()
+
+        else:
+            # Analyse the invoice
+            print(f"Analyzing invoice at: {fileUri}")
 
+            # begin_analyze_document_from_url submits the document for analysis
+            # This is an asynchronous operation that returns a poller object
+            # Parameters:
+            #   - fileModelId: The prebuilt model to use ("prebuilt-invoice" extracts invoice-specific fields)
+            #   - fileUri: The URL of the document to analyze
+            #   - locale: The language/region of the document ("en-US" for English)
+            # The poller allows us to track the status of the analysis operation
+            # The operation is finished (as Failed) even if the analysis raises
+            with recorder.operation("analyze", fileUri) as operation:
+                poller = document_analysis_client.begin_analyze_document_from_url(
+                    fileModelId, fileUri, locale=fileLocale
+                )
+                operation.mark_accepted()
 
 
-        # Display invoice information to the user
-        # poller.result() waits for the analysis to complete and returns the results
-        # The results object contains a list of analyzed documents
-        # For each document, we can extract specific fields that the prebuilt-invoice model recognizes
-        receipts = poller.result()
-        
-        # Iterate through each analyzed document (typically just one in this case)
-        for idx, receipt in enumerate(receipts.documents):
-            
-            # Extract the Vendor Name field from the invoice
-            # The get() method safely retrieves the field, returning None if not found
-            # Each field has a 'value' property containing the extracted data
-            # and a 'confidence' score (0-1) indicating how confident the model is
-            vendor_name = receipt.fields.get("VendorName")
-            if vendor_name:
-                print(f"\nVendor Name: {vendor_name.value}, with confidence {vendor_name.confidence}.")
 
-            # Extract the Customer Name field
-            # This represents who the invoice is being sent to
-            customer_name = receipt.fields.get("CustomerName")
-            if customer_name:
-                print(f"Customer Name: '{customer_name.value}', with confidence {customer_name.confidence}.")
+                # Display invoice information to the user
+                # poller.result() waits for the analysis to complete and returns the results
+                # The results object contains a list of analyzed documents
+                # For each document, we can extract specific fields that the prebuilt-invoice model recognizes
+                receipts = poller.result()
+                operation.mark_completed()
 
-            # Extract the Invoice Total field
-            # This field contains a currency value with both symbol and amount
-            # The prebuilt model automatically recognizes the currency and converts to a structured format
-            invoice_total = receipt.fields.get("InvoiceTotal")
-            if invoice_total:
-                # invoice_total.value is a CurrencyValue object with 'symbol' and 'amount' properties
-                print(f"Invoice Total: '{invoice_total.value.symbol}{invoice_total.value.amount}', with confidence {invoice_total.confidence}.")
+                # Iterate through each analyzed document (typically just one in this case)
+                for idx, receipt in enumerate(receipts.documents):
 
+                    # Extract the Vendor Name field from the invoice
+                    # The get() method safely retrieves the field, returning None if not found
+                    # Each field has a 'value' property containing the extracted data
+                    # and a 'confidence' score (0-1) indicating how confident the model is
+                    vendor_name = receipt.fields.get("VendorName")
+                    if vendor_name:
+                        print(f"\nVendor Name: {vendor_name.value}, with confidence {vendor_name.confidence}.")
 
-            
+                    # Extract the Customer Name field
+                    # This represents who the invoice is being sent to
+                    customer_name = receipt.fields.get("CustomerName")
+                    if customer_name:
+                        print(f"Customer Name: '{customer_name.value}', with confidence {customer_name.confidence}.")
 
+                    # Extract the Invoice Total field
+                    # This field contains a currency value with both symbol and amount
+                    # The prebuilt model automatically recognizes the currency and converts to a structured format
+                    invoice_total = receipt.fields.get("InvoiceTotal")
+                    if invoice_total:
+                        # invoice_total.value is a CurrencyValue object with 'symbol' and 'amount' properties
+                        print(f"Invoice Total: '{invoice_total.value.symbol}{invoice_total.value.amount}', with confidence {invoice_total.confidence}.")
 
     except Exception as ex:
         print(ex)
 
     print("\nAnalysis complete.\n")
 
+
+def expand_sources(sources):
+    """
+    Expands the invoice sources given on the command line.
+
+    Args:
+        sources (list): Invoice files, folders, glob patterns or URLs
+
+    Returns:
+        list: The URLs and local file paths to analyze
+    """
+
+    expanded = []
+    for source in sources:
+        if source.startswith(("http://", "https://")):
+            expanded.append(source)
+        elif os.path.isdir(source):
+            expanded.extend(sorted(os.path.join(source, name) for name in os.listdir(source)
+                                   if os.path.isfile(os.path.join(source, name))))
+        elif glob.has_magic(source):
+            expanded.extend(sorted(path for path in glob.glob(source) if os.path.isfile(path)))
+        else:
+            expanded.append(source)
+    return expanded
+
+
+def analyze_invoice(client, source, model_id="prebuilt-invoice", locale="en-US", journal=None, output_dir="results",
+                    continuation_token=None, shard_pages=None, max_in_flight=8, budget=None, shard_executor=None):
+    """
+    Analyzes one invoice and extracts the vendor, customer and total.
+
+    Args:
+        client (DocumentAnalysisClient): Client for the Azure Document Intelligence service
+        source (str): URL or local path of the invoice
+        model_id (str): The model to use
+        locale (str): The language/region of the invoice
+        journal (JobJournal): Journal of the batch, in which the analysis is recorded, or None
+        output_dir (str): Folder where the result is saved when there is a journal
+        continuation_token (str): Token of an analysis that is already running, to wait for it
+            instead of submitting the invoice again
+        shard_pages (int): Split a local PDF with more pages than this into page ranges
+            analyzed at the same time, or None to always analyze it whole
+        max_in_flight (int): Maximum number of page ranges of the invoice analyzed at the same time
+        budget (Semaphore): Semaphore shared by a batch, held while each invoice or page range is
+            analyzed, so the batch never has more analyses running than it allows; None for no limit
+        shard_executor (Executor): Executor shared by a batch to run the page ranges on, or None
+            for the invoice to start its own
+
+    Returns:
+        list: One dict per document in the invoice, mapping "source" to the source and
+        each of INVOICE_FIELDS to a (value, confidence) tuple, or None if it wasn't found
+    """
+
+    # The SDK's poller hides the individual polls, so the analysis is timed in three parts:
+    # the submission, the wait for the result, and extracting the fields from it
+    budget = budget or contextlib.nullcontext()
+    with get_recorder().operation("analyze", source) as operation:
+
+        # A large local PDF is split into page ranges that are analyzed at the same time,
+        # so it takes about as long as its slowest range rather than all its pages in turn
+        # The merged result has the page numbers and offsets of the whole document
+        # (it isn't journaled until it is saved, so a stopped batch analyzes it again)
+        if (shard_pages and not continuation_token and source.lower().endswith(".pdf")
+                and not source.startswith(("http://", "https://")) and count_pages(source) > shard_pages):
+            from azure.ai.formrecognizer import AnalyzeResult
+
+            # Each page range takes its own place in the budget; the invoice itself holds none
+            def analyze_shard(shard):
+                with budget:
+                    with open(shard.path, "rb") as file:
+                        poller = client.begin_analyze_document(model_id, file, locale=locale)
+                    return poller.result().to_dict()
+            result = AnalyzeResult.from_dict(analyze_shards(source, analyze_shard, shard_pages, max_in_flight, operation,
+                                                         shard_executor))
+
+        else:
+            # URLs are fetched by the service; local files are uploaded as a stream
+            # A continuation token resumes polling an analysis submitted by an earlier run
+            with budget:
+                if continuation_token:
+                    poller = client.begin_analyze_document(model_id, None, continuation_token=continuation_token)
+                elif source.startswith(("http://", "https://")):
+                    poller = client.begin_analyze_document_from_url(model_id, source, locale=locale)
+                else:
+                    with open(source, "rb") as file:
+                        poller = client.begin_analyze_document(model_id, file, locale=locale)
+                operation.mark_accepted()
+
+                # The continuation token is all a restarted batch needs to pick up this analysis
+                if journal is not None and not continuation_token:
+                    journal.submitted(source, poller.continuation_token())
+                result = poller.result()
+                operation.mark_completed()
+
+        with operation.time("decode_seconds"):
+            records = invoice_records(source, result)
+
+    # Only recorded once the result is on disk, so a crash before this point waits for the analysis again
+    if journal is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        result_path = os.path.join(output_dir, result_file_name(source))
+        with open(result_path, "w") as json_file:
+            json.dump(result.to_dict(), json_file, default=str)
+        journal.succeeded(source, "Succeeded", result_path)
+    return records
+
+
+def invoice_records(source, result):
+    """
+    Extracts the vendor, customer and total of each document in an analysis result.
+
+    Args:
+        source (str): URL or local path of the invoice
+        result (AnalyzeResult): The result of analyzing it
+
+    Returns:
+        list: One record per document (see analyze_invoice)
+    """
+
+    records = []
+    for document in result.documents:
+        record = {"source": source}
+        for name in INVOICE_FIELDS:
+            field = document.fields.get(name)
+            record[name] = (field.value, field.confidence) if field else None
+        records.append(record)
+    return records
+
+
+def analyze_invoices(client, sources, model_id="prebuilt-invoice", locale="en-US", max_in_flight=8, journal=None,
+                     output_dir="results", shard_pages=None):
+    """
+    Analyzes many invoices concurrently.
+
+    This function:
+    - Skips the invoices whose results a journaled earlier run already saved
+    - Resumes waiting for analyses that were still running, instead of submitting them again
+    - Keeps up to max_in_flight analyses (and their pollers) running at once
+    - Splits local PDFs with more than shard_pages pages into page ranges analyzed at the same time;
+      the page ranges count towards max_in_flight too, so the service never sees more at once
+    - Yields each invoice's records as soon as its analysis completes
+    - Reports failures as records with an "error" entry instead of stopping the batch
+
+    Args:
+        client (DocumentAnalysisClient): Client for the Azure Document Intelligence service
+        sources (list): URLs or local paths of the invoices
+        model_id (str): The model to use
+        locale (str): The language/region of the invoices
+        max_in_flight (int): Maximum number of invoices analyzed at the same time
+        journal (JobJournal): Journal recording the batch's progress, or None
+        output_dir (str): Folder where each result is saved when there is a journal
+        shard_pages (int): Page count above which a local PDF is analyzed in page ranges, or None
+
+    Yields:
+        dict: A record per analyzed document (see analyze_invoice)
+    """
+
+    # Work out what an earlier run of this batch already did
+    done, running = {}, {}
+    if journal is not None:
+        done, running, todo = journal.plan(sources)
+        print(f"Journal {journal.path}: {len(done)} already analyzed, {len(running)} still running, {len(todo)} to submit")
+
+    # Saved results are read back rather than analyzed again
+    if done:
+        from azure.ai.formrecognizer import AnalyzeResult
+    for source, entry in done.items():
+        with open(entry.result_path, "r") as json_file:
+            yield from invoice_records(source, AnalyzeResult.from_dict(json.load(json_file)))
+
+    # Invoices and the page ranges of split PDFs share one budget of max_in_flight analyses
+    # The page ranges run on one pool shared by every invoice (not the invoices' pool, whose
+    # workers wait for them), so the batch has at most twice max_in_flight threads
+    budget = threading.BoundedSemaphore(max(1, max_in_flight))
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor, \
+            ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as shard_executor:
+        futures = {executor.submit(analyze_invoice, client, source, model_id, locale, journal, output_dir,
+                                   running[source].operation if source in running else None,
+                                   shard_pages, max_in_flight, budget, shard_executor): source
+                   for source in sources if source not in done}
+        for future in as_completed(futures):
+            try:
+                yield from future.result()
+            except Exception as ex:
+                if journal is not None:
+                    journal.failed(futures[future], "Failed", str(ex))
+                yield {"source": futures[future], "error": str(ex)}
+
+
+def print_invoice_record(record):
+    """
+    Displays the fields extracted from one invoice.
+
+    Args:
+        record (dict): A record returned by analyze_invoices
+    """
+
+    print(f"\n{record['source']}")
+    if "error" in record:
+        print(f"ERROR: {record['error']}")
+        return
+
+    vendor_name = record["VendorName"]
+    if vendor_name:
+        print(f"Vendor Name: {vendor_name[0]}, with confidence {vendor_name[1]}.")
+    customer_name = record["CustomerName"]
+    if customer_name:
+        print(f"Customer Name: '{customer_name[0]}', with confidence {customer_name[1]}.")
+    invoice_total = record["InvoiceTotal"]
+    if invoice_total:
+        # The total is a CurrencyValue object with 'symbol' and 'amount' properties
+        print(f"Invoice Total: '{invoice_total[0].symbol}{invoice_total[0].amount}', with confidence {invoice_total[1]}.")
+
+
 if __name__ == "__main__":
     main()        
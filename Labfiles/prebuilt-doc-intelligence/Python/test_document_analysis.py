@@ -0,0 +1,208 @@
+import importlib.util
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+# The tests run document-analysis.py's batch functions against an in-process fake of the SDK client
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "document-analysis.py")
+sys.path.insert(0, os.path.join(os.path.dirname(SCRIPT), "..", "..", "common"))
+from job_journal import JobJournal
+
+
+def load_script(path):
+    # The script's file name isn't a valid module name, so it is imported from its path
+    spec = importlib.util.spec_from_file_location("document_analysis", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+document_analysis = load_script(SCRIPT)
+
+Field = namedtuple("Field", ["value", "confidence"])
+Document = namedtuple("Document", ["fields"])
+
+
+class FakeResult:
+    """An AnalyzeResult with one invoice whose vendor is the analyzed source."""
+
+    def __init__(self, source):
+        self.documents = [Document({"VendorName": Field(source, 0.9), "InvoiceTotal": Field(100.0, 0.8)})]
+
+    def to_dict(self):
+        return {"documents": [{"fields": {name: field._asdict() for name, field in document.fields.items()}}
+                              for document in self.documents]}
+
+
+class FakePoller:
+
+    def __init__(self, client, source):
+        self.client = client
+        self.source = source
+
+    def continuation_token(self):
+        return "token:" + self.source
+
+    def result(self):
+        try:
+            time.sleep(self.client.delays.get(self.source, 0.01))
+            if self.source in self.client.failures:
+                raise RuntimeError(f"Analysis of {self.source} failed")
+            return FakeResult(self.source)
+        finally:
+            with self.client.lock:
+                self.client.in_flight -= 1
+
+
+class FakeDocumentAnalysisClient:
+    """
+    Stands in for DocumentAnalysisClient: each analysis takes its source's delay,
+    and the client records what was submitted, resumed and running at once.
+    """
+
+    def __init__(self, delays=None, failures=()):
+        self.delays = delays or {}
+        self.failures = set(failures)
+        self.submitted = []
+        self.resumed = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def _begin(self, source):
+        with self.lock:
+            self.threads.add(threading.current_thread().name)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return FakePoller(self, source)
+
+    def begin_analyze_document(self, model_id, document, locale=None, continuation_token=None):
+        if continuation_token:
+            self.resumed.append(continuation_token)
+            return self._begin(continuation_token[len("token:"):])
+        document.read()
+        self.submitted.append(document.name)
+        return self._begin(document.name)
+
+    def begin_analyze_document_from_url(self, model_id, document_url, locale=None):
+        self.submitted.append(document_url)
+        return self._begin(document_url)
+
+
+def invoice_urls(count):
+    return [f"https://example.com/invoices/invoice-{index}.pdf" for index in range(count)]
+
+
+def test_every_invoice_is_analyzed_within_max_in_flight():
+    client = FakeDocumentAnalysisClient()
+    sources = invoice_urls(12)
+
+    records = list(document_analysis.analyze_invoices(client, sources, max_in_flight=3))
+
+    assert sorted(record["source"] for record in records) == sorted(sources)
+    assert all(record["VendorName"] == (record["source"], 0.9) for record in records)
+    assert all(record["CustomerName"] is None for record in records)
+    assert client.peak_in_flight <= 3
+
+
+def test_records_arrive_as_each_analysis_completes():
+    slow, fast = invoice_urls(2)
+    client = FakeDocumentAnalysisClient(delays={slow: 0.5, fast: 0.01})
+
+    records = list(document_analysis.analyze_invoices(client, [slow, fast], max_in_flight=2))
+
+    assert [record["source"] for record in records] == [fast, slow]
+
+
+def test_a_failed_invoice_does_not_stop_the_batch(tmp_path):
+    sources = invoice_urls(4)
+    missing = str(tmp_path / "missing.pdf")
+    client = FakeDocumentAnalysisClient(failures=[sources[1]])
+
+    with JobJournal(str(tmp_path / "journal.db"), "prebuilt-invoice") as journal:
+        records = list(document_analysis.analyze_invoices(client, sources + [missing], journal=journal,
+                                                          output_dir=str(tmp_path / "results")))
+        entries = journal.entries()
+
+    errors = {record["source"]: record["error"] for record in records if "error" in record}
+    assert set(errors) == {sources[1], missing}
+    assert "failed" in errors[sources[1]]
+    assert len(records) == 5
+    assert {source: entries[source].state for source in entries} == {
+        sources[0]: "succeeded", sources[1]: "failed", sources[2]: "succeeded", sources[3]: "succeeded", missing: "failed"}
+
+
+def test_invoices_with_the_same_name_are_saved_separately(tmp_path):
+    sources = []
+    for folder in ("march", "april"):
+        os.makedirs(tmp_path / folder)
+        sources.append(str(tmp_path / folder / "invoice.pdf"))
+        with open(sources[-1], "wb") as file:
+            file.write(b"%PDF-1.4 " + folder.encode())
+    client = FakeDocumentAnalysisClient()
+
+    with JobJournal(str(tmp_path / "journal.db"), "prebuilt-invoice") as journal:
+        list(document_analysis.analyze_invoices(client, sources, journal=journal, output_dir=str(tmp_path / "results")))
+        result_paths = [journal.entries()[source].result_path for source in sources]
+
+    assert result_paths[0] != result_paths[1]
+    assert all(os.path.exists(path) for path in result_paths)
+    assert len(os.listdir(tmp_path / "results")) == 2
+
+
+def test_a_resumed_batch_waits_for_running_analyses_instead_of_submitting_them(tmp_path):
+    running, new = invoice_urls(2)
+    client = FakeDocumentAnalysisClient()
+
+    with JobJournal(str(tmp_path / "journal.db"), "prebuilt-invoice") as journal:
+        journal.submitted(running, "token:" + running)
+        records = list(document_analysis.analyze_invoices(client, [running, new], journal=journal,
+                                                          output_dir=str(tmp_path / "results")))
+        states = {source: entry.state for source, entry in journal.entries().items()}
+
+    assert client.resumed == ["token:" + running]
+    assert client.submitted == [new]
+    assert sorted(record["source"] for record in records) == sorted([running, new])
+    assert states == {running: "succeeded", new: "succeeded"}
+
+
+@pytest.mark.parametrize("source", ["https://example.com/a/invoice.pdf", "invoices/invoice.pdf"])
+def test_single_invoice_records_its_fields(source, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    if not source.startswith("https://"):
+        os.makedirs("invoices")
+        with open(source, "wb") as file:
+            file.write(b"%PDF-1.4")
+    client = FakeDocumentAnalysisClient()
+
+    records = document_analysis.analyze_invoice(client, source)
+
+    assert records == [{"source": source, "VendorName": (source, 0.9), "CustomerName": None, "InvoiceTotal": (100.0, 0.8)}]
+    assert client.submitted == [source]
+
+
+def test_page_ranges_of_a_batch_share_its_max_in_flight(tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    pytest.importorskip("azure.ai.formrecognizer")
+    sources = []
+    for index in range(3):
+        writer = pypdf.PdfWriter()
+        for _ in range(6):
+            writer.add_blank_page(width=612, height=792)
+        sources.append(str(tmp_path / f"statement-{index}.pdf"))
+        with open(sources[-1], "wb") as file:
+            writer.write(file)
+    client = FakeDocumentAnalysisClient()
+
+    records = list(document_analysis.analyze_invoices(client, sources, max_in_flight=2, shard_pages=2))
+
+    assert sorted(record["source"] for record in records if "error" not in record) == sorted(sources * 3)
+    assert len(client.submitted) == 9
+    assert client.peak_in_flight <= 2
+    # Every invoice's page ranges run on the batch's one shard pool, not a pool of their own
+    assert len(client.threads) <= 2